@@ -0,0 +1,120 @@
+"""
+Ensemble latency benchmark: plain gather vs. a deadline vs. a deadline with hedging.
+
+Runs EnsembleOrchestrator against stub providers whose latencies are drawn from
+log-normal distributions with a slow tail (no network, no API keys). Each stub
+streams its test cases evenly over its latency, so a provider cut off by the
+deadline still has partial results for the keep/drop policy.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_ensemble_deadline --requests 200 --deadline-ms 600
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+from services.models.ensemble import EnsembleOrchestrator
+
+
+class StubProvider:
+    """Answers after a log-normal latency (median_ms, sigma); `tail` of the calls take `tail_factor` times longer."""
+
+    def __init__(self, name: str, median_ms: float, sigma: float, tests: int, rng: random.Random,
+                 tail: float = 0.05, tail_factor: float = 4.0):
+        self.model_name = name
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.tests = tests
+        self.rng = rng
+        self.tail = tail
+        self.tail_factor = tail_factor
+        self.calls = 0
+
+    def _latency(self) -> float:
+        latency = self.median_ms * self.rng.lognormvariate(0, self.sigma)
+        if self.rng.random() < self.tail:
+            latency *= self.tail_factor
+        return latency / 1000
+
+    async def generate_test_cases(self, code_context: str, on_test_case=None):
+        self.calls += 1
+        latency = self._latency()
+        tests = []
+        for i in range(self.tests):
+            await asyncio.sleep(latency / self.tests)
+            tc = {"test_case_name": f"{self.model_name} scenario {i} {self.rng.random()}",
+                  "priority": "High", "code": "def test_x(playwright):\n    pass\n"}
+            tests.append(tc)
+            if on_test_case: on_test_case(tc)
+        return tests, latency, 0.001
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run(label: str, orchestrator: EnsembleOrchestrator, requests: int, concurrency: int, **kwargs):
+    walls, kept, cut_off = [], [], Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            async for result in orchestrator.stream_test_cases("def f(): ...", "bypass", **kwargs):
+                kept.append(len(result["tests"]))
+                if result["status"] == "timeout":
+                    cut_off[result["provider"]] += 1
+            walls.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    hedges = sum(getattr(client, "calls", 0) for client in orchestrator.hedges.values())
+    ms = [w * 1000 for w in walls]
+    print(f"{label:<28} p50 {percentile(ms, 50):6.0f} ms   p95 {percentile(ms, 95):6.0f} ms   "
+          f"p99 {percentile(ms, 99):6.0f} ms   max {max(ms):6.0f} ms   "
+          f"tests/provider {statistics.mean(kept):4.1f}   hedges {hedges:3d}   "
+          f"cut off: Gemini {cut_off['Gemini']:3d}, Claude {cut_off['Claude']:3d}")
+
+
+def make(seed: int, hedge_percentile: float = 0.0):
+    rng = random.Random(seed)
+    clients = [
+        ("Gemini", StubProvider("gemini-stub", 200, 0.4, 10, rng)),
+        ("Claude", StubProvider("claude-stub", 300, 0.6, 10, rng)),
+    ]
+    hedges = {"Gemini": StubProvider("gemini-backup-stub", 250, 0.4, 10, rng)}
+    return EnsembleOrchestrator(clients=clients, hedges=hedges, hedge_percentile=hedge_percentile)
+
+
+async def main_async(args):
+    deadline = args.deadline_ms / 1000
+    print(f"{args.requests} requests, {args.concurrency} at a time, deadline {args.deadline_ms:.0f} ms\n"
+          f"(only Gemini has a hedge backup)\n")
+    await run("gather (no deadline)", make(args.seed), args.requests, args.concurrency, deadline_s=0)
+    await run("deadline, keep partial", make(args.seed), args.requests, args.concurrency,
+              deadline_s=deadline, partial_policy="keep")
+    await run("deadline, drop partial", make(args.seed), args.requests, args.concurrency,
+              deadline_s=deadline, partial_policy="drop")
+    await run(f"deadline + hedge at p{args.hedge_percentile:.0f}", make(args.seed, args.hedge_percentile),
+              args.requests, args.concurrency, deadline_s=deadline, partial_policy="keep")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--deadline-ms", type=float, default=600)
+    parser.add_argument("--hedge-percentile", type=float, default=90)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
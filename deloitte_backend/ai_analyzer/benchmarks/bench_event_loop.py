@@ -0,0 +1,84 @@
+"""
+Event-loop responsiveness check: a slow model call must not stall other endpoints.
+
+Installs a fake Gemini client in the client registry that takes `--provider-s`
+seconds per call, starts genai_service.analyze_risks, and meanwhile sends
+requests to /api/auth/login through the ASGI app in the same event loop.
+Runs twice: with the async fake (how calls are made now) and with a fake that
+blocks like the old synchronous client.models.generate_content did.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_event_loop --provider-s 2
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+from main import app
+from services import client_registry, genai_service
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+RESPONSE = '{"summary": "Fake", "complexity_score": 3, "complexity_explanation": "-", "risks": []}'
+
+
+class SlowModels:
+    def __init__(self, seconds: float, blocking: bool):
+        self.seconds = seconds
+        self.blocking = blocking
+
+    async def generate_content(self, model, contents, config=None):
+        if self.blocking:
+            time.sleep(self.seconds)  # What a sync SDK call inside `async def` does to the loop
+        else:
+            await asyncio.sleep(self.seconds)
+        return SimpleNamespace(text=RESPONSE)
+
+
+async def measure(label: str, seconds: float, blocking: bool, probes: int):
+    client_registry.register_client("gemini", SimpleNamespace(aio=SimpleNamespace(models=SlowModels(seconds, blocking))))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://sentinel") as http:
+        await http.post("/api/auth/login", data={"username": "warmup@example.com", "password": "x"})
+        start = time.perf_counter()
+        slow = asyncio.create_task(genai_service.analyze_risks("def f(): pass"))
+        await asyncio.sleep(0)  # Let the model call start first
+
+        # Each login is timed from when it was due, so a stalled loop shows up as latency
+        latencies = []
+        for _ in range(probes):
+            t0 = time.perf_counter() if latencies else start
+            response = await http.post("/api/auth/login", data={"username": "nobody@example.com", "password": "x"})
+            assert response.status_code == 401, response.status_code
+            latencies.append((time.perf_counter() - t0) * 1000)
+        probes_done = time.perf_counter() - start
+        result = await slow
+        assert result["summary"] == "Fake"
+    worst = max(latencies)
+    print(f"{label:<28} model call {seconds:.1f} s   {probes} logins done after {probes_done:5.2f} s   "
+          f"worst login {worst:7.1f} ms   {'OK' if worst < seconds * 500 else 'STALLED'}")
+
+
+async def main_async(args):
+    await measure("async client (client.aio)", args.provider_s, False, args.probes)
+    await measure("blocking client (old)", args.provider_s, True, args.probes)
+    client_registry.register_client("gemini", None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--provider-s", type=float, default=2.0)
+    parser.add_argument("--probes", type=int, default=10)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+JSON recovery fuzz + benchmark: the shared single-pass parser (services/json_stream.py)
+vs. the three extractors it replaced (llm_chains.extract_json_from_text,
+GeminiClient._repair_truncated_json, the Claude client's fence splitting).
+
+Generates model-style responses around a known list of test cases and mangles
+them the ways real outputs go wrong: Markdown fences, chatter before/after
+(with brackets or a small JSON example of its own in it), trailing commas, raw newlines inside strings, and truncation at a random offset.
+For each case it counts how many of the test cases that were complete in the
+text each parser gets back, and times both on ~8k-token responses.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_json_recovery --cases 2000
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.json_stream import parse_json_object
+
+
+# --- The replaced extractors, kept verbatim for comparison ---
+
+def legacy_extract_json_from_text(text):
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        clean_text = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        match = re.search(r'(\{.*\})', text, re.DOTALL)
+        if match:
+            return json.loads(match.group(1))
+    except Exception:
+        pass
+    return None
+
+
+def legacy_repair_truncated_json(json_str):
+    json_str = json_str.strip()
+    if not json_str: return {"test_cases": []}
+    if json_str.count('"') % 2 != 0: json_str += '"'
+    stack = []
+    for char in json_str:
+        if char == '{': stack.append('}')
+        elif char == '[': stack.append(']')
+        elif char == '}' and stack and stack[-1] == '}': stack.pop()
+        elif char == ']' and stack and stack[-1] == ']': stack.pop()
+    repair_suffix = "".join(reversed(stack))
+    try:
+        return json.loads(json_str + repair_suffix)
+    except:
+        last_obj = json_str.rfind('},')
+        if last_obj != -1:
+            try: return json.loads(json_str[:last_obj] + '}]}')
+            except: pass
+        return {"test_cases": []}
+
+
+def legacy_gemini(raw_text):
+    raw_text = raw_text.strip()
+    if "{" in raw_text:
+        raw_text = raw_text[raw_text.find("{"):raw_text.rfind("}") + 1]
+    if not raw_text:
+        return None
+    try:
+        return json.loads(raw_text)
+    except json.JSONDecodeError:
+        return legacy_repair_truncated_json(raw_text)
+
+
+def legacy_claude(response_text):
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        return None
+
+
+LEGACY = {
+    "extract_json_from_text": legacy_extract_json_from_text,
+    "gemini repair": legacy_gemini,
+    "claude fences": legacy_claude,
+}
+
+
+# --- Synthetic model outputs ---
+
+def make_test_case(rng: random.Random, i: int) -> dict:
+    body = "\n".join(f"    assert service.call({{'id': {j}}}) == [{j}, \"ok\"]" for j in range(rng.randint(3, 30)))
+    return {
+        "test_case_name": f"Test {i}: rejects {{tampered}} [payload] \"quoted\"",
+        "priority": rng.choice(["High", "Medium", "Low"]),
+        "steps": ["Arrange", "Act", "Assert"],
+        "code": f"def test_case_{i}():\n{body}\n# end {i}\n",
+    }
+
+
+CHATTER = [
+    "Here are [%d] tests:\n",
+    "I wrote %d tests (see [the list] below) {as requested}:\n",
+    'Format: {"test_cases": "list"} with %d entries.\n',
+    "Found [%d] issues: [\"auth\", \"db\"] and {1: 2}.\n",
+]
+
+
+def make_case(rng: random.Random, n_tests: int):
+    """Returns (response text, number of test cases complete in it)."""
+    tests = [make_test_case(rng, i) for i in range(n_tests)]
+    text = json.dumps({"project_summary": "Synthetic", "test_cases": tests}, indent=rng.choice([None, 2]))
+    if rng.random() < 0.3:
+        text = text.replace('"},', '"},\n', 1).replace('"\n  }\n  ]', '"\n  },\n  ]')  # Trailing comma
+    if rng.random() < 0.3:
+        text = text.replace("\\n", "\n")  # Raw newlines inside strings
+    if rng.random() < 0.5:
+        text = "```json\n" + text + "\n```"
+    if rng.random() < 0.3:
+        text = "Here are the tests you asked for:\n" + text + "\nLet me know if you need more."
+    if rng.random() < 0.3:
+        # Chatter whose own brackets come before the JSON
+        text = rng.choice(CHATTER) % n_tests + text
+
+    complete = n_tests
+    if rng.random() < 0.5:
+        cut = rng.randint(len(text) // 4, len(text) - 1)
+        text = text[:cut]
+        # Test cases whose closing brace made it into the text
+        complete = sum(1 for i in range(n_tests) if _ends_within(text, i))
+    return text, complete
+
+
+def _ends_within(text: str, index: int) -> bool:
+    # "code" is the last key, and every code block ends with its own marker line
+    return re.search(r'# end %d(?:\\n|\n)"\s*\}' % index, text) is not None
+
+
+def recovered(value):
+    """(complete test cases, half-written ones passed off as complete)."""
+    tests = value.get("test_cases") if isinstance(value, dict) else None
+    if not isinstance(tests, list):
+        return 0, 0
+    complete = sum(1 for t in tests if isinstance(t, dict) and re.search(r'# end \d+\n$', str(t.get("code", ""))))
+    return complete, len(tests) - complete
+
+
+def fuzz(cases: int, seed: int):
+    rng = random.Random(seed)
+    totals = {name: [0, 0] for name in ("shared parser", *LEGACY)}
+    expected = 0
+    for _ in range(cases):
+        text, complete = make_case(rng, rng.randint(1, 12))
+        expected += complete
+        got, partial = recovered(parse_json_object(text))
+        # Never drops a test case that was complete, never passes off a half-written one
+        assert (got, partial) == (complete, 0), (got, partial, complete, text[-300:])
+        totals["shared parser"][0] += got
+        for name, fn in LEGACY.items():
+            try:
+                got, partial = recovered(fn(text))
+            except Exception:
+                continue
+            totals[name][0] += got
+            totals[name][1] += partial
+    print(f"Fuzz: {cases} responses, {expected} complete test cases in them")
+    for name, (count, partial) in totals.items():
+        print(f"  {name:<24} recovered {count:6d}  ({count / max(expected, 1):6.1%})   half-written kept {partial:5d}")
+
+
+def bench(repeat: int, seed: int):
+    rng = random.Random(seed)
+    tests = [make_test_case(rng, i) for i in range(40)]
+    full = "```json\n" + json.dumps({"test_cases": tests}, indent=2) + "\n```"
+    while len(full) < 32_000:  # ~8k tokens
+        tests.append(make_test_case(rng, len(tests)))
+        full = "```json\n" + json.dumps({"test_cases": tests}, indent=2) + "\n```"
+    truncated = full[:int(len(full) * 0.9)]
+    print(f"\nBenchmark on a {len(full):,}-char response (best of {repeat}):")
+    for label, text in (("fenced", full), ("truncated at 90%", truncated)):
+        for name, fn in [("shared parser", parse_json_object), *LEGACY.items()]:
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                try:
+                    value = fn(text)
+                except Exception:
+                    value = None
+                best = min(best, time.perf_counter() - t0)
+            complete, partial = recovered(value)
+            print(f"  {label:<18} {name:<24} {best * 1000:7.2f} ms   {complete:3d} test cases (+{partial} half-written)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    fuzz(args.cases, args.seed)
+    bench(args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
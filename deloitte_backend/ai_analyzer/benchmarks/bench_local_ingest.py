@@ -0,0 +1,103 @@
+"""
+Local ingestion benchmark: legacy os.walk reader vs. the pruned scandir engine.
+
+Builds a synthetic JS-style project (mostly node_modules/.git/build noise around a
+small src/ tree) and times both readers on it.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_local_ingest --files 200000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.file_processor import FileProcessor
+from services.local_ingest import scan_local_project
+
+
+def build_tree(root: str, total_files: int):
+    """~1% real source, the rest spread over directories a scan should never enter."""
+    source_files = max(100, total_files // 100)
+    noise = total_files - source_files
+    layout = [
+        ("node_modules", int(noise * 0.85), ".js"),
+        (".git/objects", int(noise * 0.10), ""),
+        ("build", noise - int(noise * 0.85) - int(noise * 0.10), ".js"),
+    ]
+
+    def write_many(base, count, ext, body):
+        per_dir = 200
+        for i in range(count):
+            d = os.path.join(root, base, f"pkg{i // per_dir}")
+            if i % per_dir == 0:
+                os.makedirs(d, exist_ok=True)
+            with open(os.path.join(d, f"f{i}{ext}"), "w") as f:
+                f.write(body)
+
+    write_many("src", source_files, ".js", "export function handler(req) { return req.body; }\n")
+    for base, count, ext in layout:
+        write_many(base, count, ext, "module.exports = {};\n")
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("build/\n*.log\n")
+
+
+def legacy_read_directory(path: str, allowed_extensions) -> dict:
+    """The pre-engine FileProcessor._read_directory, kept verbatim for comparison."""
+    code_map = {}
+    for root, _, files in os.walk(path):
+        if any(part.startswith('.') or part == 'node_modules' for part in root.split(os.sep)):
+            continue
+        for file in files:
+            ext = os.path.splitext(file)[1].lower()
+            if ext in allowed_extensions:
+                full_path = os.path.join(root, file)
+                try:
+                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        code_map[os.path.relpath(full_path, path)] = f.read()
+                except Exception:
+                    pass
+    return code_map
+
+
+def timed(label, fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<28} {best * 1000:9.1f} ms   ({len(result)} files kept)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Don't delete the synthetic tree")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="sentinel_bench_")
+    try:
+        t0 = time.perf_counter()
+        build_tree(root, args.files)
+        print(f"Built {args.files} files in {time.perf_counter() - t0:.1f}s at {root}\n")
+
+        exts = FileProcessor().allowed_extensions
+        legacy = timed("legacy os.walk", lambda: legacy_read_directory(root, exts), args.repeat)
+        engine = timed("scan_local_project", lambda: scan_local_project(
+            root, extensions=exts, skip_hidden=True, max_total_chars=10 ** 9, use_index=False).files, args.repeat)
+        warm = timed("scan_local_project (index)", lambda: scan_local_project(
+            root, extensions=exts, skip_hidden=True, max_total_chars=10 ** 9).files, args.repeat)
+        print(f"\nSpeedup: {legacy / engine:.1f}x cold, {legacy / warm:.1f}x with a warm scan index")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
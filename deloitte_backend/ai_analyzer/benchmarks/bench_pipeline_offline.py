@@ -0,0 +1,134 @@
+"""
+End-to-end load test of /api/generate-tests with no network and no API keys.
+
+Runs the app with SENTINEL_LLM_MODE=fake (see services/fake_provider.py): every
+model call is answered locally from recorded fixtures or synthetic responses,
+with the latency, token rate, truncation and 429 rate given below. Fires
+`--requests` scans of a local path at an in-process uvicorn server on localhost,
+`--concurrency` at a time, and reports latency percentiles, time to first test case and throughput.
+`--instant` removes the fake model time so what is left is our own overhead;
+`--profile` prints the hottest functions on the event loop thread (work sent to
+asyncio.to_thread shows up as waiting).
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_pipeline_offline --requests 20 --concurrency 5
+    python -m benchmarks.bench_pipeline_offline --instant --profile
+"""
+import os
+import sys
+import json
+import time
+import pstats
+import asyncio
+import logging
+import argparse
+import cProfile
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(args):
+    # Must happen before the app modules read their settings
+    os.environ["SENTINEL_LLM_MODE"] = args.mode
+    os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+    os.environ.setdefault("SENTINEL_SINGLE_FLIGHT_ENABLED", "false")
+    os.environ["SENTINEL_FAKE_LATENCY_MS"] = "0" if args.instant else str(args.latency_ms)
+    os.environ["SENTINEL_FAKE_TOKENS_PER_S"] = "0" if args.instant else str(args.tokens_per_s)
+    os.environ["SENTINEL_FAKE_TRUNCATE_RATE"] = str(args.truncate_rate)
+    os.environ["SENTINEL_FAKE_429_RATE"] = str(args.rate_429)
+    os.environ.setdefault("SENTINEL_RETRY_BASE_S", "0.05")
+    sys.path.append(ROOT)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def scan(http: httpx.AsyncClient, path: str):
+    start = time.perf_counter()
+    first_case = None
+    total = errors = 0
+    async with http.stream("POST", "/api/generate-tests", json={"path": path}, timeout=600) as response:
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "test_case" and first_case is None:
+                first_case = time.perf_counter() - start
+            elif event["type"] == "test_results" and not event["data"].get("partial"):
+                total = event["data"]["total"]
+            elif event["type"] == "error":
+                errors += 1
+    return time.perf_counter() - start, first_case, total, errors
+
+
+async def load(app, path: str, requests: int, concurrency: int, port: int):
+    # A real server, so the NDJSON stream reaches the client event by event
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+            async def one():
+                async with semaphore:
+                    return await scan(http, path)
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one() for _ in range(requests)))
+            return results, time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=os.path.join(ROOT, "services"), help="Local code to scan")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--mode", choices=["fake", "replay"], default="fake")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-s", type=float, default=400)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--instant", action="store_true", help="No fake model time: measures pipeline overhead")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    configure(args)
+
+    from main import app
+    from services.client_registry import get_gemini_client
+
+    engine = get_gemini_client().engine  # The stand-in the pipeline uses (shutdown drops it from the registry)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    results, wall = asyncio.run(load(app, args.path, args.requests, args.concurrency, args.port))
+    if profiler:
+        profiler.disable()
+
+    latencies = [r[0] * 1000 for r in results]
+    firsts = [r[1] * 1000 for r in results if r[1] is not None]
+    print(f"\n{args.requests} scans of {args.path}, {args.concurrency} at a time, mode={args.mode}"
+          f"{' (instant model)' if args.instant else ''}")
+    print(f"  latency      p50 {percentile(latencies, 50):8.1f} ms   p95 {percentile(latencies, 95):8.1f} ms   "
+          f"max {max(latencies):8.1f} ms")
+    if firsts:
+        print(f"  first test   p50 {percentile(firsts, 50):8.1f} ms   p95 {percentile(firsts, 95):8.1f} ms")
+    print(f"  throughput   {args.requests / wall:6.2f} scans/s   tests per scan {sorted({r[2] for r in results})}   "
+          f"error events {sum(r[3] for r in results)}")
+    print(f"  fake gemini  {engine.stats}")
+    if profiler:
+        print()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Prompt prefix caching: input tokens served from the provider's cache vs. sent fresh.
+
+Runs with SENTINEL_LLM_MODE=fake (see services/fake_provider.py), whose stand-in
+providers keep context caches / cache_control prefixes the way Gemini and Anthropic
+do and report which handles later calls reused. Scans `--path` `--runs` times through
+generate_tests_chain and the Gemini + Claude ensemble, with prefix caching on and off,
+then deletes the provider-side caches behind our back to check the inline fallback.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_prompt_cache --runs 3
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must happen before the app modules read their settings
+os.environ["SENTINEL_LLM_MODE"] = "fake"
+os.environ["SENTINEL_FAKE_LATENCY_MS"] = "0"
+os.environ["SENTINEL_FAKE_TOKENS_PER_S"] = "0"
+os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+# The fake has no quota; the default Claude TPM would throttle repeated whole-repo prompts
+os.environ.setdefault("SENTINEL_CLAUDE_TPM", "100000000")
+os.environ.setdefault("SENTINEL_GEMINI_TPM", "100000000")
+sys.path.append(ROOT)
+from services import llm_chains, prompt_cache
+from services.client_registry import get_gemini_client, get_anthropic_client
+from services.models.ensemble import EnsembleOrchestrator
+
+
+def load_code(path: str) -> dict:
+    code_map = {}
+    for folder, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.endswith(".py"):
+                with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                    code_map[os.path.relpath(os.path.join(folder, name), path)] = f.read()
+    return code_map
+
+
+def split(usages) -> tuple:
+    cached = sum(u.get("cached_input_tokens", 0) for u in usages)
+    uncached = sum(u.get("uncached_input_tokens", 0) for u in usages)
+    return cached, uncached
+
+
+async def scan_chain(code_map: dict) -> list:
+    usages = []
+    async for event in llm_chains.generate_tests_chain(code_map, sharded=False, cache_mode="bypass"):
+        usages.extend(event.get("token_usage", []))
+    return usages
+
+
+async def scan_ensemble(code_map: dict) -> list:
+    context = llm_chains.build_context(code_map)
+    return [result["usage"] async for result in EnsembleOrchestrator().stream_test_cases(context, cache_mode="bypass")]
+
+
+def reset(enabled: bool):
+    prompt_cache.PROMPT_CACHE_ENABLED = enabled
+    prompt_cache._prompt_cache = None
+    for engine in (get_gemini_client().engine, get_anthropic_client().engine):
+        engine.prefixes.clear()
+        for name in engine.stats:
+            engine.stats[name] = 0
+
+
+async def run(label: str, code_map: dict, runs: int, enabled: bool):
+    reset(enabled)
+    print(f"\n{label}")
+    for run_index in range(1, runs + 1):
+        chain = await scan_chain(code_map)
+        ensemble = await scan_ensemble(code_map)
+        for name, usages in (("chain", chain), ("ensemble", ensemble)):
+            cached, uncached = split(usages)
+            share = cached / max(1, cached + uncached)
+            print(f"  run {run_index} {name:<9} {len(usages)} calls   cached {cached:7d}   uncached {uncached:7d}   "
+                  f"({share:.0%} from the prompt cache)")
+    gemini, claude = get_gemini_client().engine, get_anthropic_client().engine
+    print(f"  fake gemini  created {gemini.stats['prefix_created']}  reused {gemini.stats['prefix_reused']}   "
+          f"fake claude  created {claude.stats['prefix_created']}  reused {claude.stats['prefix_reused']}")
+    for handle in gemini.prefix_report() + claude.prefix_report():
+        print(f"    {handle['handle']:<58} {handle['model']:<28} {handle['tokens']:6d} tokens  reused {handle['uses']}x")
+    if prompt_cache.get_prompt_cache():
+        print(f"  our handles  {prompt_cache.get_prompt_cache().stats}")
+
+
+async def stale_handles(code_map: dict):
+    """The provider drops our context caches early: calls fall back to the inline prompt, next run re-creates."""
+    reset(True)
+    await scan_chain(code_map)
+    engine = get_gemini_client().engine
+    engine.prefixes.clear()
+    usages = await scan_chain(code_map)
+    recovered = await scan_chain(code_map)
+    print(f"\nstale handles: {len(usages)} calls answered after the provider lost the cache "
+          f"(cached {split(usages)[0]}), next run cached {split(recovered)[0]} tokens again")
+
+
+async def main_async(args):
+    code_map = load_code(args.path)
+    print(f"{len(code_map)} files from {args.path}")
+    await run("prefix caching off", code_map, args.runs, enabled=False)
+    await run("prefix caching on", code_map, args.runs, enabled=True)
+    await stale_handles(code_map)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=os.path.join(ROOT, "services"), help="Local code to scan")
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
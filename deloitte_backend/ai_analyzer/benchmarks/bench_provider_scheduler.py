@@ -0,0 +1,134 @@
+"""
+Provider scheduler benchmark: many concurrent requests against a rate-limited provider.
+
+A local fake provider allows `--quota` requests per second (sliding window) and
+answers the rest with a 429 carrying Retry-After, like the real APIs. Compares:
+
+  legacy      fixed sleep + unbounded recursive retry (the old GeminiClient behaviour)
+  backoff     ProviderScheduler retries only (jittered backoff, Retry-After), no buckets
+  scheduler   ProviderScheduler with a request bucket and a concurrency limit
+
+and then shows the circuit breaker failing fast while the provider is down.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_provider_scheduler --requests 200 --quota 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from collections import deque
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import provider_scheduler
+from services.provider_scheduler import ProviderScheduler, ProviderUnavailable, TokenBucket
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("429 RESOURCE_EXHAUSTED")
+        self.code = 429
+        self.response = SimpleNamespace(headers={"retry-after": f"{retry_after:.2f}"})
+
+
+class ServiceDown(Exception):
+    def __init__(self):
+        super().__init__("503 UNAVAILABLE")
+        self.code = 503
+
+
+class FakeProvider:
+    """`quota` requests per second; each accepted request takes `latency` seconds."""
+
+    def __init__(self, quota: int, latency: float, down: bool = False):
+        self.quota = quota
+        self.latency = latency
+        self.down = down
+        self.window = deque()
+        self.rejected = 0
+        self.accepted = 0
+
+    async def generate(self):
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1.0:
+            self.window.popleft()
+        if self.down:
+            self.rejected += 1
+            raise ServiceDown()
+        if len(self.window) >= self.quota:
+            self.rejected += 1
+            raise QuotaExceeded(1.0 - (now - self.window[0]))
+        self.window.append(now)
+        self.accepted += 1
+        await asyncio.sleep(self.latency)
+        return "ok"
+
+
+async def legacy_call(provider: FakeProvider, sleep_s: float):
+    try:
+        return await provider.generate()
+    except Exception as e:
+        if "429" in str(e):
+            await asyncio.sleep(sleep_s)
+            return await legacy_call(provider, sleep_s)
+        raise
+
+
+async def run(label: str, provider: FakeProvider, requests: int, call):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(call() for _ in range(requests)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r == "ok")
+    print(f"{label:<10} {elapsed:6.2f} s   {ok:4d}/{requests} ok   {provider.rejected:5d} x 429 from the provider   "
+          f"{provider.accepted / elapsed:5.1f} req/s accepted")
+
+
+async def main_async(args):
+    # Legacy retry waited 10 s on a per-minute quota; scaled to this per-second one
+    legacy_sleep = 10 / 60
+    print(f"{args.requests} concurrent requests, provider quota {args.quota}/s, {args.latency_ms:.0f} ms per call\n")
+
+    provider = FakeProvider(args.quota, args.latency_ms / 1000)
+    await run("legacy", provider, args.requests, lambda: legacy_call(provider, legacy_sleep))
+
+    provider_scheduler.RETRY_ATTEMPTS = 50  # Enough for everyone to get through; the point is how many 429s it takes
+    provider = FakeProvider(args.quota, args.latency_ms / 1000)
+    backoff = ProviderScheduler("fake", rpm=0, tpm=0, concurrency=0)
+    await run("backoff", provider, args.requests, lambda: backoff.call(provider.generate))
+
+    provider = FakeProvider(args.quota, args.latency_ms / 1000)
+    scheduler = ProviderScheduler("fake", rpm=0, tpm=0, concurrency=args.concurrency)
+    scheduler.requests = TokenBucket(args.quota * 60, burst=args.quota)
+    await run("scheduler", provider, args.requests, lambda: scheduler.call(provider.generate))
+
+    # Provider down: the breaker opens after BREAKER_FAILURES failures and later callers fail fast
+    provider = FakeProvider(args.quota, args.latency_ms / 1000, down=True)
+    down = ProviderScheduler("fake", rpm=0, tpm=0, concurrency=1)
+    provider_scheduler.RETRY_ATTEMPTS = 2
+    start = time.perf_counter()
+    outcomes = {"fallback": 0, "error": 0}
+    for _ in range(20):
+        try:
+            await down.call(provider.generate)
+        except ProviderUnavailable:
+            outcomes["fallback"] += 1
+        except ServiceDown:
+            outcomes["error"] += 1
+    print(f"\nProvider down, 20 sequential requests: {time.perf_counter() - start:.2f} s, "
+          f"{provider.rejected} reached the provider, {outcomes['fallback']} sent to the fallback path "
+          f"(breaker {down.breaker.state})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--quota", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Single-flight benchmark: N identical concurrent /api/generate-tests requests.
+
+Sends `--clients` identical local-path scans through the ASGI app at once (a
+fake streaming provider counts model calls), with coalescing on and off, then
+checks that a client joining after the first events still receives all of them.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_single_flight --clients 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+from main import app
+from services import single_flight
+from services.client_registry import register_client
+from benchmarks.bench_streaming import FakeModels, canned_response
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class CountingModels(FakeModels):
+    calls = 0
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return await super().generate_content(model, contents, config)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self.calls += 1
+        return await super().generate_content_stream(model, contents, config)
+
+
+async def scan(http: httpx.AsyncClient, path: str, delay: float = 0.0):
+    await asyncio.sleep(delay)
+    response = await http.post("/api/generate-tests", json={"path": path, "bypass_cache": True}, timeout=60)
+    return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+
+async def run(label: str, path: str, clients: int, fake: CountingModels, enabled: bool):
+    single_flight.SINGLE_FLIGHT_ENABLED = enabled
+    single_flight._single_flight = None
+    fake.calls = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://sentinel") as http:
+        start = time.perf_counter()
+        streams = await asyncio.gather(*(scan(http, path) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    totals = {next((e["data"]["total"] for e in s if e["type"] == "test_results"), None) for s in streams}
+    print(f"{label:<18} {clients} clients   {fake.calls:3d} model calls   {elapsed:5.2f} s   totals {sorted(totals)}")
+
+
+async def late_joiner(path: str, fake: CountingModels):
+    single_flight.SINGLE_FLIGHT_ENABLED = True
+    single_flight._single_flight = None
+    fake.calls = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://sentinel") as http:
+        first, late = await asyncio.gather(scan(http, path), scan(http, path, delay=0.5))
+    skip = lambda events: [e for e in events if not e.get("coalesced")]
+    assert skip(first) == skip(late), "late joiner missed events"
+    print(f"{'late joiner':<18} joined after 0.5 s: {len(skip(late))} events, same as the first client   "
+          f"{fake.calls} model calls")
+
+
+async def main_async(args):
+    fake = CountingModels(canned_response(args.tests), 64, args.chunk_delay_ms / 1000)
+    register_client("gemini", SimpleNamespace(aio=SimpleNamespace(models=fake)))
+    with tempfile.TemporaryDirectory() as repo:
+        with open(os.path.join(repo, "checkout.py"), "w") as f:
+            f.write("def submit(cart):\n    return cart.total\n")
+        await run("coalescing off", repo, args.clients, fake, enabled=False)
+        await run("coalescing on", repo, args.clients, fake, enabled=True)
+        await late_joiner(repo, fake)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--tests", type=int, default=8)
+    parser.add_argument("--chunk-delay-ms", type=float, default=10)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Streaming benchmark: time to first test case vs. time to the full result.
+
+Runs generate_tests_chain and GeminiClient.stream_test_cases against a local fake
+provider that streams a canned response in small chunks with a fixed delay per
+chunk (no network, no API key). Checks that every test case is emitted as its
+own `test_case` event before the final `test_results`.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_streaming --tests 8 --chunk-delay-ms 20
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SENTINEL_RESPONSE_CACHE_ENABLED", "false")
+from services import llm_chains
+from services.client_registry import register_client
+from services.models.gemini_client import GeminiClient
+
+
+def canned_response(tests: int) -> str:
+    cases = [{
+        "test_case_name": f"Test checkout rejects tampered total #{i}",
+        "description": "Recomputes the order total server side and rejects a mismatch.",
+        "steps": "Build cart -> Tamper total -> Submit -> Expect 400",
+        "priority": "High",
+        "complexity": "Medium",
+        "code": "def test_tampered_total():\n    cart = make_cart()\n    cart.total = 0\n    assert submit(cart).status == 400\n" * 4,
+    } for i in range(tests)]
+    return "```json\n" + json.dumps({"test_cases": cases}, indent=2) + "\n```"
+
+
+class FakeModels:
+    """Streams the canned text in `chunk_chars` pieces, one every `delay` seconds."""
+
+    def __init__(self, text: str, chunk_chars: int, delay: float):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.delay = delay
+
+    def _chunks(self):
+        return [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)]
+
+    async def generate_content(self, model, contents, config=None):
+        if "test_cases" not in contents:
+            return SimpleNamespace(text='{"project_summary": "Fake", "gap_analysis": "- none"}')
+        await asyncio.sleep(self.delay * len(self._chunks()))
+        return SimpleNamespace(text=self.text, usage_metadata=None)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        async def stream():
+            for piece in self._chunks():
+                await asyncio.sleep(self.delay)
+                yield SimpleNamespace(text=piece, usage_metadata=None)
+        return stream()
+
+
+async def bench_chain(fake: FakeModels, tests: int):
+    register_client("gemini", SimpleNamespace(aio=SimpleNamespace(models=fake)))
+    code_map = {"app/checkout.py": "def submit(cart):\n    return cart.total\n"}
+    start = time.perf_counter()
+    first_case = final = None
+    streamed = 0
+    async for event in llm_chains.generate_tests_chain(code_map, cache_mode="bypass"):
+        if event["type"] == "test_case":
+            streamed += 1
+            first_case = first_case or time.perf_counter() - start
+        elif event["type"] == "test_results" and not event["data"].get("partial"):
+            final = time.perf_counter() - start
+            total = event["data"]["total"]
+    assert streamed == tests == total, (streamed, tests, total)
+    print(f"{'generate_tests_chain':<31} first test {first_case * 1000:7.1f} ms   all {final * 1000:7.1f} ms   "
+          f"({streamed} test_case events, {first_case / final:.0%} of total)")
+
+
+async def bench_client(fake: FakeModels, tests: int):
+    client = GeminiClient.__new__(GeminiClient)
+    client.client = SimpleNamespace(aio=SimpleNamespace(models=fake))
+    client.model_name = "fake-model"
+    client.generation_config = {}
+    start = time.perf_counter()
+    first_case = None
+    received = 0
+    async for _ in client.stream_test_cases("def submit(cart): ..."):
+        received += 1
+        first_case = first_case or time.perf_counter() - start
+    final = time.perf_counter() - start
+    assert received == tests, (received, tests)
+    print(f"{'GeminiClient.stream_test_cases':<31} first test {first_case * 1000:7.1f} ms   all {final * 1000:7.1f} ms   "
+          f"({received} test cases, {first_case / final:.0%} of total)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=8)
+    parser.add_argument("--chunk-chars", type=int, default=64)
+    parser.add_argument("--chunk-delay-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    text = canned_response(args.tests)
+    fake = FakeModels(text, args.chunk_chars, args.chunk_delay_ms / 1000)
+    print(f"Canned response: {len(text):,} chars in {len(fake._chunks())} chunks\n")
+    asyncio.run(bench_chain(fake, args.tests))
+    asyncio.run(bench_client(fake, args.tests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Test-case dedup benchmark: MinHash/LSH clusters (services/test_dedup.py) vs. the
+old all-pairs name Jaccard of EnsembleOrchestrator.
+
+Builds `--tests` synthetic test cases (deterministic for a seed). About a third are
+copies of another test, the way two providers repeat each other:
+  retitled  same body (other function name, log strings, comments), new title
+  reworded  same title words in another order, body with two lines rewritten
+  extended  body plus one extra assert, new title
+Reports time per size, how many copies land in their original's cluster, and how
+many clusters wrongly mix different originals. The old method only runs up to
+`--legacy-max` tests; it is quadratic. First checks that distinct API tests (same
+request shape, other endpoint / payload / expected status) stay apart.
+
+    cd deloitte_backend/ai_analyzer
+    python -m benchmarks.bench_test_dedup --tests 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.test_dedup import cluster_tests
+
+COPY_KINDS = ("retitled", "reworded", "extended")
+
+
+def make_vocab(rng: random.Random, size: int = 600) -> list:
+    syllables = ["ka", "lo", "mi", "ter", "van", "po", "rex", "su", "tal", "dor", "fi", "nu", "gar", "bel", "zo", "chi"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+def make_body(rng: random.Random, vocab: list, lines: int = 12) -> list:
+    body = []
+    for _ in range(lines):
+        a, b, c, d = (rng.choice(vocab) for _ in range(4))
+        body.append(rng.choice([
+            f"    {a} = make_{b}({c}={rng.randint(0, 999)})",
+            f"    resp = client.post('/{a}/{b}', json={{'{c}': {d}}})",
+            f"    assert {a}.{b} == {c}.{d}",
+            f"    mock_{a}.{b}.return_value = {c}",
+            f"    assert resp.json()['{a}'] == {b}",
+        ]))
+    return body
+
+
+def render(rng: random.Random, vocab: list, name_words: list, body: list) -> dict:
+    fn = "_".join(rng.sample(vocab, 2))
+    return {
+        "test_case_name": " ".join(name_words),
+        "code": (f"import pytest\nfrom unittest import mock\n\ndef test_{fn}():\n"
+                 f"    # {rng.choice(vocab)}\n    print('[STEP] {' '.join(rng.sample(vocab, 3))}')\n" + "\n".join(body)),
+        "confidence_score": round(rng.uniform(0.6, 0.99), 2),
+        "model_source": rng.choice(["Gemini", "Claude"]),
+    }
+
+
+def synthetic_tests(count: int, seed: int, copy_share: float = 0.33):
+    """Returns (tests, origin of each test, kind of each test)."""
+    rng = random.Random(seed)
+    vocab = make_vocab(rng)
+    originals = []
+    tests, origins, kinds = [], [], []
+    for i in range(count):
+        if originals and rng.random() < copy_share:
+            origin = rng.randrange(len(originals))
+            words, body = originals[origin]
+            kind = rng.choice(COPY_KINDS)
+            if kind == "retitled":
+                tc = render(rng, vocab, ["Test"] + rng.sample(vocab, 5), body)
+            elif kind == "reworded":
+                shuffled = words[:]
+                rng.shuffle(shuffled)
+                rewritten = body[:]
+                for line in rng.sample(range(len(body)), 2):
+                    rewritten[line] = make_body(rng, vocab, 1)[0]
+                tc = render(rng, vocab, [w.upper() if rng.random() < 0.3 else w for w in shuffled], rewritten)
+            else:
+                extra = f"    assert {rng.choice(vocab)} is not None"
+                tc = render(rng, vocab, ["Test"] + rng.sample(vocab, 5), body + [extra])
+        else:
+            origin, kind = len(originals), "original"
+            words, body = ["Test"] + rng.sample(vocab, 5), make_body(rng, vocab)
+            originals.append((words, body))
+            tc = render(rng, vocab, words, body)
+        tests.append(tc)
+        origins.append(origin)
+        kinds.append(kind)
+    return tests, origins, kinds
+
+
+# Same request shape, different endpoint, payload and expected status: three tests, not one
+AUTH_TESTS = [{
+    "test_case_name": name,
+    "code": (f"def test_{path}_rejected(client):\n"
+             f"    print('[STEP] POST /api/auth/{path}')\n"
+             f"    resp = client.post('/api/auth/{path}', json={payload})\n"
+             f"    assert resp.status_code == {status}\n"
+             f"    assert resp.json()['detail'] == '{detail}'\n"),
+} for name, path, payload, status, detail in (
+    ("Login rejects a wrong password", "login", {"email": "a@b.com", "password": "wrong"}, 401, "Invalid credentials"),
+    ("Signup rejects a malformed email", "signup", {"email": "not-an-email", "password": "x1"}, 400, "Invalid email"),
+    ("Password reset rejects an unknown token", "reset", {"token": "expired"}, 422, "Invalid token"),
+)]
+
+
+def check_distinct():
+    clusters = cluster_tests(AUTH_TESTS)
+    verdict = "ok" if len(clusters) == len(AUTH_TESTS) else "MERGED DISTINCT TESTS"
+    print(f"distinct auth tests: {clusters} ({verdict})")
+    return verdict == "ok"
+
+
+def legacy_clusters(tests: list) -> list:
+    """The old deduplicate_tests: every name against every kept name, word-set Jaccard > 0.80."""
+    def similarity(s1, s2):
+        w1, w2 = set(s1.split()), set(s2.split())
+        return len(w1 & w2) / len(w1 | w2) if w1 or w2 else 0.0
+
+    kept = []  # (name, cluster)
+    for i, tc in enumerate(tests):
+        name = tc.get("test_case_name", "").lower().strip()
+        home = next((cluster for seen, cluster in kept if similarity(name, seen) > 0.80), None)
+        if home is None:
+            kept.append((name, [i]))
+        else:
+            home.append(i)
+    return [cluster for _, cluster in kept]
+
+
+def score(clusters: list, origins: list, kinds: list) -> dict:
+    cluster_of = {i: n for n, members in enumerate(clusters) for i in members}
+    original_index = {origins[i]: i for i in range(len(origins)) if kinds[i] == "original"}
+    found = {kind: [0, 0] for kind in COPY_KINDS}
+    for i, kind in enumerate(kinds):
+        if kind == "original":
+            continue
+        found[kind][1] += 1
+        found[kind][0] += cluster_of[i] == cluster_of[original_index[origins[i]]]
+    mixed = sum(1 for members in clusters if len({origins[i] for i in members}) > 1)
+    return {"found": found, "mixed": mixed, "clusters": len(clusters)}
+
+
+def report(label: str, size: int, seconds: float, result: dict):
+    found = "   ".join(f"{kind} {hit / max(1, total):4.0%}" for kind, (hit, total) in result["found"].items())
+    print(f"  {label:<8} {size:6d} tests  {seconds * 1000:9.1f} ms   {result['clusters']:6d} clusters   "
+          f"copies found: {found}   mixed clusters {result['mixed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=10000)
+    parser.add_argument("--legacy-max", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    if not check_distinct():
+        sys.exit(1)
+    sizes = sorted({s for s in (1000, 2000, 4000, args.tests // 2, args.tests, args.tests * 2) if 0 < s <= args.tests * 2})
+    legacy_run = None  # (size, seconds) of the largest legacy run
+    for size in sizes:
+        tests, origins, kinds = synthetic_tests(size, args.seed)
+        print(f"{size} synthetic tests ({sum(k != 'original' for k in kinds)} copies)")
+        start = time.perf_counter()
+        clusters = cluster_tests(tests)
+        report("lsh", size, time.perf_counter() - start, score(clusters, origins, kinds))
+        if size <= args.legacy_max:
+            start = time.perf_counter()
+            clusters = legacy_clusters(tests)
+            legacy_run = (size, time.perf_counter() - start)
+            report("legacy", size, legacy_run[1], score(clusters, origins, kinds))
+        elif legacy_run:
+            print(f"  legacy   {size:6d} tests  ~{legacy_run[1] * (size / legacy_run[0]) ** 2 * 1000:8.0f} ms   "
+                  f"(quadratic estimate from {legacy_run[0]} tests, not run)")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import csv
 import io
 import asyncio
 import tempfile
+from contextlib import asynccontextmanager
 
 if sys.platform.startswith("win"):
     # This fixes the "RuntimeError: Event loop is closed" on Windows
@@ -31,10 +32,15 @@ from dotenv import load_dotenv
 from services.database import engine, get_db, Base
 from services.db_models import User
 from services.auth import get_password_hash, verify_password, create_access_token
-from services.llm_chains import generate_tests_chain
+from services.llm_chains import generate_tests_chain, CodebasePrep, INGEST_MAX_CHARS
 from services.jira_exporter import JiraExporter
 from services.file_processor import FileProcessor
-from services.github_loader import get_github_project_files
+from services.github_fetcher import iter_github_project_files, github_tree_sha, GitHubFetchError, GITHUB_PREP_BATCH
+from services.content_sniffer import format_skip_report
+from services.response_cache import cache_mode_from_flags
+from services import client_registry
+from services.single_flight import get_single_flight, fingerprint, local_source, github_source, upload_source
+from collections import Counter
 
 
 load_dotenv()
@@ -42,7 +48,16 @@ load_dotenv()
 # Create DB Tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Sentinel AI Backend", version="3.3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider clients (and their connection pools) live as long as the server
+    await client_registry.startup()
+    try:
+        yield
+    finally:
+        await client_registry.shutdown()
+
+app = FastAPI(title="Sentinel AI Backend", version="3.3.0", lifespan=lifespan)
 
 # --- CORS (Allow All for Demo) ---
 app.add_middleware(
@@ -102,7 +117,11 @@ async def generate_tests_endpoint(request: Request):
     Returns a Stream of JSON Lines.
     """
     code_map = {}
+    skip_reasons = Counter()
+    focus = None
+    cache_mode = "use"
     content_type = request.headers.get("content-type", "")
+    flights = get_single_flight()
 
     try:
         # A. HANDLE FILE UPLOAD (Multipart)
@@ -113,47 +132,47 @@ async def generate_tests_endpoint(request: Request):
             # TYPE CHECK FIX: Ensure 'file' is actually an UploadFile object
             if not file or isinstance(file, str): 
                 raise HTTPException(400, "No file uploaded")
+            focus = form.get("focus") if isinstance(form.get("focus"), str) else None
+            cache_mode = cache_mode_from_flags(form.get("bypass_cache"), form.get("refresh_cache"))
+            key = fingerprint(await asyncio.to_thread(upload_source, file.file), {"focus": focus, "cache_mode": cache_mode})
+            if flights and flights.has(key):
+                return coalesced_response(key, None)
             
             # Now Pylance knows 'file' has .filename and .file
-            os.makedirs("temp_uploads", exist_ok=True)
-            temp_path = f"temp_uploads/{file.filename}"
-            
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Process Zip
-            code_map = FileProcessor().process_local_path(temp_path)
+            # Parse the ZIP straight from the spooled upload buffer: no temp copy on disk,
+            # so concurrent uploads with the same filename can't clobber each other.
+            processor = FileProcessor()
+            code_map = await asyncio.to_thread(processor.process_zip_stream, file.file)
+            skip_reasons = processor.skip_reasons
 
         # B. HANDLE LOCAL PATH / GITHUB (JSON)
         else:
             data = await request.json()
             path = data.get("path")
             mode = data.get("mode", "local")
+            # Optional: narrow the context to one area, e.g. "auth" or "payments"
+            focus = data.get("focus") if isinstance(data.get("focus"), str) else None
+            # bypass_cache: always call the models, store nothing; refresh_cache: call and overwrite
+            cache_mode = cache_mode_from_flags(data.get("bypass_cache"), data.get("refresh_cache"))
             
             if not path:
                 raise HTTPException(400, "Path required")
             
             if mode == "github":
-                # Call the real function we just fixed
-                # It returns a tuple: (map, count, error_count, error_msg)
-                files_map, count, err_count, err_msg = get_github_project_files(path)
-                
-                if err_msg:
-                    # If the loader returned an error (like Invalid URL), show it
-                    raise HTTPException(status_code=400, detail=err_msg)
-                
-                code_map = files_map
+                # Files are fetched asynchronously and streamed into the pipeline as they land.
+                # The key pins the tree SHA (an ETag-cached call the scan itself then reuses)
+                key = fingerprint(github_source(path, await github_tree_sha(path)), {"focus": focus, "cache_mode": cache_mode})
+                return coalesced_response(key, lambda: stream_github_generator(path, focus, cache_mode))
             else:
-                code_map = FileProcessor().process_local_path(path)
+                # Ingestion runs inside the shared pipeline, so identical requests also share the file walk
+                key = fingerprint(await asyncio.to_thread(local_source, path), {"focus": focus, "cache_mode": cache_mode})
+                return coalesced_response(key, lambda: stream_local_generator(path, focus, cache_mode))
 
         if not code_map:
             raise HTTPException(400, "No valid source code found in target.")
 
         # START STREAMING
-        return StreamingResponse(
-            stream_json_generator(code_map),
-            media_type="application/x-ndjson"
-        )
+        return coalesced_response(key, lambda: stream_json_generator(code_map, skip_reasons, focus, cache_mode))
 
     except Exception as e:
         print(f"Error in generate-tests: {e}")
@@ -161,11 +180,109 @@ async def generate_tests_endpoint(request: Request):
             yield json.dumps({"type": "error", "message": str(e)}) + "\n"
         return StreamingResponse(error_gen(), media_type="application/x-ndjson")
 
-async def stream_json_generator(code_map):
+async def error_stream(message: str):
+    yield json.dumps({"type": "error", "message": message}) + "\n"
+
+def coalesced_response(key: str, factory):
+    """
+    NDJSON response for one pipeline run. Identical concurrent requests (same source, same
+    options) attach to the run already in flight and get its events replayed, then live.
+    `factory` is None when a run for `key` was just found in flight (nothing was ingested).
+    """
+    flights = get_single_flight()
+    expired = "The identical scan this request joined has expired. Please retry."
+    if flights is None:
+        stream = factory() if factory is not None else error_stream(expired)
+        return StreamingResponse(stream, media_type="application/x-ndjson")
+    joined = json.dumps({"type": "status", "message": "🔗 Attached to an identical scan already running (earlier events replayed)", "coalesced": True}) + "\n"
+    if factory is not None:
+        return StreamingResponse(flights.subscribe(key, factory, joined), media_type="application/x-ndjson")
+
+    async def join_or_expired():
+        # The run may expire between the check and the first read. The error goes to this
+        # client only: registering it as a flight would hand it to every identical upload
+        try:
+            async for event in flights.subscribe(key, None, joined):
+                yield event
+        except LookupError:
+            async for event in error_stream(expired):
+                yield event
+    return StreamingResponse(join_or_expired(), media_type="application/x-ndjson")
+
+async def stream_json_generator(code_map, skip_reasons=None, focus=None, cache_mode="use", prep=None):
     """Helper to ensure valid JSON lines are sent for the Waterfall UI"""
-    async for chunk in generate_tests_chain(code_map):
+    if skip_reasons:
+        yield json.dumps({
+            "type": "status",
+            "message": f"🧹 Skipped {sum(skip_reasons.values())} files: {format_skip_report(skip_reasons)}",
+            "skipped": dict(skip_reasons)
+        }) + "\n"
+    async for chunk in generate_tests_chain(code_map, focus=(focus or "").strip() or None, cache_mode=cache_mode, prep=prep):
         yield json.dumps(chunk) + "\n"
 
+async def stream_local_generator(path: str, focus: Optional[str] = None, cache_mode: str = "use"):
+    """Reads a local path, then runs the chain on it."""
+    try:
+        # Read what the chain can use (shards, packer ranking), not the small single-prompt budget
+        processor = FileProcessor(max_total_chars=INGEST_MAX_CHARS)
+        code_map = await asyncio.to_thread(processor.process_local_path, path)
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+        return
+    if not code_map:
+        yield json.dumps({"type": "error", "message": "No valid source code found in target."}) + "\n"
+        return
+    async for line in stream_json_generator(code_map, processor.skip_reasons, focus, cache_mode):
+        yield line
+
+async def stream_github_generator(repo_url: str, focus: Optional[str] = None, cache_mode: str = "use"):
+    """
+    Streams download progress while the async fetcher assembles the code map, then runs the chain.
+    Files are prepared (dedup signatures, imports, search terms) in batches while the rest are still downloading.
+    """
+    code_map = {}
+    skip_reasons = Counter()
+    prep = CodebasePrep(search_terms=bool((focus or "").strip()))
+    batches: asyncio.Queue = asyncio.Queue()
+
+    async def prepare():
+        while (batch := await batches.get()) is not None:
+            await asyncio.to_thread(prep.add, batch)
+
+    preparing = asyncio.create_task(prepare())
+    batch = []
+    yield json.dumps({"type": "status", "message": "📡 Connecting to GitHub..."}) + "\n"
+    try:
+        async for rel_path, content in iter_github_project_files(repo_url, skip_reasons):
+            code_map[rel_path] = content
+            batch.append((rel_path, content))
+            if len(batch) == GITHUB_PREP_BATCH:
+                batches.put_nowait(batch)
+                batch = []
+            if len(code_map) % 25 == 0:
+                yield json.dumps({"type": "status", "message": f"📥 Loaded {len(code_map)} files..."}) + "\n"
+        batches.put_nowait(batch)
+        batches.put_nowait(None)
+        await preparing
+    except GitHubFetchError as e:
+        yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+        return
+    except Exception as e:
+        print(f"Error in GitHub fetch: {e}")
+        yield json.dumps({"type": "error", "message": f"GitHub connection failed: {e}"}) + "\n"
+        return
+    finally:
+        preparing.cancel()
+
+    if not code_map:
+        yield json.dumps({"type": "error", "message": "No code files found in this repository."}) + "\n"
+        return
+
+    yield json.dumps({"type": "status", "message": f"✅ Loaded {len(code_map)} files from GitHub."}) + "\n"
+    async for line in stream_json_generator(code_map, skip_reasons, focus, cache_mode, prep):
+        yield line
+
 # --- EXECUTION & EXPORT ENDPOINTS ---
 
 @app.post("/api/run-test")
@@ -262,7 +379,4 @@ async def export_csv_endpoint(req: CSVExportRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    if os.path.exists("temp_uploads"):
-        shutil.rmtree("temp_uploads")
-    
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=False)
\ No newline at end of file
@@ -46,6 +46,9 @@ class TestCase(BaseModel):
     # 👇 CRITICAL FOR BAR CHART
     complexity: str = "Medium" 
 
+    # Duplicates the ensemble merged into this test (name, model, confidence)
+    merged_tests: Optional[List[Dict[str, Any]]] = None
+
 class TestCaseList(BaseModel):
     test_cases: List[TestCase]
 
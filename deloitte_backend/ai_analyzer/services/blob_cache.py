@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional, Tuple, Any
+
+# --- Cache Location ---
+# Lives next to sentinel.db by default; override with SENTINEL_CACHE_DIR
+CACHE_DIR = os.environ.get(
+    "SENTINEL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".sentinel_cache")
+)
+BLOB_CACHE_MAX_MB = int(os.environ.get("SENTINEL_BLOB_CACHE_MB", "512"))
+
+
+def git_blob_sha(data: bytes) -> str:
+    """The SHA git gives these bytes as a blob (`git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _atomic_write(path: str, data: bytes):
+    """Write to a temp file and rename, so a crash never leaves a half-written entry."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class BlobCache:
+    """
+    Content-addressed store of decoded file contents keyed by git blob SHA.
+    A SHA never changes meaning, so entries never go stale - they only get evicted.
+    Eviction is LRU by file mtime (touched on every hit), bounded by max_bytes.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = os.path.join(root or CACHE_DIR, "blobs")
+        self.max_bytes = max_bytes if max_bytes is not None else BLOB_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # Lazily computed on first write
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], sha)
+
+    def get(self, sha: str) -> Optional[str]:
+        path = self._path(sha)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return data.decode("utf-8")
+
+    def put(self, sha: str, content: str):
+        data = content.encode("utf-8")
+        path = self._path(sha)
+        if os.path.exists(path):
+            return
+        try:
+            _atomic_write(path, data)
+        except OSError as e:
+            print(f"⚠️ Blob cache write failed for {sha}: {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    yield entry
+
+    def _scan_size(self) -> int:
+        return sum(e.stat().st_size for e in self._entries())
+
+    def _evict(self):
+        """Drop least recently used blobs until we're back under 90% of the budget."""
+        entries = sorted(
+            (st.st_mtime, st.st_size, e.path)
+            for e in self._entries()
+            for st in (e.stat(),)
+        )
+        target = int(self.max_bytes * 0.9)
+        size = sum(s for _, s, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= entry_size
+            except OSError:
+                pass
+        self._size = size
+
+
+class ETagCache:
+    """
+    Remembers the ETag and JSON body of API responses so repeat calls can be
+    sent with If-None-Match. A 304 answer means the stored body is still valid.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.join(root or CACHE_DIR, "etags")
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Tuple[Optional[str], Any]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            return entry.get("etag"), entry.get("body")
+        except (OSError, ValueError):
+            return None, None
+
+    def put(self, url: str, etag: Optional[str], body: Any):
+        if not etag:
+            return
+        try:
+            _atomic_write(self._path(url), json.dumps({"etag": etag, "body": body}).encode("utf-8"))
+        except OSError as e:
+            print(f"⚠️ ETag cache write failed: {e}")
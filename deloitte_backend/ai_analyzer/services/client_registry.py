@@ -0,0 +1,119 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from google import genai
+from google.genai import types
+from dotenv import load_dotenv
+
+from .prompt_cache import get_prompt_cache
+
+load_dotenv()
+
+# --- Connection Pool (shared by every request to a provider) ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("SENTINEL_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("SENTINEL_HTTP_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_TIMEOUT_S = float(os.getenv("SENTINEL_HTTP_TIMEOUT_S", "300"))
+
+# live: real APIs | record: real APIs, responses saved as fixtures (see fake_provider.py) |
+# replay: recorded fixtures only | fake: fixtures when recorded, else synthetic responses
+LLM_MODES = ("live", "fake", "replay", "record")
+LLM_MODE = os.getenv("SENTINEL_LLM_MODE", "live").lower()
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_http_pools: Dict[str, httpx.AsyncClient] = {}
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_KEEPALIVE_CONNECTIONS)
+
+
+def register_client(provider: str, client: Any):
+    """Installs a client for `provider` (e.g. a fake one in benchmarks). None removes it."""
+    with _lock:
+        if client is None:
+            _clients.pop(provider, None)
+        else:
+            _clients[provider] = client
+
+
+def offline() -> bool:
+    """Provider calls are answered locally (SENTINEL_LLM_MODE=fake|replay): no API keys needed."""
+    return LLM_MODE in ("fake", "replay")
+
+
+def get_gemini_client() -> Optional[genai.Client]:
+    """The process-wide google-genai client (async calls via .aio), or None without GEMINI_API_KEY."""
+    with _lock:
+        if "gemini" not in _clients:
+            if offline():
+                from .fake_provider import FakeGenAIClient, FakeEngine, FixtureStore
+                _clients["gemini"] = FakeGenAIClient(FakeEngine("gemini", FixtureStore(), strict=LLM_MODE == "replay"))
+                return _clients["gemini"]
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                return None
+            pool = httpx.AsyncClient(limits=_pool_limits(), timeout=HTTP_TIMEOUT_S)
+            _http_pools["gemini"] = pool
+            _clients["gemini"] = genai.Client(api_key=api_key, http_options=types.HttpOptions(httpx_async_client=pool))
+            if LLM_MODE == "record":
+                from .fake_provider import RecordingGenAIClient
+                _clients["gemini"] = RecordingGenAIClient(_clients["gemini"])
+        return _clients["gemini"]
+
+
+def get_anthropic_client():
+    """The process-wide AsyncAnthropic client, or None without CLAUDE_API_KEY."""
+    with _lock:
+        if "anthropic" not in _clients:
+            if offline():
+                from .fake_provider import FakeAnthropicClient, FakeEngine, FixtureStore
+                _clients["anthropic"] = FakeAnthropicClient(FakeEngine("anthropic", FixtureStore(), strict=LLM_MODE == "replay"))
+                return _clients["anthropic"]
+            api_key = os.getenv("CLAUDE_API_KEY")
+            if not api_key:
+                return None
+            from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+            _clients["anthropic"] = AsyncAnthropic(
+                api_key=api_key,
+                # Retries are the provider scheduler's job; SDK retries would stack on top of it
+                max_retries=0,
+                timeout=HTTP_TIMEOUT_S,
+                http_client=DefaultAsyncHttpxClient(limits=_pool_limits()),
+            )
+            if LLM_MODE == "record":
+                from .fake_provider import RecordingAnthropicClient
+                _clients["anthropic"] = RecordingAnthropicClient(_clients["anthropic"])
+        return _clients["anthropic"]
+
+
+async def startup():
+    """FastAPI startup: build the clients once, before the first request needs them."""
+    ready = [name for name, client in (("gemini", get_gemini_client()), ("anthropic", get_anthropic_client())) if client]
+    mode = "" if LLM_MODE == "live" else f" [{LLM_MODE} mode]"
+    print(f"🔌 Provider clients ready{mode}: {', '.join(ready) or 'none (no API keys)'}")
+
+
+async def shutdown():
+    """FastAPI shutdown: delete our Gemini context caches, close pooled connections."""
+    with _lock:
+        clients = dict(_clients)
+        pools = dict(_http_pools)
+        _clients.clear()
+        _http_pools.clear()
+    prompt_cache = get_prompt_cache()
+    if prompt_cache and clients.get("gemini") is not None:
+        # Context caches bill storage until they expire: drop them with the process
+        await prompt_cache.release(clients["gemini"])
+    for name, client in clients.items():
+        try:
+            if name == "gemini" and hasattr(client, "aio"):
+                await client.aio.aclose()
+            elif hasattr(client, "close"):
+                await client.close()
+        except Exception as e:
+            print(f"⚠️ Closing {name} client failed: {e}")
+    for pool in pools.values():
+        await pool.aclose()
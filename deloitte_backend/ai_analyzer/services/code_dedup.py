@@ -0,0 +1,147 @@
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# --- Tuning ---
+SHINGLE_SIZE = 4             # Tokens per shingle
+SKETCH_SIZE = 64             # Bottom-k MinHash sketch length
+LSH_BANDS = 6                # Bucket keys per file: adjacent pairs of its smallest hashes
+MAX_BUCKET = 64              # Buckets bigger than this are boilerplate, not duplicates
+NEAR_DUP_THRESHOLD = 0.85    # Estimated Jaccard similarity to merge two files
+MIN_TOKENS = 30              # Too little signal below this; exact matching only
+
+TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[^\sA-Za-z0-9_]')
+
+# Directories that usually hold the copy rather than the original
+_SECONDARY_DIRS = {'vendor', 'vendored', 'third_party', 'thirdparty', 'external', 'generated', 'gen', 'backup', 'old'}
+
+
+def _sketch(tokens: List[str]) -> List[int]:
+    """Bottom-k MinHash: the k smallest distinct shingle hashes (one hash function, one sort)."""
+    hashes = set(map(hash, zip(*(tokens[i:] for i in range(SHINGLE_SIZE)))))
+    return sorted(hashes)[:SKETCH_SIZE]
+
+
+def _estimate_jaccard(a: List[int], b: List[int]) -> float:
+    """Bottom-k estimator: share of the union's k smallest hashes present in both sketches."""
+    set_a, set_b = set(a), set(b)
+    union_bottom = sorted(set_a | set_b)[:SKETCH_SIZE]
+    if not union_bottom:
+        return 0.0
+    both = sum(1 for h in union_bottom if h in set_a and h in set_b)
+    return both / len(union_bottom)
+
+
+def _representative_rank(path: str) -> Tuple[int, int, str]:
+    lowered = path.lower().replace('\\', '/')
+    parts = lowered.split('/')
+    secondary = any(p in _SECONDARY_DIRS for p in parts[:-1]) or 'copy' in parts[-1]
+    return (1 if secondary else 0, len(parts), lowered)
+
+
+class _UnionFind:
+    def __init__(self, items):
+        self.parent = {i: i for i in items}
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+FileSignature = Tuple[bytes, int, Optional[List[int]]]  # (digest, token count, sketch)
+
+
+def file_signature(content: str) -> FileSignature:
+    """Everything collapse_duplicates needs from one file, so it can be computed as files arrive."""
+    tokens = TOKEN_RE.findall(content)
+    digest = hashlib.sha1(' '.join(tokens).encode('utf-8', errors='ignore')).digest()
+    return digest, len(tokens), _sketch(tokens) if len(tokens) >= MIN_TOKENS else None
+
+
+def collapse_duplicates(code_map: Dict[str, str],
+                        signatures: Optional[Dict[str, FileSignature]] = None) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+    """
+    Collapses exact and near-duplicate files to one representative each.
+    Returns (deduped_code_map, aliases) where aliases maps a representative to the
+    paths it stands in for. Linear in the repo size: one sketch per file, LSH
+    buckets for candidate pairs, and a similarity check only within buckets.
+    `signatures` holds file_signature() results already computed (e.g. during the download).
+    """
+    if len(code_map) < 2:
+        return dict(code_map), {}
+
+    paths = list(code_map)
+    uf = _UnionFind(paths)
+    signatures = signatures or {}
+
+    # 1. Exact duplicates (whitespace-insensitive)
+    by_digest = {}
+    signature_of = {}
+    for path in paths:
+        signature = signatures.get(path) or file_signature(code_map[path])
+        signature_of[path] = signature
+        digest = signature[0]
+        if digest in by_digest:
+            uf.union(by_digest[digest], path)
+        else:
+            by_digest[digest] = path
+
+    # 2. Near duplicates among the exact-unique files
+    sketches = {}
+    token_counts = {path: signature[1] for path, signature in signature_of.items()}
+    buckets = defaultdict(list)
+    for path in by_digest.values():
+        sketch = signature_of[path][2]
+        if sketch is None:
+            continue
+        sketches[path] = sketch
+        # Near-identical files share most of their bottom ranks, so adjacent pairs
+        # collide for them while one shared boilerplate shingle alone doesn't
+        for i in range(min(LSH_BANDS, len(sketch) - 1)):
+            buckets[(sketch[i], sketch[i + 1])].append(path)
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > MAX_BUCKET:
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                pair = (a, b) if a < b else (b, a)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                # Jaccard can't exceed the size ratio: skip the estimate when sizes differ too much
+                len_a, len_b = token_counts[a], token_counts[b]
+                if min(len_a, len_b) < NEAR_DUP_THRESHOLD * max(len_a, len_b):
+                    continue
+                if _estimate_jaccard(sketches[a], sketches[b]) >= NEAR_DUP_THRESHOLD:
+                    uf.union(a, b)
+
+    # 3. Pick one representative per cluster, keep first-seen order of the input
+    clusters = defaultdict(list)
+    for path in paths:
+        clusters[uf.find(path)].append(path)
+
+    representative_of = {}
+    aliases = {}
+    for members in clusters.values():
+        rep = min(members, key=_representative_rank)
+        for m in members:
+            representative_of[m] = rep
+        if len(members) > 1:
+            aliases[rep] = sorted(m for m in members if m != rep)
+
+    deduped = {}
+    for path in paths:
+        rep = representative_of[path]
+        if rep not in deduped:
+            deduped[rep] = code_map[rep]
+    return deduped, aliases
@@ -0,0 +1,263 @@
+import os
+import re
+import gzip
+import json
+import math
+import bisect
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .blob_cache import CACHE_DIR, _atomic_write
+from .context_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# --- Search Settings ---
+SEARCH_INDEX_DIR = os.path.join(CACHE_DIR, "search")
+SEARCH_INDEX_KEEP = int(os.environ.get("SENTINEL_SEARCH_INDEX_KEEP", "20"))   # Persisted runs kept on disk
+BM25_K1 = 1.2
+BM25_B = 0.75
+FOCUS_FULL_FILE_TOKENS = 1500   # Bigger hits are trimmed to their matching definitions
+FOCUS_MAX_CHUNKS = 4            # Matching definitions kept per trimmed file
+PREFIX_MIN_LEN = 3              # Shorter query terms only match exactly
+PREFIX_WEIGHT = 0.6             # "auth" hitting `authenticate` counts less than an exact "auth"
+PREFIX_MAX_TERMS = 64           # Expansions per query term, in term order
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z][A-Za-z0-9]*')
+# Definitions at any depth (methods too), so a hit can be cut down to the function that matched
+DEFINITION_RE = re.compile(
+    r'\n[ \t]*(?:@|(?:async[ \t]+)?def |class |(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function\b|func |fn |'
+    r'(?:public|private|protected|internal)[ \t][^;=\n]*\()'
+)
+# "parseHTTPResponse2" -> parse, HTTP, Response, 2
+CAMEL_PART_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+# Language keywords carry no signal about what code is about
+STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'not', 'if', 'else', 'elif', 'for', 'while', 'in', 'is',
+    'return', 'def', 'class', 'import', 'from', 'as', 'self', 'this', 'none', 'null', 'true',
+    'false', 'function', 'const', 'let', 'var', 'new', 'public', 'private', 'static', 'void',
+    'int', 'str', 'string', 'to', 'of', 'with', 'try', 'except', 'catch', 'async', 'await',
+}
+
+
+def split_identifier(identifier: str) -> List[str]:
+    """snake_case and camelCase parts, lowercased, without stop words."""
+    parts = [p.lower() for p in CAMEL_PART_RE.findall(identifier)]
+    return [p for p in parts if len(p) > 1 and p not in STOP_WORDS]
+
+
+def document_terms(path: str, content: str, split_memo: Optional[Dict[str, List[str]]] = None) -> Counter:
+    """Identifier-part counts of one file. The path is part of the document: "payments/views.py" is about payments."""
+    split_memo = split_memo if split_memo is not None else {}
+    terms = Counter()
+    # Identifiers repeat a lot: count them at C speed, split each distinct one once
+    for ident, count in Counter(IDENTIFIER_RE.findall(str(content))).items():
+        parts = split_memo.get(ident)
+        if parts is None:
+            parts = split_memo[ident] = split_identifier(ident)
+        for part in parts:
+            terms[part] += count
+    for ident in IDENTIFIER_RE.findall(path):
+        for part in split_identifier(ident):
+            terms[part] += 1
+    return terms
+
+
+def code_map_digest(code_map: Dict[str, str]) -> str:
+    h = hashlib.sha1()
+    for path in sorted(code_map):
+        h.update(path.encode('utf-8', errors='ignore'))
+        h.update(hashlib.sha1(str(code_map[path]).encode('utf-8', errors='ignore')).digest())
+    return h.hexdigest()
+
+
+def _chunk_spans(content: str) -> List[Tuple[int, int]]:
+    """Definitions as (start, end) offsets; the file head (imports) is its own chunk."""
+    starts = [0] + [m.start() + 1 for m in DEFINITION_RE.finditer(content)]
+    # Decorator lines and the def under them belong together
+    merged = []
+    for s in starts:
+        if merged and content[merged[-1]:s].lstrip().startswith('@') and content.count('\n', merged[-1], s) <= 1:
+            continue
+        merged.append(s)
+    return [(s, e) for s, e in zip(merged, merged[1:] + [len(content)])]
+
+
+class CodeSearchIndex:
+    """
+    BM25 inverted index over the code map, one document per file. Terms are
+    identifier parts, and a query term also matches the terms it prefixes (bisect
+    over the sorted term list), so "auth" matches `AuthService` and, weighted down,
+    `authenticate_user`. Pure Python, no embeddings, no network. Definitions inside
+    the top files are scored at query time (see focus_code_map), which keeps the build one pass.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.lengths: List[int] = []                 # Terms per file
+        self.postings: Dict[str, List[int]] = {}     # term -> flat [doc id, tf, doc id, tf, ...]
+        self.avg_len = 0.0
+        self._sorted_terms: Optional[List[str]] = None  # Built on first prefix lookup
+
+    @classmethod
+    def build(cls, code_map: Dict[str, str], doc_terms: Optional[Dict[str, Counter]] = None) -> "CodeSearchIndex":
+        """`doc_terms` ({path: document_terms(...)}) skips tokenizing files counted during ingestion."""
+        index = cls()
+        postings = index.postings
+        split_memo: Dict[str, List[str]] = {}
+        doc_terms = doc_terms or {}
+        for doc_id, (path, content) in enumerate(code_map.items()):
+            index.paths.append(path)
+            terms = doc_terms.get(path)
+            if terms is None:
+                terms = document_terms(path, content, split_memo)
+            index.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                plist = postings.get(term)
+                if plist is None:
+                    postings[term] = [doc_id, tf]
+                else:
+                    plist.append(doc_id)
+                    plist.append(tf)
+        index.avg_len = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ())) // 2
+        n = len(self.paths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5)) if df else 0.0
+
+    def expand(self, term: str) -> List[Tuple[str, float]]:
+        """Index terms matching a query term as (term, weight): itself, then the terms it prefixes."""
+        matches = [(term, 1.0)] if term in self.postings else []
+        if len(term) < PREFIX_MIN_LEN:
+            return matches
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        terms = self._sorted_terms
+        i = bisect.bisect_right(terms, term)
+        while i < len(terms) and len(matches) < PREFIX_MAX_TERMS and terms[i].startswith(term):
+            matches.append((terms[i], PREFIX_WEIGHT))
+            i += 1
+        return matches
+
+    def query_weights(self, query: str) -> Dict[str, float]:
+        """Every index term the query reaches, with its weight (exact beats prefix)."""
+        weights: Dict[str, float] = {}
+        for term in query_terms(query):
+            for match, weight in self.expand(term):
+                weights[match] = max(weight, weights.get(match, 0.0))
+        return weights
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Top-k (path, bm25 score) for the query, best first."""
+        scores: Dict[int, float] = {}
+        for term in query_terms(query):
+            # A file counts once per query term: its best exact or prefix match
+            best: Dict[int, float] = {}
+            for match, weight in self.expand(term):
+                postings = self.postings[match]
+                idf = self.idf(match)
+                for doc_id, tf in zip(postings[::2], postings[1::2]):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / (self.avg_len or 1))
+                    score = weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            for doc_id, score in best.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.paths[doc_id], score) for doc_id, score in best]
+
+    # --- Persistence ---
+    def to_bytes(self) -> bytes:
+        payload = {"paths": self.paths, "lengths": self.lengths, "postings": self.postings, "avg_len": self.avg_len}
+        return gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compresslevel=3)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CodeSearchIndex":
+        payload = json.loads(gzip.decompress(data))
+        index = cls()
+        index.paths = payload["paths"]
+        index.lengths = payload["lengths"]
+        index.postings = payload["postings"]
+        index.avg_len = payload["avg_len"]
+        return index
+
+
+def query_terms(query: str) -> set:
+    return {t for ident in IDENTIFIER_RE.findall(query) for t in split_identifier(ident)}
+
+
+def _rank_chunks(content: str, weights: Dict[str, float], index: CodeSearchIndex) -> List[Tuple[int, int]]:
+    """Definitions of one file that mention the query, best first (saturated tf x idf)."""
+    ranked = []
+    for start, end in _chunk_spans(content):
+        score = 0.0
+        counts = Counter(t for ident in IDENTIFIER_RE.findall(content, start, end) for t in split_identifier(ident) if t in weights)
+        for term, tf in counts.items():
+            score += weights[term] * index.idf(term) * tf / (tf + BM25_K1)
+        if score:
+            ranked.append((score, start, end))
+    ranked.sort(reverse=True)
+    return [(start, end) for _, start, end in ranked]
+
+
+def load_or_build_index(code_map: Dict[str, str], index_dir: str = SEARCH_INDEX_DIR,
+                        doc_terms: Optional[Dict[str, Counter]] = None) -> CodeSearchIndex:
+    """
+    Index for this exact code map: reloaded when the same run/repo state was indexed before.
+    `doc_terms` are per-file term counts already taken during ingestion (see CodeSearchIndex.build).
+    """
+    path = os.path.join(index_dir, f"{code_map_digest(code_map)}.json.gz")
+    try:
+        with open(path, "rb") as f:
+            index = CodeSearchIndex.from_bytes(f.read())
+        os.utime(path)
+        return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = CodeSearchIndex.build(code_map, doc_terms)
+    try:
+        _atomic_write(path, index.to_bytes())
+        # Keep only the most recent runs
+        entries = sorted(
+            (os.path.join(index_dir, name) for name in os.listdir(index_dir) if name.endswith(".json.gz")),
+            key=os.path.getmtime, reverse=True
+        )
+        for stale in entries[SEARCH_INDEX_KEEP:]:
+            os.remove(stale)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not persist search index: {e}")
+    return index
+
+
+def focus_code_map(code_map: Dict[str, str], query: str, top_k: int,
+                   index: Optional[CodeSearchIndex] = None) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """
+    The part of the code map relevant to `query`: the top-k files, with large
+    files trimmed to their head (imports) and best-matching definitions.
+    Returns (focused_map, {path: bm25 score}); both empty when nothing matches.
+    """
+    index = index or load_or_build_index(code_map)
+    weights = index.query_weights(query)
+    focused, relevance = {}, {}
+    for path, score in index.search(query, top_k):
+        content = str(code_map[path])
+        relevance[path] = score
+        if estimate_tokens(content) <= FOCUS_FULL_FILE_TOKENS:
+            focused[path] = content
+            continue
+        spans = _chunk_spans(content)
+        keep = sorted(set(_rank_chunks(content, weights, index)[:FOCUS_MAX_CHUNKS]) | {spans[0]})
+        parts, last_end = [], 0
+        for start, end in keep:
+            if start > last_end:
+                parts.append("\n# ...\n" if path.endswith('.py') else "\n// ...\n")
+            parts.append(content[start:end])
+            last_end = end
+        focused[path] = "".join(parts)
+    return focused, relevance
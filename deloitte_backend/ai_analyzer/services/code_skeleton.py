@@ -0,0 +1,393 @@
+import os
+import re
+import ast
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from .context_packer import estimate_tokens
+
+# --- Compression Settings ---
+# "none": source as-is
+# "light": fold long function bodies, keep short ones, docstrings and module-level code
+# "outline": fold every function body and big literal assignments, keep only first
+#            docstring lines, drop comment-only lines
+LEVELS = ("none", "light", "outline")
+LIGHT_MAX_BODY_LINES = 8        # "light" keeps bodies up to this many lines
+OUTLINE_MAX_VALUE_LINES = 3     # "outline" folds module/class assignments longer than this
+LIGHT_MAX_RATIO = 4             # "auto" skips "light" when sources exceed the budget by more than this
+MAX_SHAPES = 4                  # raise/return/call shapes listed per folded body
+SKELETON_CACHE_ENTRIES = int(os.environ.get("SENTINEL_SKELETON_CACHE_ENTRIES", "20000"))
+
+PYTHON_EXTENSIONS = {'.py', '.pyi'}
+BRACE_EXTENSIONS = {
+    '.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs', '.java', '.kt', '.scala', '.go',
+    '.cs', '.c', '.cpp', '.h', '.hpp', '.rs', '.swift', '.php',
+}
+
+_cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _fold_note(comment: str, lines: int, raises: List[str], returns: List[str], calls: List[str]) -> str:
+    parts = [f"... {lines} lines folded"]
+    if raises:
+        parts.append("raises: " + ", ".join(raises[:MAX_SHAPES]))
+    if returns:
+        parts.append("returns: " + ", ".join(returns[:MAX_SHAPES]))
+    if calls:
+        parts.append("calls: " + ", ".join(calls[:MAX_SHAPES]))
+    return f"{comment} " + " | ".join(parts)
+
+
+# ==========================================
+# 1. PYTHON (ast)
+# ==========================================
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else node.attr
+    if isinstance(node, ast.Call):
+        return _dotted_name(node.func)
+    return None
+
+
+def _value_shape(node: Optional[ast.AST]) -> str:
+    """What a return statement hands back, as a short type-ish label."""
+    if node is None:
+        return "None"
+    if isinstance(node, ast.Constant):
+        return "None" if node.value is None else type(node.value).__name__
+    if isinstance(node, (ast.Dict, ast.DictComp)):
+        return "dict"
+    if isinstance(node, (ast.List, ast.ListComp)):
+        return "list"
+    if isinstance(node, (ast.Tuple,)):
+        return "tuple"
+    if isinstance(node, (ast.Set, ast.SetComp)):
+        return "set"
+    if isinstance(node, ast.GeneratorExp):
+        return "generator"
+    if isinstance(node, (ast.Compare, ast.BoolOp)) or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)):
+        return "bool"
+    if isinstance(node, ast.JoinedStr):
+        return "str"
+    if isinstance(node, ast.Await):
+        return _value_shape(node.value)
+    name = _dotted_name(node)
+    if name:
+        return f"{name}(...)" if isinstance(node, ast.Call) else name
+    return type(node).__name__.lower()
+
+
+def _body_shapes(func: ast.AST) -> Tuple[List[str], List[str], List[str]]:
+    """raise / return / call shapes of a function, not descending into nested defs."""
+    raises, returns, calls = [], [], []
+    queue = deque(ast.iter_child_nodes(func))
+    while queue:
+        node = queue.popleft()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Raise):
+            shape = _dotted_name(node.exc) if node.exc is not None else "re-raise"
+            if shape and shape not in raises:
+                raises.append(shape)
+        elif isinstance(node, ast.Return):
+            shape = _value_shape(node.value)
+            if shape not in returns:
+                returns.append(shape)
+        elif isinstance(node, ast.Call):
+            # Dotted calls are the collaborators a test will want to mock
+            name = _dotted_name(node.func)
+            if name and '.' in name and name not in calls:
+                calls.append(name)
+        queue.extend(ast.iter_child_nodes(node))
+    return raises, returns, calls
+
+
+def _docstring_node(func: ast.AST) -> Optional[ast.Expr]:
+    body = getattr(func, 'body', [])
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        return body[0]
+    return None
+
+
+def _compress_python(content: str, level: str) -> str:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return content
+
+    # Not splitlines(): ast counts only \n line breaks, not form feeds and friends
+    lines = content.split('\n')
+    edits = []  # (first_line, last_line, replacement) with 1-based inclusive line numbers
+    kept = set()  # Continuation lines of statements we keep (may hold multi-line strings)
+
+    def doc_summary(doc) -> str:
+        summary = doc.value.value.strip().splitlines()[0] if doc.value.value.strip() else ""
+        summary = summary.replace('\\', '\\\\').replace('"', '\\"')
+        return f'{lines[doc.lineno - 1][:doc.col_offset]}"""{summary}"""'
+
+    def trim_docstring(owner):
+        doc = _docstring_node(owner)
+        if doc and level == "outline" and doc.end_lineno > doc.lineno:
+            edits.append((doc.lineno, doc.end_lineno, [doc_summary(doc)]))
+
+    def visit(nodes):
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                trim_docstring(node)
+                visit(node.body)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                fold_function(node)
+            elif not (isinstance(node, (ast.Assign, ast.AnnAssign)) and level == "outline" and fold_assignment(node)):
+                kept.update(range(node.lineno + 1, node.end_lineno + 1))
+
+    def fold_assignment(node) -> bool:
+        # Big literal tables (mappings, fixtures, settings) keep their name only
+        span = node.end_lineno - node.lineno + 1
+        if span <= OUTLINE_MAX_VALUE_LINES or node.value is None:
+            return False
+        indent = lines[node.lineno - 1][:node.col_offset]
+        if isinstance(node, ast.AnnAssign):
+            target = f"{ast.unparse(node.target)}: {ast.unparse(node.annotation)}"
+        else:
+            target = " = ".join(ast.unparse(t) for t in node.targets)
+        edits.append((node.lineno, node.end_lineno, [f"{indent}{target} = ...  # {span} lines folded"]))
+        return True
+
+    def fold_function(node):
+        doc = _docstring_node(node)
+        body = node.body[1:] if doc else node.body
+        if not body or body[0].lineno == node.lineno:
+            kept.update(range(node.lineno + 1, node.end_lineno + 1))
+            return  # One-liner or docstring only
+        # A decorated statement starts at its first decorator, not at "def"/"class"
+        first = min([body[0].lineno] + [d.lineno for d in getattr(body[0], 'decorator_list', [])])
+        last = node.end_lineno
+        if first == last:
+            kept.update(range(node.lineno + 1, node.end_lineno + 1))
+            return  # Folding a single line only makes it longer
+        if level == "light" and last - first + 1 <= LIGHT_MAX_BODY_LINES:
+            # Short enough to keep as-is, but its nested functions may still be long
+            visit(node.body)
+            return
+
+        indent = lines[body[0].lineno - 1][:body[0].col_offset]
+        raises, returns, calls = _body_shapes(node)
+        note = _fold_note("#", last - first + 1, raises, returns, calls)
+        replacement = [f"{indent}{note}", f"{indent}..."]
+
+        if doc and level == "outline" and doc.end_lineno > doc.lineno:
+            edits.append((doc.lineno, last, [doc_summary(doc)] + replacement))
+        else:
+            edits.append((first, last, replacement))
+
+    trim_docstring(tree)
+    visit(tree.body)
+
+    if level == "outline":
+        # Comment-only lines between statements (never inside a kept statement, where they could be string content)
+        for first, last, _ in edits:
+            kept.update(range(first, last + 1))
+        edits.extend(
+            (n, n, []) for n, line in enumerate(lines, 1)
+            if n not in kept and line.lstrip().startswith('#')
+        )
+
+    for first, last, replacement in sorted(edits, reverse=True):
+        lines[first - 1:last] = replacement
+    return "\n".join(lines)
+
+
+# ==========================================
+# 2. BRACE LANGUAGES (lightweight outline)
+# ==========================================
+
+_CONTROL_WORDS = {
+    'if', 'else', 'for', 'while', 'switch', 'catch', 'do', 'try', 'finally', 'return',
+    'new', 'throw', 'case', 'await', 'yield', 'typeof', 'delete', 'synchronized', 'using', 'lock',
+}
+_CONTAINER_RE = re.compile(
+    r'^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|internal\s+|abstract\s+|'
+    r'static\s+|final\s+|sealed\s+|partial\s+|data\s+|open\s+)*'
+    r'(?:class|interface|enum|struct|trait|impl|namespace|module|object|record)\b'
+)
+_THROW_RE = re.compile(r'\bthrow\s+(?:new\s+)?([A-Za-z_][\w.]*)|\bpanic\s*\(|\bErr\s*\(\s*([A-Za-z_][\w.]*)')
+_RETURN_RE = re.compile(r'\breturn\b\s*([^;\n]{0,40})')
+_CALL_RE = re.compile(r'\b([A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)+)\s*\(')
+_LITERAL_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`',
+    re.DOTALL
+)
+_NOT_NEWLINE_RE = re.compile(r'[^\n]')
+
+
+def _mask_literals(text: str) -> str:
+    """Blanks out strings and comments (same length) so braces inside them don't count."""
+    return _LITERAL_RE.sub(lambda m: _NOT_NEWLINE_RE.sub(' ', m.group(0)), text)
+
+
+def _is_function_header(masked_line: str) -> bool:
+    # "} else {", "}).then(function () {": judge what follows the closing brace
+    stripped = masked_line.strip().lstrip('})').strip()
+    if '(' not in stripped or _CONTAINER_RE.match(stripped):
+        return False
+    first_word = re.match(r'[A-Za-z_$][\w$]*', stripped)
+    return not (first_word and first_word.group(0) in _CONTROL_WORDS)
+
+
+def _brace_shapes(body: str) -> Tuple[List[str], List[str], List[str]]:
+    raises, returns, calls = [], [], []
+    for m in _THROW_RE.finditer(body):
+        shape = m.group(1) or m.group(2) or "panic"
+        if shape not in raises:
+            raises.append(shape)
+    for m in _RETURN_RE.finditer(body):
+        shape = m.group(1).strip() or "void"
+        if shape.startswith('{'):
+            shape = "{...}"
+        elif shape.startswith('['):
+            shape = "[...]"
+        elif '(' in shape:
+            shape = shape[:shape.index('(')] + "(...)"
+        if shape not in returns:
+            returns.append(shape)
+    for m in _CALL_RE.finditer(body):
+        name = m.group(1)
+        if not name.startswith(('this.', 'self.')) and name not in calls:
+            calls.append(name)
+    return raises, returns, calls
+
+
+def _compress_braces(content: str, level: str) -> str:
+    masked = _mask_literals(content)
+    n = len(content)
+    out = []
+    pos = 0       # Next character of `content` still to be emitted
+    scan = 0      # Where to look for the next function header
+
+    while scan < n:
+        line_end = masked.find('\n', scan)
+        line_end = n if line_end == -1 else line_end
+        line = masked[scan:line_end]
+        if not _is_function_header(line):
+            scan = line_end + 1
+            continue
+
+        # The body opens at the first "{" before any ";" within the next few lines
+        window_end = scan
+        for _ in range(4):
+            nxt = masked.find('\n', window_end + 1)
+            window_end = n if nxt == -1 else nxt
+        open_at = -1
+        for k in range(scan, min(window_end, n)):
+            if masked[k] == ';':
+                break
+            if masked[k] == '{':
+                open_at = k
+                break
+        if open_at == -1:
+            scan = line_end + 1
+            continue
+
+        depth, close_at = 0, -1
+        for k in range(open_at, n):
+            ch = masked[k]
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    close_at = k
+                    break
+        if close_at == -1:
+            break  # Unbalanced: leave the rest untouched
+
+        inner = content[open_at + 1:close_at]
+        body_lines = inner.count('\n') - 1
+        if body_lines <= 1 or (level == "light" and body_lines <= LIGHT_MAX_BODY_LINES):
+            scan = line_end + 1  # Keep it; nested functions are checked on their own lines
+            continue
+
+        first_inner = inner.split('\n', 2)[1] if '\n' in inner else ""
+        indent = first_inner[:len(first_inner) - len(first_inner.lstrip())]
+        closing_line_start = content.rfind('\n', 0, close_at) + 1
+        raises, returns, calls = _brace_shapes(masked[open_at + 1:close_at])
+        note = _fold_note("//", body_lines, raises, returns, calls)
+
+        out.append(content[pos:open_at + 1])
+        out.append(f"\n{indent}{note}\n{content[closing_line_start:close_at]}")
+        pos = close_at
+        scan = masked.find('\n', close_at)
+        scan = n if scan == -1 else scan + 1
+
+    out.append(content[pos:])
+    return ''.join(out)
+
+
+# ==========================================
+# 3. ENTRY POINTS
+# ==========================================
+
+def compress_source(path: str, content: str, level: str = "light") -> str:
+    """
+    Skeleton of one file at the given level: signatures, decorators/annotations,
+    docstrings and route definitions stay; long bodies become a one-line note of
+    what they raise, return and call. Unknown languages are returned unchanged.
+    """
+    if level == "none" or not content:
+        return content
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PYTHON_EXTENSIONS:
+        language = "python"
+    elif ext in BRACE_EXTENSIONS:
+        language = "brace"
+    else:
+        return content
+
+    key = (hashlib.sha1(content.encode('utf-8', errors='ignore')).hexdigest(), language, level)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    compressed = _compress_python(content, level) if language == "python" else _compress_braces(content, level)
+    if len(compressed) >= len(content):
+        compressed = content
+
+    with _cache_lock:
+        _cache[key] = compressed
+        while len(_cache) > SKELETON_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return compressed
+
+
+def compress_code_map(code_map: Dict[str, str], level: str = "light") -> Dict[str, str]:
+    if level == "none":
+        return dict(code_map)
+    return {path: compress_source(path, str(content), level) for path, content in code_map.items()}
+
+
+def compress_to_budget(code_map: Dict[str, str], budget_tokens: int, level: str = "auto") -> Tuple[Dict[str, str], str]:
+    """
+    With level="auto", the lightest level whose total fits `budget_tokens`
+    ("outline" when none does); any other level is applied as given.
+    Returns (compressed_map, level_used).
+    """
+    if level != "auto":
+        return compress_code_map(code_map, level), level
+    full_tokens = sum(estimate_tokens(str(c)) for c in code_map.values())
+    for candidate in LEVELS:
+        if candidate == "light" and full_tokens > budget_tokens * LIGHT_MAX_RATIO:
+            continue  # Folding only long bodies can't close a gap this wide
+        compressed = compress_code_map(code_map, candidate)
+        if candidate == LEVELS[-1] or sum(estimate_tokens(c) for c in compressed.values()) <= budget_tokens:
+            return compressed, candidate
+    return dict(code_map), "none"
@@ -0,0 +1,85 @@
+import os
+import codecs
+from collections import Counter
+from typing import Optional
+
+# Only this much of a file is inspected before deciding whether to read the rest
+SNIFF_BYTES = 8192
+
+# --- Thresholds ---
+MAX_BAD_UTF8_RATIO = 0.02       # Replacement chars per decoded char before we call it binary
+MINIFIED_MAX_LINE = 1000        # A single line this long in the head...
+MINIFIED_AVG_LINE = 250         # ...with lines this long on average = minified
+MIN_WHITESPACE_RATIO = 0.04     # Hand-written code is never this dense
+
+LOCKFILE_NAMES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml',
+    'poetry.lock', 'pipfile.lock', 'cargo.lock', 'composer.lock', 'gemfile.lock',
+    'go.sum', 'packages.lock.json', 'podfile.lock', 'mix.lock', 'flake.lock',
+}
+GENERATED_SUFFIXES = (
+    '.min.js', '.min.css', '.bundle.js', '.chunk.js', '.map',
+    '_pb2.py', '_pb2_grpc.py', '.pb.go', '.g.dart', '.designer.cs', '.generated.ts',
+)
+GENERATED_MARKERS = (
+    '@generated', 'do not edit', 'code generated by', 'auto-generated', 'autogenerated',
+    'this file was automatically generated',
+    '-- mysql dump', '-- postgresql database dump', '-- dump completed',
+)
+
+
+def classify_name(path: str) -> Optional[str]:
+    """Skip reason decidable from the path alone (no I/O), or None."""
+    name = os.path.basename(path).lower()
+    if name in LOCKFILE_NAMES or name.endswith('.lock'):
+        return "lockfile"
+    if name.endswith(GENERATED_SUFFIXES):
+        return "generated"
+    return None
+
+
+def classify_head(path: str, head: bytes) -> Optional[str]:
+    """
+    Looks at the first few KB of a file and returns why it should be skipped
+    ("lockfile", "generated", "binary", "minified") or None if it looks hand-written.
+    """
+    reason = classify_name(path)
+    if reason:
+        return reason
+    if not head:
+        return None
+
+    head = head[:SNIFF_BYTES]
+    if b'\x00' in head:
+        return "binary"
+
+    # Incremental decode so a multi-byte char cut at the boundary isn't counted as invalid
+    text = codecs.getincrementaldecoder('utf-8')(errors='replace').decode(head, final=False)
+    if text and text.count('�') / len(text) > MAX_BAD_UTF8_RATIO:
+        return "binary"
+
+    # Generated-file banners live in the first lines
+    banner = text[:600].lower()
+    if any(marker in banner for marker in GENERATED_MARKERS):
+        return "generated"
+
+    lines = text.split('\n')
+    longest = max(len(line) for line in lines)
+    if longest >= MINIFIED_MAX_LINE and len(text) / len(lines) >= MINIFIED_AVG_LINE:
+        return "minified"
+    if len(text) >= 1024:
+        whitespace = sum(1 for c in text if c in ' \t\n\r')
+        if whitespace / len(text) < MIN_WHITESPACE_RATIO:
+            return "minified"
+    return None
+
+
+def classify_text(path: str, content: str) -> Optional[str]:
+    """Same checks for content that's already decoded (e.g. served from a cache)."""
+    return classify_head(path, content[:SNIFF_BYTES].encode('utf-8', errors='ignore'))
+
+
+def format_skip_report(reasons: Counter) -> str:
+    if not reasons:
+        return ""
+    return ", ".join(f"{count} {reason}" for reason, count in reasons.most_common())
@@ -0,0 +1,270 @@
+import os
+import re
+import math
+from typing import Dict, List, Optional, Tuple
+
+# --- Budget Settings ---
+CHARS_PER_TOKEN = 4             # Rough average for source code across Gemini/Claude tokenizers
+MAX_FILE_SHARE = 0.4            # One file may take at most this share of a budget
+MIN_PARTIAL_TOKENS = 200        # Leftover smaller than this isn't worth a partial file
+DP_MAX_ITEMS = 400              # Exact knapsack over the top-ranked files, greedy for the rest
+DP_SLOTS = 1024                 # Budget resolution of the knapsack table
+MANIFEST_LIST_LIMIT = 50        # Dropped files listed by name in the manifest
+
+# --- 1. IMPORTANCE SIGNALS ---
+ENTRY_POINT_NAMES = {
+    'main.py', 'app.py', '__main__.py', 'manage.py', 'wsgi.py', 'asgi.py', 'server.py',
+    'index.js', 'index.ts', 'main.js', 'main.ts', 'app.js', 'app.ts', 'server.js', 'server.ts',
+    'main.go', 'main.rs', 'program.cs', 'application.java', 'main.java',
+}
+# Alternatives start with literals (no leading \b or ^) to keep the scan fast on big repos
+ENTRY_POINT_RE = re.compile(
+    r'__name__\s*==\s*[\'"]__main__[\'"]|func\s+main\s*\(|static\s+void\s+main\s*\(|'
+    r'(?:uvicorn|app)\.run\s*\(|\.listen\s*\(\s*\d'
+)
+ROUTE_RE = re.compile(
+    r'@\w*\.?(?:get|post|put|patch|delete|route|api_route|websocket)\s*\(|'
+    r'(?:app|router|server)\.(?:get|post|put|patch|delete|use|all)\s*\(\s*[\'"`/]|'
+    r'@(?:Get|Post|Put|Patch|Delete|Request)Mapping\b|HandleFunc\s*\(|(?:url|path)\s*\(\s*r?[\'"]'
+)
+# Matched as lowercase substrings
+RISK_KEYWORDS = (
+    'auth', 'password', 'token', 'secret', 'session', 'permission', 'payment', 'billing',
+    'sql', 'query', 'exec', 'eval', 'subprocess', 'pickle', 'deserialize', 'crypt', 'hash',
+    'upload', 'sanitize', 'validate', 'transaction',
+)
+IMPORT_LINE_RE = re.compile(
+    r'^\s*(?:import|from|#include|using|require|use)\b.*$|require\s*\(\s*[\'"][^\'"]+[\'"]\s*\)',
+    re.MULTILINE
+)
+WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+SUPPORT_EXTENSIONS = {'.md', '.json', '.yaml', '.yml', '.xml', '.toml', '.html', '.css', '.scss'}
+
+# --- 2. CUT POINTS ---
+# Top-level definitions in the languages we ingest; cuts land right before one of these
+BOUNDARY_RE = re.compile(
+    r'^(?:@|def |async def |class |function |async function |export |interface |type |enum |'
+    r'func |fn |pub |impl |struct |public |private |protected |internal |static |abstract |'
+    r'module |namespace |const \w+\s*=\s*(?:async\s*)?(?:\(|function))',
+    re.MULTILINE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _is_test_path(path: str) -> bool:
+    lowered = path.lower().replace('\\', '/')
+    name = lowered.rsplit('/', 1)[-1]
+    return ('/tests/' in f'/{lowered}' or '/test/' in f'/{lowered}' or '/__tests__/' in f'/{lowered}'
+            or name.startswith('test_') or name.endswith(('_test.py', '_test.go'))
+            or '.test.' in name or '.spec.' in name)
+
+
+def estimate_fan_in(code_map: Dict[str, str]) -> Dict[str, int]:
+    """
+    Cheap import fan-in: how many other files mention a file's module name on an
+    import/require/include line. Linear in repo size; no parsing.
+    """
+    by_stem: Dict[str, List[str]] = {}
+    for path in code_map:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem in ('__init__', 'index', 'mod'):
+            stem = os.path.basename(os.path.dirname(path)) or stem
+        by_stem.setdefault(stem, []).append(path)
+
+    fan_in = {path: 0 for path in code_map}
+    for path, content in code_map.items():
+        words = set()
+        for match in IMPORT_LINE_RE.finditer(content):
+            words.update(WORD_RE.findall(match.group(0)))
+        for word in words:
+            for target in by_stem.get(word, ()):
+                if target != path:
+                    fan_in[target] += 1
+    return fan_in
+
+
+def score_file(path: str, content: str, fan_in: int = 0, alias_count: int = 0) -> float:
+    """Importance for test design: entry points, route handlers, risky code and widely imported modules first."""
+    score = 1.0
+    name = os.path.basename(path).lower()
+    if name in ENTRY_POINT_NAMES or ENTRY_POINT_RE.search(content):
+        score += 3.0
+    routes = len(ROUTE_RE.findall(content))
+    if routes:
+        score += 2.0 + min(routes, 8) * 0.25
+    lowered = content[:50000].lower()
+    risks = sum(1 for keyword in RISK_KEYWORDS if keyword in lowered)
+    score += min(risks * 0.3, 2.0)
+    score += math.log2(1 + fan_in)
+    if alias_count:
+        score += 0.5  # Copied around the repo: whatever it does, it matters
+
+    if _is_test_path(path):
+        score *= 0.5
+    if os.path.splitext(name)[1] in SUPPORT_EXTENSIONS:
+        score *= 0.3
+    return score
+
+
+def rank_files(code_map: Dict[str, str], aliases: Optional[Dict[str, List[str]]] = None,
+               fan_in: Optional[Dict[str, int]] = None) -> Dict[str, float]:
+    aliases = aliases or {}
+    if fan_in is None:
+        fan_in = estimate_fan_in(code_map)
+    return {
+        path: score_file(path, str(content), fan_in.get(path, 0), len(aliases.get(path, ())))
+        for path, content in code_map.items()
+    }
+
+
+def cut_at_boundary(content: str, max_tokens: int) -> str:
+    """
+    Largest prefix within `max_tokens` that ends right before a top-level
+    definition, so the model never sees half a function. Falls back to the last
+    blank line, then the last newline.
+    """
+    limit = max(0, max_tokens - 1) * CHARS_PER_TOKEN
+    if len(content) <= limit:
+        return content
+
+    cut = 0
+    for match in BOUNDARY_RE.finditer(content, 0, limit + 1):
+        start = match.start()
+        if start == 0:
+            continue
+        # Keep decorators attached: the cut for "@x\ndef f" is before the "@"
+        previous_line = content.rfind('\n', 0, start - 1) + 1
+        if content.startswith('@', previous_line):
+            continue
+        cut = start
+    if cut == 0:
+        cut = content.rfind('\n\n', 0, limit) + 1
+    if cut <= 0:
+        cut = content.rfind('\n', 0, limit) + 1
+    if cut <= 0:
+        return ""
+
+    omitted = content.count('\n', cut) + 1
+    return content[:cut].rstrip('\n') + f"\n\n... [{omitted} more lines omitted]\n"
+
+
+# --- 3. PACKING ---
+
+def _header_tokens(path: str, aliases: Dict[str, List[str]]) -> int:
+    # "FILE: <path> (also at: ...)" + separator, as rendered by build_context
+    return estimate_tokens(path + ', '.join(aliases.get(path, ()))) + 12
+
+
+def _knapsack(items: List[Tuple[str, int, float]], budget: int) -> List[str]:
+    """0/1 knapsack on (path, tokens, value) with the budget quantized to DP_SLOTS slots."""
+    quantum = max(1, math.ceil(budget / DP_SLOTS))
+    capacity = budget // quantum
+    best = [0.0] * (capacity + 1)
+    taken = []
+    for _path, tokens, value in items:
+        weight = math.ceil(tokens / quantum)
+        row = bytearray(capacity + 1)
+        for c in range(capacity, weight - 1, -1):
+            candidate = best[c - weight] + value
+            if candidate > best[c]:
+                best[c] = candidate
+                row[c] = 1
+        taken.append((weight, row))
+
+    chosen = []
+    c = capacity
+    for i in range(len(items) - 1, -1, -1):
+        weight, row = taken[i]
+        if row[c]:
+            chosen.append(items[i][0])
+            c -= weight
+    return chosen
+
+
+def pack_context(code_map: Dict[str, str], budget_tokens: int,
+                 aliases: Optional[Dict[str, List[str]]] = None,
+                 scores: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, str], dict]:
+    """
+    Selects what goes into a prompt of `budget_tokens`:
+    files are capped at MAX_FILE_SHARE of the budget (cut at a definition boundary),
+    the best value set is chosen with a knapsack over importance, and leftover room
+    goes to the most important remaining file, cut to fit.
+    Returns ({path: content} most important first, manifest).
+    """
+    aliases = aliases or {}
+    if scores is None:
+        scores = rank_files(code_map, aliases)
+
+    file_cap = max(MIN_PARTIAL_TOKENS, int(budget_tokens * MAX_FILE_SHARE))
+    candidates = {}  # path -> (content, tokens incl. header, truncated)
+    for path, content in code_map.items():
+        content = str(content)
+        header = _header_tokens(path, aliases)
+        truncated = False
+        if estimate_tokens(content) + header > file_cap:
+            content = cut_at_boundary(content, file_cap - header)
+            truncated = True
+        if content:
+            candidates[path] = (content, estimate_tokens(content) + header, truncated)
+
+    # Value grows with content, with diminishing returns, so one large key file
+    # isn't always traded for a dozen trivial ones
+    ranked = sorted(candidates, key=lambda p: scores.get(p, 1.0), reverse=True)
+    items = [(p, candidates[p][1], scores.get(p, 1.0) * math.sqrt(candidates[p][1])) for p in ranked]
+
+    chosen = set(_knapsack(items[:DP_MAX_ITEMS], budget_tokens))
+    used = sum(candidates[p][1] for p in chosen)
+    # Whatever didn't make the exact pass, by value density
+    for path, tokens, value in sorted(items[DP_MAX_ITEMS:], key=lambda it: it[2] / it[1], reverse=True):
+        if used + tokens <= budget_tokens:
+            chosen.add(path)
+            used += tokens
+
+    selected = {p: candidates[p][0] for p in chosen}
+    truncated = {p for p in chosen if candidates[p][2]}
+
+    # Fill the remainder with the most important file that didn't fit whole
+    remaining = budget_tokens - used
+    if remaining >= MIN_PARTIAL_TOKENS:
+        for path in ranked:
+            if path in chosen:
+                continue
+            header = _header_tokens(path, aliases)
+            partial = cut_at_boundary(candidates[path][0], remaining - header)
+            if partial:
+                selected[path] = partial
+                truncated.add(path)
+                used += estimate_tokens(partial) + header
+                break
+
+    ordered = {p: selected[p] for p in ranked if p in selected}
+    dropped = [p for p in ranked if p not in selected]
+    manifest = {
+        "budget_tokens": budget_tokens,
+        "used_tokens": used,
+        "included": [
+            {"path": p, "tokens": estimate_tokens(c), "score": round(scores.get(p, 1.0), 2), "truncated": p in truncated}
+            for p, c in ordered.items()
+        ],
+        "dropped": [
+            {"path": p, "tokens": candidates[p][1], "score": round(scores.get(p, 1.0), 2)}
+            for p in dropped[:MANIFEST_LIST_LIMIT]
+        ],
+        "dropped_count": len(dropped) + (len(code_map) - len(candidates)),
+    }
+    return ordered, manifest
+
+
+def format_manifest(manifest: dict) -> str:
+    included = manifest["included"]
+    cut = sum(1 for f in included if f["truncated"])
+    summary = f"{len(included)} files ({manifest['used_tokens']:,}/{manifest['budget_tokens']:,} tokens)"
+    if cut:
+        summary += f", {cut} cut at a definition boundary"
+    if manifest["dropped_count"]:
+        summary += f", {manifest['dropped_count']} left out"
+    return summary
@@ -0,0 +1,407 @@
+import os
+import re
+import sys
+import ast
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+# --- Graph Settings ---
+IMPORT_CACHE_ENTRIES = int(os.environ.get("SENTINEL_IMPORT_CACHE_ENTRIES", "50000"))
+CLUSTER_ROUNDS = 10             # Label propagation sweeps
+MAX_LISTED_DEPENDENCIES = 60    # Edges reported as internal_dependencies
+
+PYTHON_EXTENSIONS = ('.py', '.pyi')
+JS_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs', '.vue', '.svelte')
+JVM_EXTENSIONS = ('.java', '.kt', '.scala')
+
+# Import statements at any indentation (conditional / lazy imports count), with their continuations
+PY_IMPORT_RE = re.compile(
+    r'^[ \t]*(from[ \t]+[.\w]+[ \t]+import[ \t]*(?:\([^)]*\)|(?:\\\n|[^\n])*)|import[ \t]+(?:\\\n|[^\n])*)',
+    re.MULTILINE
+)
+JS_IMPORT_RE = re.compile(
+    r'''(?:^|[;\s])(?:import|export)\s[^'"`;]*?from\s*['"]([^'"]+)['"]|'''
+    r'''(?:^|[;\s])import\s*['"]([^'"]+)['"]|'''
+    r'''\b(?:require|import)\s*\(\s*['"]([^'"]+)['"]\s*\)''',
+    re.MULTILINE
+)
+GO_IMPORT_BLOCK_RE = re.compile(r'^import\s*\(([^)]*)\)', re.MULTILINE)
+GO_IMPORT_LINE_RE = re.compile(r'^import\s+(?:[\w.]+\s+)?"([^"]+)"', re.MULTILINE)
+GO_QUOTED_RE = re.compile(r'"([^"]+)"')
+JVM_IMPORT_RE = re.compile(r'^import\s+(?:static\s+)?([\w.]+(?:\.\*)?)\s*;?', re.MULTILINE)
+
+STDLIB_MODULES = getattr(sys, "stdlib_module_names", frozenset()) | {"__future__"}
+
+# Raw import: (kind, target, names). kind is "py" (target = dotted module, names = imported names,
+# relative level encoded as leading dots), "rel" (JS path relative to the importer), "pkg" (bare
+# JS specifier), "go" (package path) or "jvm" (dotted class or package.*)
+RawImport = Tuple[str, str, Tuple[str, ...]]
+
+_cache: "OrderedDict[Tuple[str, str], List[RawImport]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# ==========================================
+# 1. EXTRACTION (cached per content hash)
+# ==========================================
+
+def _python_imports(content: str) -> List[RawImport]:
+    # Only the import statements go through ast: parsing whole files is ~20x slower on big repos
+    statements = [m.group(1) for m in PY_IMPORT_RE.finditer(content)]
+    if not statements:
+        return []
+    try:
+        trees = [ast.parse("\n".join(statements))]
+    except (SyntaxError, ValueError):
+        # An "import" line inside a string or a broken statement: keep the ones that parse
+        trees = []
+        for statement in statements:
+            try:
+                trees.append(ast.parse(statement))
+            except (SyntaxError, ValueError):
+                continue
+
+    found = []
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                found.extend(("py", alias.name, ()) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                module = "." * node.level + (node.module or "")
+                found.append(("py", module, tuple(alias.name for alias in node.names)))
+    return found
+
+
+def _js_imports(content: str) -> List[RawImport]:
+    found = []
+    for m in JS_IMPORT_RE.finditer(content):
+        spec = m.group(1) or m.group(2) or m.group(3)
+        found.append(("rel" if spec.startswith('.') else "pkg", spec, ()))
+    return found
+
+
+def _go_imports(content: str) -> List[RawImport]:
+    specs = GO_IMPORT_LINE_RE.findall(content)
+    for block in GO_IMPORT_BLOCK_RE.findall(content):
+        specs.extend(GO_QUOTED_RE.findall(block))
+    return [("go", spec, ()) for spec in specs]
+
+
+def _jvm_imports(content: str) -> List[RawImport]:
+    return [("jvm", spec, ()) for spec in JVM_IMPORT_RE.findall(content)]
+
+
+def extract_imports(path: str, content: str) -> List[RawImport]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PYTHON_EXTENSIONS:
+        extractor = _python_imports
+    elif ext in JS_EXTENSIONS:
+        extractor = _js_imports
+    elif ext == '.go':
+        extractor = _go_imports
+    elif ext in JVM_EXTENSIONS:
+        extractor = _jvm_imports
+    else:
+        return []
+
+    key = (hashlib.sha1(content.encode('utf-8', errors='ignore')).hexdigest(), extractor.__name__)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+    imports = extractor(content)
+    with _cache_lock:
+        _cache[key] = imports
+        while len(_cache) > IMPORT_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return imports
+
+
+# ==========================================
+# 2. RESOLUTION TO IN-REPO PATHS
+# ==========================================
+
+class _PathIndex:
+    """Every path suffix ("c.py", "b/c.py", "a/b/c.py") -> files ending with it, plus dir -> files."""
+
+    def __init__(self, paths: List[str]):
+        self.paths = set(paths)
+        self.by_suffix: Dict[str, List[str]] = {}
+        self.by_dir: Dict[str, List[str]] = {}
+        for path in paths:
+            parts = path.split('/')
+            for i in range(len(parts)):
+                self.by_suffix.setdefault('/'.join(parts[i:]), []).append(path)
+            dir_parts = parts[:-1]
+            for i in range(len(dir_parts)):
+                self.by_dir.setdefault('/'.join(dir_parts[i:]), []).append(path)
+        self.packages = {p.rpartition('/')[0] for p in paths if p.endswith('/__init__.py')}
+
+    def suffix(self, rel: str, importer: str) -> Optional[str]:
+        """Best file ending with `rel`: the one sharing the longest directory prefix with the importer."""
+        candidates = self.by_suffix.get(rel)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        return max(candidates, key=lambda c: (len(os.path.commonprefix([c, importer])), -len(c)))
+
+    def python_module(self, rel: str, importer: str) -> Optional[str]:
+        """Like suffix(), but `rel` must start at a source root: "json.py" is not "utils/json.py" inside a package."""
+        candidates = [c for c in self.by_suffix.get(rel, ()) if c[:len(c) - len(rel)].rstrip('/') not in self.packages]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda c: (len(os.path.commonprefix([c, importer])), -len(c)))
+
+    def directory(self, rel: str) -> List[str]:
+        return self.by_dir.get(rel, [])
+
+
+def _resolve_python(importer: str, module: str, names: Tuple[str, ...], index: _PathIndex) -> List[str]:
+    level = len(module) - len(module.lstrip('.'))
+    dotted = module[level:]
+    if level:
+        base = importer.split('/')[:-1]
+        base = base[:len(base) - (level - 1)] if level > 1 else base
+        prefix = '/'.join(base + (dotted.split('.') if dotted else []))
+        lookup = lambda rel: rel if rel in index.paths else None
+    else:
+        prefix = dotted.replace('.', '/')
+        lookup = lambda rel: index.python_module(rel, importer)
+
+    targets = []
+    # "from pkg import mod" may import submodules
+    for name in names:
+        if name == '*':
+            continue
+        sub = lookup(f"{prefix}/{name}.py".lstrip('/'))
+        if sub:
+            targets.append(sub)
+    if not targets or len(targets) < len(names):
+        for candidate in (f"{prefix}.py", f"{prefix}/__init__.py"):
+            found = lookup(candidate.lstrip('/')) if prefix else None
+            if found:
+                targets.append(found)
+                break
+    return targets
+
+
+def _resolve_js(importer: str, spec: str, index: _PathIndex) -> List[str]:
+    base = os.path.normpath(os.path.join(os.path.dirname(importer), spec)).replace(os.sep, '/')
+    candidates = [base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+    for candidate in candidates:
+        if candidate in index.paths:
+            return [candidate]
+    return []
+
+
+def _resolve_go(importer: str, spec: str, index: _PathIndex) -> List[str]:
+    """Go package path -> the files of the in-repo directory it names (module prefix stripped)."""
+    parts = spec.split('/')
+    # Standard library paths ("net/http") have no dot in their first element: only an exact dir counts
+    starts = range(len(parts)) if '.' in parts[0] else range(1)
+    for i in starts:
+        files = [f for f in index.directory('/'.join(parts[i:])) if f.endswith('.go') and not f.endswith('_test.go')]
+        if files:
+            return files
+    return []
+
+
+def _resolve_js_alias(importer: str, spec: str, index: _PathIndex) -> List[str]:
+    """Path-like bare specifiers ("@/components/Nav", "src/api/client"); npm packages stay external."""
+    for alias in ('@/', '~/'):
+        if spec.startswith(alias):
+            spec = spec[len(alias):]
+            break
+    else:
+        if spec.startswith('@') or '/' not in spec:
+            return []
+    for ext in ('',) + JS_EXTENSIONS + tuple(f"/index{e}" for e in JS_EXTENSIONS):
+        found = index.suffix(spec + ext, importer)
+        if found and found != importer:
+            return [found]
+    return []
+
+
+def _resolve_jvm(importer: str, spec: str, index: _PathIndex) -> List[str]:
+    if spec.endswith('.*'):
+        return [f for f in index.directory(spec[:-2].replace('.', '/')) if f.endswith(JVM_EXTENSIONS)]
+    rel = spec.replace('.', '/')
+    for ext in JVM_EXTENSIONS:
+        found = index.suffix(rel + ext, importer)
+        if found:
+            return [found]
+    return []
+
+
+def _external_name(kind: str, spec: str) -> Optional[str]:
+    """Third-party package an unresolved import refers to; None for relative and standard library imports."""
+    if kind == "py":
+        name = spec.split('.')[0]
+        return None if not name or name in STDLIB_MODULES else name
+    if kind == "pkg":
+        parts = spec.split('/')
+        return '/'.join(parts[:2]) if spec.startswith('@') else parts[0]
+    if kind == "go":
+        return spec if '.' in spec.split('/')[0] else None
+    if kind == "jvm":
+        return None if spec.startswith(('java.', 'javax.', 'kotlin.')) else '.'.join(spec.split('.')[:2])
+    return None
+
+
+# ==========================================
+# 3. THE GRAPH
+# ==========================================
+
+class DependencyGraph:
+    """
+    Static import graph of the code map: edges between in-repo files, fan-in /
+    fan-out, strongly connected components (import cycles) and clusters of
+    files that import each other. No LLM involved.
+    """
+
+    def __init__(self):
+        self.edges: Dict[str, Set[str]] = {}
+        self.imported_names: Dict[Tuple[str, str], Set[str]] = {}
+        self.external: Counter = Counter()
+
+    @classmethod
+    def build(cls, code_map: Dict[str, str], imports: Optional[Dict[str, List[RawImport]]] = None) -> "DependencyGraph":
+        """`imports` holds extract_imports() results already computed (e.g. during the download)."""
+        graph = cls()
+        index = _PathIndex(list(code_map))
+        imports = imports or {}
+        for path, content in code_map.items():
+            targets = graph.edges.setdefault(path, set())
+            raw = imports.get(path)
+            for kind, spec, names in raw if raw is not None else extract_imports(path, str(content)):
+                if kind == "py":
+                    resolved = _resolve_python(path, spec, names, index)
+                elif kind == "rel":
+                    resolved = _resolve_js(path, spec, index)
+                elif kind == "pkg":
+                    resolved = _resolve_js_alias(path, spec, index)
+                elif kind == "go":
+                    resolved = _resolve_go(path, spec, index)
+                else:
+                    resolved = _resolve_jvm(path, spec, index)
+
+                resolved = [t for t in resolved if t != path]
+                if not resolved:
+                    name = _external_name(kind, spec)
+                    if name:
+                        graph.external[name] += 1
+                    continue
+                for target in resolved:
+                    targets.add(target)
+                    if names:
+                        graph.imported_names.setdefault((path, target), set()).update(n for n in names if n != '*')
+        return graph
+
+    def fan_out(self) -> Dict[str, int]:
+        return {p: len(t) for p, t in self.edges.items()}
+
+    def fan_in(self) -> Dict[str, int]:
+        counts = {p: 0 for p in self.edges}
+        for targets in self.edges.values():
+            for target in targets:
+                counts[target] = counts.get(target, 0) + 1
+        return counts
+
+    def strongly_connected_components(self) -> List[List[str]]:
+        """Tarjan's algorithm (iterative, so deep import chains can't hit the recursion limit)."""
+        index_of: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        components: List[List[str]] = []
+        counter = 0
+
+        for root in sorted(self.edges):
+            if root in index_of:
+                continue
+            work = [(root, iter(sorted(self.edges.get(root, ()))))]
+            index_of[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in index_of:
+                        index_of[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(sorted(self.edges.get(child, ())))))
+                        advanced = True
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index_of[child])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+        return components
+
+    def cycles(self) -> List[List[str]]:
+        return [c for c in self.strongly_connected_components() if len(c) > 1]
+
+    def clusters(self) -> Dict[str, str]:
+        """
+        Groups of files that mostly import each other (label propagation on the
+        undirected graph, deterministic). Returns {path: cluster label}.
+        """
+        neighbours: Dict[str, Set[str]] = {p: set() for p in self.edges}
+        for source, targets in self.edges.items():
+            for target in targets:
+                neighbours[source].add(target)
+                neighbours.setdefault(target, set()).add(source)
+
+        label = {p: p for p in neighbours}
+        order = sorted(neighbours)
+        for _ in range(CLUSTER_ROUNDS):
+            changed = False
+            for node in order:
+                if not neighbours[node]:
+                    continue
+                votes = Counter(label[n] for n in neighbours[node])
+                best = max(votes.items(), key=lambda item: (item[1], item[0] == label[node], item[0]))[0]
+                if best != label[node]:
+                    label[node] = best
+                    changed = True
+            if not changed:
+                break
+        return label
+
+    def internal_dependencies(self, limit: int = MAX_LISTED_DEPENDENCIES) -> List[dict]:
+        """Edges in InternalDependency shape, most depended-upon targets first."""
+        fan_in = self.fan_in()
+        rows = []
+        for source, targets in self.edges.items():
+            for target in targets:
+                names = sorted(self.imported_names.get((source, target), ()))
+                description = f"imports {', '.join(names[:5])}" if names else "imports module"
+                if len(names) > 5:
+                    description += f" (+{len(names) - 5} more)"
+                rows.append((fan_in.get(target, 0), source, target, description))
+        rows.sort(key=lambda r: (-r[0], r[1], r[2]))
+        return [{"from_file": s, "to_file": t, "description": d} for _, s, t, d in rows[:limit]]
+
+    def external_dependencies(self, limit: int = 30) -> List[str]:
+        return [name for name, _ in self.external.most_common(limit)]
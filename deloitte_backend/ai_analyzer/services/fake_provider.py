@@ -0,0 +1,474 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .blob_cache import CACHE_DIR, _atomic_write
+
+# --- Offline Provider Settings ---
+# Recorded responses: one JSON file per distinct request
+FIXTURES_DIR = os.environ.get("SENTINEL_LLM_FIXTURES", os.path.join(CACHE_DIR, "llm_fixtures"))
+FAKE_LATENCY_MS = float(os.getenv("SENTINEL_FAKE_LATENCY_MS", "300"))          # Time to first token
+FAKE_TOKENS_PER_S = float(os.getenv("SENTINEL_FAKE_TOKENS_PER_S", "400"))      # Streaming speed (0 = all at once)
+FAKE_TRUNCATE_RATE = float(os.getenv("SENTINEL_FAKE_TRUNCATE_RATE", "0"))      # Share of responses cut off mid-JSON
+FAKE_429_RATE = float(os.getenv("SENTINEL_FAKE_429_RATE", "0"))                # Share of calls rejected with a 429
+FAKE_TESTS = int(os.getenv("SENTINEL_FAKE_TESTS", "5"))                        # Test cases per synthetic response
+FAKE_SEED = int(os.getenv("SENTINEL_FAKE_SEED", "7"))
+# Anthropic keeps a cache_control prefix this long after its last use
+FAKE_ANTHROPIC_CACHE_TTL_S = 300
+
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = 16
+FILE_HEADER_RE = re.compile(r'^FILE: (\S+)', re.MULTILINE)
+
+
+class FakeRateLimitError(Exception):
+    """Injected quota error, shaped like the SDKs' so the provider scheduler retries it."""
+
+    def __init__(self, retry_after: float = 1.0):
+        super().__init__("429 RESOURCE_EXHAUSTED (injected by the fake provider)")
+        self.code = 429
+        self.status_code = 429
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+class FakeNotFoundError(Exception):
+    """Unknown or expired context cache, shaped like the SDK's 404 (not retried)."""
+
+    def __init__(self, name: str):
+        super().__init__(f"404 NOT_FOUND: cached content {name} does not exist or has expired (fake provider)")
+        self.code = 404
+        self.status_code = 404
+
+
+def _config_dict(config: Any) -> Any:
+    if config is None or isinstance(config, dict):
+        return config
+    if hasattr(config, "model_dump"):
+        return config.model_dump(exclude_none=True, mode="json")
+    return str(config)
+
+
+def _split_cached(config: Any) -> Tuple[Optional[str], Any]:
+    """(context cache name, the rest of the config): the name differs per run, the prompt it stands for doesn't."""
+    config = _config_dict(config)
+    if not isinstance(config, dict) or not config.get("cached_content"):
+        return None, config
+    rest = dict(config)
+    return rest.pop("cached_content"), rest
+
+
+def _contents_text(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for content in contents or []:
+        if isinstance(content, dict):  # A Content dump: {"role", "parts": [{"text"}]}
+            parts.extend(part.get("text", "") for part in content.get("parts", []))
+        else:
+            parts.append(content if isinstance(content, str) else str(content))
+    return "".join(parts)
+
+
+def _ttl_seconds(ttl: Any, default: float = 3600.0) -> float:
+    try:
+        return float(str(ttl).rstrip("s"))
+    except ValueError:
+        return default
+
+
+def request_key(provider: str, model: str, prompt: str, config: Any = None) -> str:
+    payload = json.dumps({"provider": provider, "model": model, "prompt": prompt, "config": _config_dict(config)},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """Recorded responses on disk: <dir>/<provider>-<key>.json = {"provider", "model", "text", ...}."""
+
+    def __init__(self, directory: str = FIXTURES_DIR):
+        self.directory = directory
+
+    def _path(self, provider: str, key: str) -> str:
+        return os.path.join(self.directory, f"{provider}-{key[:24]}.json")
+
+    def get(self, provider: str, key: str) -> Optional[str]:
+        try:
+            with open(self._path(provider, key), "r", encoding="utf-8") as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, provider: str, key: str, model: str, prompt: str, text: str):
+        record = {"provider": provider, "model": model, "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+                  "recorded_at": time.time(), "text": text}
+        _atomic_write(self._path(provider, key), json.dumps(record, indent=1).encode("utf-8"))
+
+
+# --- Synthetic responses ---
+
+def synthetic_response(prompt: str, rng: random.Random, tests: int = FAKE_TESTS) -> str:
+    """A plausible answer for each prompt the app sends, built from the files named in it."""
+    files = FILE_HEADER_RE.findall(prompt) or ["app/main.py"]
+    if "test_cases" in prompt:
+        cases = []
+        for i in range(tests):
+            path = files[i % len(files)]
+            stem = re.sub(r'\W+', '_', os.path.splitext(os.path.basename(path))[0]).strip('_') or "module"
+            cases.append({
+                "test_case_name": f"Test {stem} rejects invalid input #{i + 1}",
+                "description": f"Feeds malformed data to {path} and expects a clean validation error.",
+                "steps": "Arrange input -> Call -> Assert error",
+                "priority": rng.choice(["High", "High", "Medium", "Low"]),
+                "complexity": rng.choice(["Low", "Medium", "High"]),
+                "category": "Functional",
+                "confidence_score": round(rng.uniform(0.7, 0.99), 2),
+                "code": (f"from unittest import mock\n\ndef test_{stem}_invalid_input_{i + 1}():\n"
+                         f"    print('[STEP] call {stem} with bad data')\n    payload = {{'id': None}}\n"
+                         f"    assert payload['id'] is None\n"),
+            })
+        return json.dumps({"test_cases": cases, "project_summary": "Synthetic run", "tech_stack": ["Python"]}, indent=2)
+    if "complexity_score" in prompt:
+        return json.dumps({"summary": "Synthetic risk assessment.", "complexity_score": rng.randint(2, 8),
+                           "complexity_explanation": "Generated offline.",
+                           "risks": [{"id": "R1", "severity": "High", "description": f"Unvalidated input in {files[0]}"}]})
+    if "project_summary" in prompt:
+        return json.dumps({"project_summary": f"Synthetic summary of {len(files)} files.",
+                           "gap_analysis": "- Input validation\n- Error handling\n- Authorization checks"})
+    return f"import pytest\n\ndef test_smoke():\n    assert True  # synthetic, {len(files)} files\n"
+
+
+def _truncate(text: str, rng: random.Random) -> str:
+    return text[:int(len(text) * rng.uniform(0.3, 0.9))]
+
+
+class FakeEngine:
+    """
+    Answers one provider's calls offline: a recorded fixture when there is one, otherwise
+    a synthetic response (or a LookupError when `strict`, i.e. replay only). Latency,
+    streaming speed, truncation and 429s follow the SENTINEL_FAKE_* settings; the same
+    seed gives the same run.
+    """
+
+    def __init__(self, provider: str, store: Optional[FixtureStore] = None, strict: bool = False, seed: int = FAKE_SEED,
+                 latency_ms: float = FAKE_LATENCY_MS, tokens_per_s: float = FAKE_TOKENS_PER_S,
+                 truncate_rate: float = FAKE_TRUNCATE_RATE, rate_limit_rate: float = FAKE_429_RATE):
+        self.provider = provider
+        self.store = store
+        self.strict = strict
+        self.rng = random.Random(f"{seed}:{provider}")  # Call-level decisions: 429s, truncation
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.tokens_per_s = tokens_per_s
+        self.truncate_rate = truncate_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stats = {"calls": 0, "replayed": 0, "synthetic": 0, "rate_limited": 0, "truncated": 0,
+                      "prefix_created": 0, "prefix_reused": 0, "prefix_expired": 0}
+        # Provider-side prompt caches: handle -> {"model", "text", "tokens", "uses", "expires_at"}
+        self.prefixes: Dict[str, Dict[str, Any]] = {}
+
+    def respond(self, model: str, prompt: str, config: Any = None) -> str:
+        self.stats["calls"] += 1
+        if self.rate_limit_rate and self.rng.random() < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            raise FakeRateLimitError()
+        key = request_key(self.provider, model, prompt, config)
+        text = self.store.get(self.provider, key) if self.store else None
+        if text is None:
+            if self.strict:
+                raise LookupError(f"No recorded {self.provider} response for this request (fixture {key[:24]})")
+            self.stats["synthetic"] += 1
+            text = synthetic_response(prompt, random.Random(f"{self.seed}:{key}"))
+        else:
+            self.stats["replayed"] += 1
+        if self.truncate_rate and self.rng.random() < self.truncate_rate:
+            self.stats["truncated"] += 1
+            text = _truncate(text, self.rng)
+        return text
+
+    # --- Prompt caching ---
+
+    def create_prefix(self, model: str, text: str, ttl_s: float) -> Dict[str, Any]:
+        """Gemini caches.create: a new handle every time, like the real API."""
+        self.stats["prefix_created"] += 1
+        name = f"cachedContents/fake-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}-{self.stats['prefix_created']}"
+        self.prefixes[name] = {"model": model, "text": text, "tokens": len(text) // CHARS_PER_TOKEN + 1,
+                               "uses": 0, "expires_at": time.time() + ttl_s}
+        return {"name": name, **self.prefixes[name]}
+
+    def use_prefix(self, name: str, model: str) -> Dict[str, Any]:
+        """A call referencing a Gemini context cache; unknown, expired or other-model handles are a 404."""
+        prefix = self.prefixes.get(name)
+        if prefix is not None and prefix["expires_at"] <= time.time():
+            del self.prefixes[name]
+            self.stats["prefix_expired"] += 1
+            prefix = None
+        if prefix is None or prefix["model"] != model:
+            raise FakeNotFoundError(name)
+        prefix["uses"] += 1
+        self.stats["prefix_reused"] += 1
+        return prefix
+
+    def delete_prefix(self, name: str):
+        if self.prefixes.pop(name, None) is None:
+            raise FakeNotFoundError(name)
+
+    def mark_prefix(self, model: str, text: str) -> Tuple[int, int]:
+        """Anthropic cache_control: (tokens read from the cache, tokens written to it)."""
+        name = f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+        prefix = self.prefixes.get(name)
+        now = time.time()
+        if prefix is not None and prefix["expires_at"] > now:
+            prefix["uses"] += 1
+            prefix["expires_at"] = now + FAKE_ANTHROPIC_CACHE_TTL_S
+            self.stats["prefix_reused"] += 1
+            return prefix["tokens"], 0
+        if prefix is not None:
+            self.stats["prefix_expired"] += 1
+        self.stats["prefix_created"] += 1
+        tokens = len(text) // CHARS_PER_TOKEN + 1
+        self.prefixes[name] = {"model": model, "text": text, "tokens": tokens, "uses": 0,
+                               "expires_at": now + FAKE_ANTHROPIC_CACHE_TTL_S}
+        return 0, tokens
+
+    def prefix_report(self) -> List[Dict[str, Any]]:
+        """Every prefix the provider was asked to cache and how often later calls reused it."""
+        return [{"handle": name, "model": p["model"], "tokens": p["tokens"], "uses": p["uses"]}
+                for name, p in self.prefixes.items()]
+
+    async def first_token(self):
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    async def chunks(self, text: str) -> AsyncIterator[str]:
+        step = CHUNK_TOKENS * CHARS_PER_TOKEN
+        for i in range(0, len(text), step):
+            if self.tokens_per_s > 0:
+                await asyncio.sleep(CHUNK_TOKENS / self.tokens_per_s)
+            yield text[i:i + step]
+
+    async def full_text(self, text: str) -> str:
+        if self.tokens_per_s > 0:
+            await asyncio.sleep(len(text) / CHARS_PER_TOKEN / self.tokens_per_s)
+        return text
+
+
+def _usage(prompt: str, text: str, cached_tokens: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(prompt_token_count=len(prompt) // CHARS_PER_TOKEN + 1,
+                           cached_content_token_count=cached_tokens or None,
+                           candidates_token_count=len(text) // CHARS_PER_TOKEN + 1)
+
+
+# --- google-genai surface: client.aio.models.generate_content / generate_content_stream, client.aio.caches ---
+
+class _FakeGenAIModels:
+    def __init__(self, engine: FakeEngine):
+        self.engine = engine
+
+    def _request(self, model: str, contents: Any, config: Any) -> Tuple[str, Any, int]:
+        # A context cache reference stands for its text in front of `contents`: same answer as the inline prompt
+        name, config = _split_cached(config)
+        prompt = _contents_text(contents)
+        if name is None:
+            return prompt, config, 0
+        prefix = self.engine.use_prefix(name, model)
+        return prefix["text"] + prompt, config, prefix["tokens"]
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None):
+        prompt, config, cached_tokens = self._request(model, contents, config)
+        text = self.engine.respond(model, prompt, config)
+        await self.engine.first_token()
+        text = await self.engine.full_text(text)
+        return SimpleNamespace(text=text, usage_metadata=_usage(prompt, text, cached_tokens))
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None):
+        prompt, config, cached_tokens = self._request(model, contents, config)
+        text = self.engine.respond(model, prompt, config)
+        await self.engine.first_token()
+
+        async def stream():
+            async for piece in self.engine.chunks(text):
+                yield SimpleNamespace(text=piece, usage_metadata=None)
+            yield SimpleNamespace(text="", usage_metadata=_usage(prompt, text, cached_tokens))
+        return stream()
+
+
+class _FakeGenAICaches:
+    def __init__(self, engine: FakeEngine):
+        self.engine = engine
+
+    async def create(self, model: str, config: Any = None):
+        config = _config_dict(config) or {}
+        prefix = self.engine.create_prefix(model, _contents_text(config.get("contents")), _ttl_seconds(config.get("ttl")))
+        return SimpleNamespace(name=prefix["name"], model=model, expire_time=prefix["expires_at"],
+                               usage_metadata=SimpleNamespace(total_token_count=prefix["tokens"]))
+
+    async def delete(self, name: str, config: Any = None):
+        self.engine.delete_prefix(name)
+
+
+class FakeGenAIClient:
+    """Stands in for genai.Client: only the async surface the app uses."""
+
+    def __init__(self, engine: Optional[FakeEngine] = None):
+        self.engine = engine or FakeEngine("gemini", FixtureStore())
+        self.aio = SimpleNamespace(models=_FakeGenAIModels(self.engine), caches=_FakeGenAICaches(self.engine),
+                                   aclose=self._aclose)
+
+    async def _aclose(self):
+        pass
+
+
+# --- anthropic surface: client.messages.create ---
+
+def _content_text(content: Any) -> str:
+    # Content blocks are joined as plain text: a cache_control marker doesn't change the request
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+
+
+def _anthropic_prompt(kwargs: Dict[str, Any]) -> str:
+    parts: List[str] = [_content_text(kwargs.get("system", ""))]
+    for message in kwargs.get("messages", []):
+        parts.append(_content_text(message.get("content", "")))
+    return "\n".join(parts)
+
+
+def _anthropic_cached_prefix(kwargs: Dict[str, Any]) -> str:
+    """Text up to and including the last block marked with cache_control ("" without one)."""
+    text, prefix = "", ""
+    for message in kwargs.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            text += content
+            continue
+        for block in content:
+            text += block.get("text", "") if isinstance(block, dict) else str(block)
+            if isinstance(block, dict) and block.get("cache_control"):
+                prefix = text
+    return prefix
+
+
+def _anthropic_config(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in kwargs.items() if k not in ("model", "messages", "system")}
+
+
+class _FakeMessages:
+    def __init__(self, engine: FakeEngine):
+        self.engine = engine
+
+    async def create(self, model: str, **kwargs):
+        prompt = _anthropic_prompt(kwargs)
+        text = self.engine.respond(model, prompt, _anthropic_config(kwargs))
+        prefix = _anthropic_cached_prefix(kwargs)
+        read, written = self.engine.mark_prefix(model, prefix) if prefix else (0, 0)
+        await self.engine.first_token()
+        text = await self.engine.full_text(text)
+        usage = _usage(prompt, text)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], model=model,
+                               usage=SimpleNamespace(input_tokens=max(0, usage.prompt_token_count - read - written),
+                                                     cache_read_input_tokens=read,
+                                                     cache_creation_input_tokens=written,
+                                                     output_tokens=usage.candidates_token_count))
+
+
+class FakeAnthropicClient:
+    """Stands in for AsyncAnthropic: messages.create only."""
+
+    def __init__(self, engine: Optional[FakeEngine] = None):
+        self.engine = engine or FakeEngine("anthropic", FixtureStore())
+        self.messages = _FakeMessages(self.engine)
+
+    async def close(self):
+        pass
+
+
+# --- Record mode: real calls, responses written to fixtures ---
+
+class _RecordingGenAIModels:
+    def __init__(self, models, store: FixtureStore, prefixes: Dict[str, str]):
+        self.models = models
+        self.store = store
+        self.prefixes = prefixes  # Context cache name -> the text it holds
+
+    def _key(self, model: str, contents: Any, config: Any) -> Tuple[str, str]:
+        # Keyed like the inline prompt, so replay works with or without context caching
+        name, config = _split_cached(config)
+        prompt = self.prefixes.get(name, "") + _contents_text(contents)
+        return request_key("gemini", model, prompt, config), prompt
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None):
+        response = await self.models.generate_content(model=model, contents=contents, config=config)
+        key, prompt = self._key(model, contents, config)
+        self.store.put("gemini", key, model, prompt, response.text or "")
+        return response
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None):
+        stream = await self.models.generate_content_stream(model=model, contents=contents, config=config)
+        store = self.store
+        key, prompt = self._key(model, contents, config)
+
+        async def recording():
+            parts = []
+            async for chunk in stream:
+                parts.append(chunk.text or "")
+                yield chunk
+            # Only complete streams become fixtures
+            store.put("gemini", key, model, prompt, "".join(parts))
+        return recording()
+
+
+class _RecordingGenAICaches:
+    def __init__(self, caches, prefixes: Dict[str, str]):
+        self.caches = caches
+        self.prefixes = prefixes
+
+    async def create(self, model: str, config: Any = None):
+        cached = await self.caches.create(model=model, config=config)
+        self.prefixes[cached.name] = _contents_text((_config_dict(config) or {}).get("contents"))
+        return cached
+
+    async def delete(self, name: str, config: Any = None):
+        self.prefixes.pop(name, None)
+        return await self.caches.delete(name=name, config=config)
+
+
+class RecordingGenAIClient:
+    """Wraps a real genai.Client; every async response is also saved as a fixture."""
+
+    def __init__(self, client, store: Optional[FixtureStore] = None):
+        self.client = client
+        store = store or FixtureStore()
+        prefixes: Dict[str, str] = {}
+        self.aio = SimpleNamespace(models=_RecordingGenAIModels(client.aio.models, store, prefixes),
+                                   caches=_RecordingGenAICaches(client.aio.caches, prefixes), aclose=client.aio.aclose)
+
+
+class _RecordingMessages:
+    def __init__(self, messages, store: FixtureStore):
+        self.messages = messages
+        self.store = store
+
+    async def create(self, model: str, **kwargs):
+        message = await self.messages.create(model=model, **kwargs)
+        text = "".join(block.text for block in message.content if getattr(block, "type", "") == "text")
+        prompt = _anthropic_prompt(kwargs)
+        self.store.put("anthropic", request_key("anthropic", model, prompt, _anthropic_config(kwargs)), model, prompt, text)
+        return message
+
+
+class RecordingAnthropicClient:
+    """Wraps a real AsyncAnthropic; every response is also saved as a fixture."""
+
+    def __init__(self, client, store: Optional[FixtureStore] = None):
+        self.client = client
+        self.messages = _RecordingMessages(client.messages, store or FixtureStore())
+
+    async def close(self):
+        await self.client.close()
@@ -2,15 +2,40 @@ import os
 import zipfile
 import shutil
 import io
+from collections import Counter
+from typing import BinaryIO
+
+from .local_ingest import scan_local_project
+from .file_scanner import MAX_TOTAL_CHARS
+from .content_sniffer import SNIFF_BYTES, classify_head, format_skip_report
+
+# --- Upload Limits ---
+# Enforced while the archive is read, so a hostile or oversized ZIP is rejected
+# before we spend memory on it. All values are overridable from the environment.
+MAX_UPLOAD_BYTES = int(os.getenv("SENTINEL_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+MAX_ZIP_ENTRIES = int(os.getenv("SENTINEL_MAX_ZIP_ENTRIES", "50000"))
+MAX_ZIP_MEMBER_BYTES = 1024 * 1024          # 1MB uncompressed per kept file
+MAX_ZIP_TOTAL_BYTES = 20 * 1024 * 1024      # 20MB uncompressed across kept files
+
+# Directories inside an archive that never contain code we want to send
+ZIP_IGNORE_DIRS = {'__MACOSX', 'node_modules', '.git', '__pycache__', 'venv', '.venv'}
+
+
+class UploadLimitError(ValueError):
+    """Raised when an uploaded archive exceeds one of the upload limits."""
+
 
 class FileProcessor:
-    def __init__(self):
+    def __init__(self, max_total_chars: int = MAX_TOTAL_CHARS):
         # We filter for these to avoid reading images, binaries, or random system files
         self.allowed_extensions = {
             '.py', '.js', '.jsx', '.ts', '.tsx', 
             '.html', '.css', '.json', '.md', 
             '.java', '.cpp', '.c', '.h', '.go', '.rs'
         }
+        self.last_scan = None  # ScanResult of the last directory scan (added/changed/removed)
+        self.skip_reasons: Counter = Counter()  # Why files were dropped (binary, minified, ...)
+        self.max_total_chars = max_total_chars  # Directory read budget; callers that pack/shard pass more
 
     def process_local_path(self, path: str) -> dict:
         """
@@ -30,42 +55,97 @@ class FileProcessor:
         print(f"⚠️ Warning: Path not found or unsupported: {path}")
         return {}
 
-    def _read_directory(self, path: str) -> dict:
-        code_map = {}
-        for root, _, files in os.walk(path):
-            # Skip hidden folders like .git, __pycache__, node_modules
-            if any(part.startswith('.') or part == 'node_modules' for part in root.split(os.sep)):
-                continue
+    def process_zip_stream(self, fileobj: BinaryIO) -> dict:
+        """
+        Reads a ZIP archive straight from a seekable file object (e.g. the
+        spooled buffer behind an UploadFile) without staging it on disk.
+        Raises UploadLimitError if the archive breaks the upload limits.
+        """
+        # Measure the upload without reading it: the spooled buffer is seekable
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        if size > MAX_UPLOAD_BYTES:
+            raise UploadLimitError(
+                f"Upload is {size // (1024 * 1024)}MB, limit is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."
+            )
 
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in self.allowed_extensions:
-                    full_path = os.path.join(root, file)
-                    try:
-                        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            # Store relative path so the AI understands structure
-                            relative_path = os.path.relpath(full_path, path)
-                            code_map[relative_path] = f.read()
-                    except Exception as e:
-                        print(f"Skipping {file}: {e}")
-        return code_map
+        try:
+            with zipfile.ZipFile(fileobj, 'r') as z:
+                return self._read_zip_members(z)
+        except zipfile.BadZipFile:
+            print("Error: Invalid ZIP file")
+            return {}
+
+    def _read_directory(self, path: str) -> dict:
+        # Same engine as get_local_project_files: prunes ignored/hidden dirs during the walk
+        result = scan_local_project(path, extensions=self.allowed_extensions, skip_hidden=True,
+                                    max_total_chars=self.max_total_chars)
+        self.last_scan = result
+        self.skip_reasons.update(result.skip_reasons)
+        if result.skipped:
+            print(f"ℹ️ Skipped {result.skipped} files ({format_skip_report(result.skip_reasons)})")
+        print(f"♻️ Incremental scan: {result.change_summary()}")
+        return result.files
 
     def _read_zip_from_disk(self, zip_path: str) -> dict:
-        code_map = {}
         try:
             with zipfile.ZipFile(zip_path, 'r') as z:
-                for file_info in z.infolist():
-                    if file_info.is_dir() or file_info.filename.startswith('__MACOSX'):
-                        continue
-                    
-                    ext = os.path.splitext(file_info.filename)[1].lower()
-                    if ext in self.allowed_extensions:
-                        try:
-                            with z.open(file_info.filename) as f:
-                                code_map[file_info.filename] = f.read().decode('utf-8', errors='ignore')
-                        except Exception:
-                            continue
+                return self._read_zip_members(z)
         except zipfile.BadZipFile:
             print("Error: Invalid ZIP file")
-            
-        return code_map
\ No newline at end of file
+            return {}
+
+    def _is_wanted_member(self, file_info: zipfile.ZipInfo) -> bool:
+        """Filters on the central directory entry only - nothing is decompressed here."""
+        if file_info.is_dir():
+            return False
+        parts = file_info.filename.split('/')
+        if any(part in ZIP_IGNORE_DIRS for part in parts[:-1]):
+            return False
+        ext = os.path.splitext(file_info.filename)[1].lower()
+        return ext in self.allowed_extensions
+
+    def _read_zip_members(self, z: zipfile.ZipFile) -> dict:
+        code_map = {}
+        kept_bytes = 0
+
+        for index, file_info in enumerate(z.infolist(), 1):
+            if index > MAX_ZIP_ENTRIES:
+                raise UploadLimitError(f"Archive has more than {MAX_ZIP_ENTRIES} entries.")
+
+            if not self._is_wanted_member(file_info):
+                continue
+
+            # The declared size comes from the central directory; skip early if it is too big
+            if file_info.file_size > MAX_ZIP_MEMBER_BYTES:
+                self.skip_reasons["too_large"] += 1
+                continue
+
+            try:
+                with z.open(file_info) as f:
+                    # Decompress only the head first: binaries/minified bundles stop here
+                    head = f.read(SNIFF_BYTES)
+                    reason = classify_head(file_info.filename, head)
+                    if reason:
+                        self.skip_reasons[reason] += 1
+                        continue
+                    # Bounded read: never trust the declared size of a member
+                    data = head + f.read(MAX_ZIP_MEMBER_BYTES + 1 - len(head))
+            except Exception:
+                self.skip_reasons["unreadable"] += 1
+                continue
+
+            if len(data) > MAX_ZIP_MEMBER_BYTES:
+                self.skip_reasons["too_large"] += 1
+                continue
+
+            kept_bytes += len(data)
+            if kept_bytes > MAX_ZIP_TOTAL_BYTES:
+                raise UploadLimitError(
+                    f"Archive expands to more than {MAX_ZIP_TOTAL_BYTES // (1024 * 1024)}MB of source code."
+                )
+
+            code_map[file_info.filename] = data.decode('utf-8', errors='ignore')
+
+        return code_map
@@ -47,47 +47,12 @@ MAX_TOTAL_CHARS = 120000  # ~90k tokens (Raised slightly)
 MAX_FILE_SIZE = 50000     # 50KB limit per file (Skips minified/massive files)
 
 def get_local_project_files(folder_path: str):
-    code_files_map = {}
-    total_chars = 0
-    found, skipped = 0, 0
+    # Imported here: local_ingest reads the constants above from this module
+    from .local_ingest import scan_local_project
 
     if not os.path.isdir(folder_path):
         return None, 0, 0, "Invalid folder path"
 
-    for dirpath, dirnames, filenames in os.walk(folder_path, topdown=True):
-        # Filter directories in-place to prevent walking into them
-        dirnames[:] = [d for d in dirnames if d not in IGNORE_DIRS]
-        
-        for filename in filenames:
-            ext = os.path.splitext(filename)[1].lower()
-            
-            if ext in CODE_EXTENSIONS:
-                full_path = os.path.join(dirpath, filename)
-                
-                # OPTIMIZATION: Check file size stats before opening
-                # This prevents reading a 10MB file just to discard it
-                try:
-                    file_size = os.path.getsize(full_path)
-                    if file_size > MAX_FILE_SIZE:
-                        skipped += 1
-                        continue
-                        
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-
-                    # Safety Limit Check
-                    if total_chars + len(content) > MAX_TOTAL_CHARS:
-                        skipped += 1
-                        continue
-                    
-                    if content.strip():
-                        rel_path = os.path.relpath(full_path, folder_path)
-                        code_files_map[rel_path] = content
-                        total_chars += len(content)
-                        found += 1
-                        
-                except Exception:
-                    # Silently skip unreadable files (binary, locked, etc.)
-                    skipped += 1
-                    
-    return code_files_map, found, skipped, None
\ No newline at end of file
+    # Pruned scandir walk + .gitignore + pooled reads (see local_ingest.py)
+    result = scan_local_project(folder_path)
+    return result.files, result.found, result.skipped, None
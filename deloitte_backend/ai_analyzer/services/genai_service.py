@@ -1,13 +1,26 @@
 # deloitte backend/ai_analyzer/services/genai_service.py
-import os
 import json
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
+from .client_registry import get_gemini_client
+from .provider_scheduler import get_scheduler
+from .context_packer import estimate_tokens
+
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+MODEL_ID = "gemini-1.5-flash-001"  # <--- FIX: Added -001
+
+
+async def _generate(prompt: str, config=None):
+    """Non-blocking call on the shared client: the event loop keeps serving other requests meanwhile."""
+    client = get_gemini_client()
+    if client is None:
+        raise RuntimeError("GEMINI_API_KEY not configured")
+    return await get_scheduler("gemini").call(
+        lambda: client.aio.models.generate_content(model=MODEL_ID, contents=prompt, config=config),
+        tokens=estimate_tokens(prompt)
+    )
 
 # --- STAGE 1: ASSESSMENT PROMPT ---
 async def analyze_risks(code_content: str):
@@ -27,13 +40,9 @@ async def analyze_risks(code_content: str):
     {code_content}
     """
     
-    response = client.models.generate_content(
-        model="gemini-1.5-flash-001",  # <--- FIX: Added -001
-        contents=prompt,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json"
-        )
-    )
+    response = await _generate(prompt, types.GenerateContentConfig(
+        response_mime_type="application/json"
+    ))
     return json.loads(response.text)
 
 # --- STAGE 2: TEST GENERATION PROMPT ---
@@ -50,11 +59,8 @@ async def generate_tests(code_content: str):
     {code_content}
     """
     
-    response = client.models.generate_content(
-        model="gemini-1.5-flash-001", # <--- FIX: Added -001
-        contents=prompt
-    )
+    response = await _generate(prompt)
     
     # Clean up markdown if Gemini adds it
-    clean_text = response.text.replace("```python", "").replace("```", "").strip()
+    clean_text = (response.text or "").replace("```python", "").replace("```", "").strip()
     return {"test_cases": clean_text}
\ No newline at end of file
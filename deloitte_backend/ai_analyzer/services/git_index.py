@@ -0,0 +1,189 @@
+import os
+import shutil
+import struct
+import subprocess
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class IndexEntry(NamedTuple):
+    path: str          # Relative to the repository top, '/' separated
+    sha: str           # Git blob SHA-1 (hex)
+    mtime_s: int
+    mtime_ns: int
+    size: int          # Truncated to 32 bits, as git stores it
+
+
+# ==========================================
+# 1. LOCATING THE REPOSITORY
+# ==========================================
+
+def find_git_dir(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Walks up from `path` looking for a .git dir (or a .git file pointing at one,
+    as in worktrees/submodules). Returns (work_tree_top, git_dir) or (None, None).
+    """
+    current = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            return current, dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, 'r', encoding='utf-8') as f:
+                    line = f.read().strip()
+                if line.startswith('gitdir:'):
+                    git_dir = line[len('gitdir:'):].strip()
+                    return current, os.path.normpath(os.path.join(current, git_dir))
+            except OSError:
+                pass
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None, None
+        current = parent
+
+
+# ==========================================
+# 2. READING .git/index DIRECTLY
+# ==========================================
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Git's offset varint (index v4 path prefix lengths)."""
+    b = data[pos]
+    pos += 1
+    value = b & 0x7f
+    while b & 0x80:
+        b = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (b & 0x7f)
+    return value, pos
+
+
+def parse_git_index(git_dir: str) -> Optional[List[IndexEntry]]:
+    """Parses stage-0 entries from a v2/v3/v4 index file. None if unreadable/unsupported."""
+    try:
+        with open(os.path.join(git_dir, 'index'), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < 12 or data[:4] != b'DIRC':
+        return None
+
+    version, count = struct.unpack('>II', data[4:12])
+    if version not in (2, 3, 4):
+        return None
+
+    entries = []
+    pos = 12
+    previous_path = b''
+    try:
+        for _ in range(count):
+            start = pos
+            (_ctime_s, _ctime_ns, mtime_s, mtime_ns, _dev, _ino, _mode, _uid, _gid, size) = \
+                struct.unpack('>10I', data[pos:pos + 40])
+            sha = data[pos + 40:pos + 60].hex()
+            flags = struct.unpack('>H', data[pos + 60:pos + 62])[0]
+            pos += 62
+            if version >= 3 and flags & 0x4000:
+                pos += 2  # Extended flags
+
+            if version == 4:
+                strip, pos = _read_varint(data, pos)
+                end = data.index(b'\x00', pos)
+                path = previous_path[:len(previous_path) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                end = data.index(b'\x00', pos)
+                path = data[pos:end]
+                # Entries are NUL-padded to a multiple of 8 bytes
+                pos = start + ((end - start + 8) // 8) * 8
+            previous_path = path
+
+            if (flags >> 12) & 0x3:
+                continue  # Merge conflict stages
+            entries.append(IndexEntry(path.decode('utf-8', errors='replace'), sha, mtime_s, mtime_ns, size))
+    except (struct.error, ValueError, IndexError):
+        return None
+    return entries
+
+
+# ==========================================
+# 3. LISTING FILES
+# ==========================================
+
+def git_ls_files(root: str) -> Optional[List[str]]:
+    """
+    Tracked + untracked-but-not-ignored files under `root` (paths relative to root),
+    via `git ls-files`. None when git isn't installed or `root` isn't a work tree.
+    """
+    if not shutil.which('git'):
+        return None
+    try:
+        proc = subprocess.run(
+            ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+            cwd=root, capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0:
+        return None
+    paths = proc.stdout.decode('utf-8', errors='replace').split('\x00')
+    # --cached and --others can overlap for intent-to-add files; keep order, drop repeats
+    return list(dict.fromkeys(p for p in paths if p))
+
+
+class GitListing:
+    """
+    File list for a git work tree plus, per file, the blob SHA that the worktree
+    copy is known to match (index stat data agrees), so its content can come from
+    the SHA-keyed blob cache instead of disk. `stats` holds the lstat() taken for
+    the check, so callers don't stat the same files again.
+    """
+
+    def __init__(self, paths: List[str], clean_blobs: Dict[str, str], stats: Dict[str, os.stat_result]):
+        self.paths = paths
+        self.clean_blobs = clean_blobs
+        self.stats = stats
+
+
+def list_git_files(root: str) -> Optional[GitListing]:
+    top, git_dir = find_git_dir(root)
+    if top is None or git_dir is None:
+        return None
+
+    prefix = os.path.relpath(os.path.abspath(root), top).replace(os.sep, '/')
+    prefix = '' if prefix == '.' else prefix + '/'
+
+    entries = parse_git_index(git_dir) or []
+    index_by_path = {e.path[len(prefix):]: e for e in entries if e.path.startswith(prefix)}
+
+    paths = git_ls_files(root)
+    if paths is None:
+        if not entries:
+            return None
+        # No git binary: fall back to tracked files straight from .git/index
+        paths = sorted(index_by_path)
+
+    # "Racily clean" guard: an entry modified in the same second the index was
+    # written can't be trusted on stat data alone (same rule git itself uses)
+    try:
+        index_mtime = os.stat(os.path.join(git_dir, 'index')).st_mtime_ns
+    except OSError:
+        index_mtime = 0
+
+    clean_blobs, stats = {}, {}
+    for rel_path in paths:
+        try:
+            st = stats[rel_path] = os.lstat(os.path.join(root, rel_path))
+        except OSError:
+            continue  # Tracked but deleted in the worktree
+        entry = index_by_path.get(rel_path)
+        if entry is None:
+            continue
+        if st.st_mtime_ns >= index_mtime:
+            continue
+        if (st.st_mtime_ns // 1_000_000_000 == entry.mtime_s
+                and st.st_mtime_ns % 1_000_000_000 == entry.mtime_ns
+                and st.st_size & 0xFFFFFFFF == entry.size):
+            clean_blobs[rel_path] = entry.sha
+
+    return GitListing(paths, clean_blobs, stats)
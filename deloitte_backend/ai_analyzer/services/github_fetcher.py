@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import Counter
+from typing import AsyncIterator, Optional, Tuple, Dict, Any
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .github_loader import (
+    GITHUB_API_URL, GITHUB_INGEST_MODE, ARCHIVE_THRESHOLD, MAX_BLOB_BYTES,
+    blob_cache, etag_cache, build_github_headers, _is_code_path, _fetch_archive_files, _accept_content
+)
+from .content_sniffer import classify_name
+
+logger = logging.getLogger(__name__)
+
+# --- Tuning (env overridable) ---
+GITHUB_CONCURRENCY = int(os.environ.get("GITHUB_CONCURRENCY", "16"))
+GITHUB_MAX_RETRIES = int(os.environ.get("GITHUB_MAX_RETRIES", "4"))
+# Below this many remaining calls we start spacing requests out over the reset window
+RATE_LIMIT_SLOWDOWN_AT = int(os.environ.get("GITHUB_RATE_SLOWDOWN_AT", "100"))
+MAX_RETRY_WAIT = 120  # Never park a request for longer than this (seconds)
+# Files handed to the prepare stage at a time while the rest are still downloading
+GITHUB_PREP_BATCH = int(os.environ.get("GITHUB_PREP_BATCH", "25"))
+
+
+class GitHubFetchError(Exception):
+    """Fatal GitHub error (bad URL, 401, 404) - the scan can't continue."""
+
+
+class RateLimitScheduler:
+    """
+    Tracks X-RateLimit-Remaining / X-RateLimit-Reset from every response and
+    paces new requests so the remaining budget lasts until the window resets,
+    instead of burning it all and failing halfway through a repo.
+    """
+
+    def __init__(self, concurrency: int = GITHUB_CONCURRENCY):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+        if reset is not None and reset.isdigit():
+            self.reset_at = float(reset)
+
+    def _spacing(self) -> float:
+        """Seconds between requests needed to stretch the remaining budget to the reset."""
+        if self.remaining is None or self.reset_at is None:
+            return 0.0
+        window = max(0.0, self.reset_at - time.time())
+        if self.remaining <= 0:
+            return window
+        if self.remaining >= RATE_LIMIT_SLOWDOWN_AT:
+            return 0.0
+        return window / self.remaining
+
+    async def wait_turn(self):
+        spacing = self._spacing()
+        if spacing <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + min(spacing, MAX_RETRY_WAIT)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def retry_delay(self, status: int, headers, body_text: str, attempt: int) -> Optional[float]:
+        """How long to back off before retrying, or None if the response isn't retryable."""
+        # A plain 403 (no access) is final; only rate-limit 403s are worth waiting for
+        rate_limited = status == 429 or (
+            status == 403 and (headers.get("X-RateLimit-Remaining") == "0" or "rate limit" in body_text.lower())
+        )
+        if not rate_limited and status not in (500, 502, 503, 504):
+            return None
+
+        retry_after = headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_WAIT)
+
+        if headers.get("X-RateLimit-Remaining") == "0" and self.reset_at:
+            return min(max(0.0, self.reset_at - time.time()) + 1, MAX_RETRY_WAIT)
+
+        # Exponential backoff with jitter so parallel fetches don't retry in lockstep
+        return min(2 ** attempt + random.random(), MAX_RETRY_WAIT)
+
+
+class AsyncGitHubFetcher:
+    """
+    asyncio GitHub client over one pooled keep-alive aiohttp session.
+    Use as `async with AsyncGitHubFetcher() as f: async for path, content in f.iter_files(url)`.
+    """
+
+    def __init__(self, concurrency: int = GITHUB_CONCURRENCY, max_retries: int = GITHUB_MAX_RETRIES,
+                 mode: str = GITHUB_INGEST_MODE):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.mode = mode
+        self.headers = build_github_headers()
+        self.scheduler = RateLimitScheduler(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.failed = 0
+        self.skip_reasons: Counter = Counter()  # binary / minified / generated / lockfile
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=60),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Any, bytes]:
+        """GET with rate-limit pacing and retries. Returns (status, headers, body)."""
+        assert self.session is not None, "Use AsyncGitHubFetcher as an async context manager"
+        attempt = 0
+        while True:
+            await self.scheduler.wait_turn()
+            async with self.scheduler.semaphore:
+                async with self.session.get(url, headers=headers) as res:
+                    body = await res.read()
+                    status, res_headers = res.status, res.headers
+            self.scheduler.update(res_headers)
+
+            if status >= 403 and attempt < self.max_retries:
+                body_text = body[:200].decode("utf-8", errors="ignore")
+                delay = self.scheduler.retry_delay(status, res_headers, body_text, attempt)
+                if delay is not None:
+                    logger.warning(f"⏳ GitHub {status} on {url}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            return status, res_headers, body
+
+    async def _get_json(self, url: str):
+        """Conditional GET (If-None-Match) backed by the shared ETag cache."""
+        cache_key = f"{url}#{self.headers.get('Authorization', '')}"
+        etag, cached_body = etag_cache.get(cache_key)
+        extra = {"If-None-Match": etag} if etag and cached_body is not None else None
+
+        status, res_headers, body = await self._get(url, extra)
+        if status == 304:
+            return status, cached_body
+        if status != 200:
+            return status, None
+        data = json.loads(body)
+        etag_cache.put(cache_key, res_headers.get("ETag"), data)
+        return status, data
+
+    async def _fetch_blob(self, path: str, url: str, sha: str) -> Tuple[str, Optional[str]]:
+        try:
+            status, _, body = await self._get(url, {"Accept": "application/vnd.github.v3.raw"})
+        except Exception as e:
+            logger.error(f"Error fetching {path}: {e}")
+            return path, None
+        if status != 200:
+            logger.warning(f"Failed to fetch {path}: {status}")
+            return path, None
+        content = body.decode("utf-8", errors="ignore")
+        blob_cache.put(sha, content)
+        return path, content
+
+    async def _resolve(self, repo_url: str) -> Tuple[str, str, Dict[str, Any]]:
+        """api_base, default branch and recursive tree of a repo URL. Both calls are ETag-cached."""
+        path_parts = urlparse(repo_url).path.strip('/').split('/')
+        if len(path_parts) < 2:
+            raise GitHubFetchError("Invalid GitHub URL. Use: https://github.com/owner/repo")
+        owner, repo = path_parts[0], path_parts[1]
+        logger.info(f"📡 Connecting to GitHub: {owner}/{repo}...")
+
+        # 1. Repo Metadata
+        api_base = f"{GITHUB_API_URL}/repos/{owner}/{repo}"
+        status, repo_data = await self._get_json(api_base)
+        if status == 401:
+            raise GitHubFetchError("❌ 401 Unauthorized: Check your GITHUB_TOKEN.")
+        if status == 404:
+            raise GitHubFetchError("❌ 404 Not Found: Repo doesn't exist or Private (Token needed).")
+        if repo_data is None:
+            raise GitHubFetchError(f"GitHub connection failed: HTTP {status}")
+        branch = repo_data.get('default_branch', 'main')
+
+        # 2. Recursive Tree
+        status, tree_body = await self._get_json(f"{api_base}/git/trees/{branch}?recursive=1")
+        if tree_body is None:
+            raise GitHubFetchError(f"GitHub connection failed: HTTP {status} on tree")
+        return api_base, branch, tree_body
+
+    async def tree_sha(self, repo_url: str) -> Optional[str]:
+        """SHA of the default branch's root tree: changes whenever any file on it does."""
+        _, _, tree_body = await self._resolve(repo_url)
+        return tree_body.get('sha')
+
+    async def iter_files(self, repo_url: str) -> AsyncIterator[Tuple[str, str]]:
+        """Yields (path, content) as soon as each file is available - cache hits first."""
+        api_base, branch, tree_body = await self._resolve(repo_url)
+
+        # 3. Filter + cache lookup; cache hits are yielded immediately
+        missing = []
+        for item in tree_body.get('tree', []):
+            if item['type'] != 'blob' or item.get('size', 0) > MAX_BLOB_BYTES:
+                continue
+            if not _is_code_path(item['path']):
+                continue
+            reason = classify_name(item['path'])
+            if reason:
+                self.skip_reasons[reason] += 1
+                continue
+            content = blob_cache.get(item['sha'])
+            if content is None:
+                missing.append((item['path'], item['url'], item['sha']))
+            elif _accept_content(item['path'], content, self.skip_reasons):
+                yield item['path'], content
+
+        if not missing:
+            return
+
+        # 4a. Many changes: one tarball instead of N blob calls (extracted off the event loop)
+        if self.mode == "archive" and len(missing) > ARCHIVE_THRESHOLD:
+            member_shas = {}
+            try:
+                archive_map = await asyncio.to_thread(
+                    _fetch_archive_files, api_base, branch, self.headers, self.skip_reasons, member_shas
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Tarball download failed ({e}). Falling back to per-file fetch.")
+                archive_map, member_shas = {}, {}
+            moved = 0
+            for path, _, sha in missing:
+                if path in archive_map:
+                    # The tarball is fetched by branch name: cache only what still matches the tree
+                    if member_shas.get(path) == sha:
+                        blob_cache.put(sha, archive_map[path])
+                    else:
+                        moved += 1
+                    yield path, archive_map[path]
+            if moved:
+                logger.info(f"🔀 {moved} files changed on {branch} since the tree call; not cached.")
+            # In the tree but not in the tarball (deleted since, or the download failed): fetch by SHA
+            missing = [m for m in missing if m[0] not in member_shas]
+            if not missing:
+                return
+            if member_shas:
+                logger.warning(f"⚠️ {len(missing)} tree files missing from the tarball, fetching them one by one.")
+
+        # 4b. Concurrent blob fetch, yielded in completion order
+        logger.info(f"🚀 Fetching {len(missing)} files (concurrency={self.concurrency})...")
+        tasks = [asyncio.create_task(self._fetch_blob(p, u, sha)) for p, u, sha in missing]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                path, content = await next_done
+                if content is None:
+                    self.failed += 1
+                elif _accept_content(path, content, self.skip_reasons):
+                    yield path, content
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def iter_github_project_files(repo_url: str, skip_reasons: Optional[Counter] = None,
+                                    **kwargs) -> AsyncIterator[Tuple[str, str]]:
+    """Convenience wrapper that owns the fetcher's session for one scan."""
+    async with AsyncGitHubFetcher(**kwargs) as fetcher:
+        try:
+            async for path, content in fetcher.iter_files(repo_url):
+                yield path, content
+        finally:
+            if skip_reasons is not None:
+                skip_reasons.update(fetcher.skip_reasons)
+
+
+async def github_tree_sha(repo_url: str, **kwargs) -> Optional[str]:
+    """Default-branch tree SHA of a repo, or None when GitHub can't be reached (the scan reports why)."""
+    async with AsyncGitHubFetcher(**kwargs) as fetcher:
+        try:
+            return await fetcher.tree_sha(repo_url)
+        except (GitHubFetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"⚠️ Could not resolve the tree of {repo_url}: {e}")
+            return None
@@ -1,8 +1,12 @@
 import requests
 import os
 import logging
-from urllib.parse import urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tarfile
+from collections import Counter
+from typing import Optional
+
+from .blob_cache import BlobCache, ETagCache, git_blob_sha
+from .content_sniffer import SNIFF_BYTES, classify_head, classify_text
 
 # --- FIX 1: Safe Import with Defaults ---
 # This ensures the code runs even if file_scanner.py is missing or paths are wrong
@@ -24,7 +28,93 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_github_project_files(repo_url: str):
+# Overridable so the loader can be pointed at GitHub Enterprise or a local stand-in server
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip('/')
+
+# "archive" = one tarball download for the whole repo, "blobs" = one request per file
+GITHUB_INGEST_MODE = os.environ.get("GITHUB_INGEST_MODE", "archive")
+
+MAX_BLOB_BYTES = 1024 * 1024  # Skip anything over 1MB, it's not hand-written code
+
+# When more than this many blobs are missing from the cache, one tarball beats N blob calls
+ARCHIVE_THRESHOLD = int(os.environ.get("GITHUB_ARCHIVE_THRESHOLD", "20"))
+
+blob_cache = BlobCache()
+etag_cache = ETagCache()
+
+# One pooled session for the tarball download: keep-alive instead of a new TLS handshake per call
+session = requests.Session()
+
+def _is_code_path(path: str) -> bool:
+    """Shared filter for tree entries and archive members (repo-relative, '/' separated)."""
+    ext = os.path.splitext(path)[1]
+    if ext not in CODE_EXTENSIONS:
+        return False
+    return not any(d in path.split('/') for d in IGNORE_DIRS)
+
+def _accept_content(path: str, content: Optional[str], skip_reasons: Counter) -> bool:
+    """Final gate for blob content: drops binaries, minified bundles and generated files."""
+    if not content:
+        return False
+    reason = classify_text(path, content)
+    if reason:
+        skip_reasons[reason] += 1
+        return False
+    return True
+
+def _fetch_archive_files(api_base: str, branch: str, headers: dict, skip_reasons: Optional[Counter] = None,
+                         member_shas: Optional[dict] = None):
+    """
+    Downloads the branch tarball in a single request and extracts matching
+    files from the gzip stream in memory. Nothing is written to disk.
+    `member_shas` (optional) receives path -> git blob SHA of every matching member
+    (None when it was skipped before being read): the branch may have moved since the
+    tree call, so callers cache a file under a tree SHA only when the two agree.
+    """
+    archive_url = f"{api_base}/tarball/{branch}"
+    code_files_map = {}
+    skip_reasons = skip_reasons if skip_reasons is not None else Counter()
+
+    # stream=True: we decompress as bytes arrive instead of buffering the whole archive
+    with session.get(archive_url, headers=headers, stream=True, timeout=60) as res:
+        res.raise_for_status()
+        res.raw.decode_content = True
+
+        with tarfile.open(fileobj=res.raw, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+
+                # Members are prefixed with "<owner>-<repo>-<sha>/", strip it
+                parts = member.name.split('/', 1)
+                if len(parts) < 2:
+                    continue
+                path = parts[1]
+
+                if member.size > MAX_BLOB_BYTES or not _is_code_path(path):
+                    continue
+
+                extracted = tar.extractfile(member)
+                if extracted is None:
+                    continue
+                # Sniff the head before pulling the rest of the member out of the stream
+                head = extracted.read(SNIFF_BYTES)
+                reason = classify_head(path, head)
+                if reason:
+                    skip_reasons[reason] += 1
+                    if member_shas is not None:
+                        member_shas[path] = None
+                    continue
+                data = head + extracted.read()
+                if member_shas is not None:
+                    member_shas[path] = git_blob_sha(data)
+                content = data.decode('utf-8', errors='ignore')
+                if content:
+                    code_files_map[path] = content
+
+    return code_files_map
+
+def build_github_headers() -> dict:
     token = os.environ.get("GITHUB_TOKEN")
     
     # Base headers
@@ -33,101 +123,11 @@ def get_github_project_files(repo_url: str):
         "X-GitHub-Api-Version": "2022-11-28"
     }
     
-    # 1. Check Token
+    # Check Token
     if token:
         headers["Authorization"] = f"token {token}"
         masked_token = token[:4] + "..." + token[-4:]
         logger.info(f"🔑 GitHub Token loaded: {masked_token}")
     else:
         logger.warning("⚠️ NO GITHUB TOKEN FOUND! Limited to 60 reqs/hr.")
-
-    try:
-        # Parse URL
-        path_parts = urlparse(repo_url).path.strip('/').split('/')
-        if len(path_parts) < 2: 
-            return None, 0, 0, "Invalid GitHub URL. Use: https://github.com/owner/repo"
-        
-        owner, repo = path_parts[0], path_parts[1]
-        logger.info(f"📡 Connecting to GitHub: {owner}/{repo}...")
-
-        # 2. Get Repo Metadata
-        api_base = f"https://api.github.com/repos/{owner}/{repo}"
-        repo_res = requests.get(api_base, headers=headers)
-        
-        if repo_res.status_code == 401:
-            return None, 0, 0, "❌ 401 Unauthorized: Check your GITHUB_TOKEN."
-        if repo_res.status_code == 404:
-            return None, 0, 0, "❌ 404 Not Found: Repo doesn't exist or Private (Token needed)."
-        repo_res.raise_for_status()
-        
-        repo_data = repo_res.json()
-        branch = repo_data.get('default_branch', 'main')
-
-        # 3. Get Recursive Tree
-        tree_url = f"{api_base}/git/trees/{branch}?recursive=1"
-        tree_res = requests.get(tree_url, headers=headers)
-        tree_res.raise_for_status()
-        tree_data = tree_res.json().get('tree', [])
-        
-        logger.info(f"📂 Tree received. {len(tree_data)} items found.")
-
-    except Exception as e:
-        return None, 0, 0, f"GitHub connection failed: {str(e)}"
-
-    # 4. Filter Files
-    code_files_map = {}
-    files_to_fetch = []
-    
-    for item in tree_data:
-        # We only want blobs (files), not trees (folders)
-        if item['type'] == 'blob':
-            path = item['path']
-            ext = os.path.splitext(path)[1]
-            
-            # Check Extension
-            if ext in CODE_EXTENSIONS:
-                # Check Ignore Dirs
-                if not any(d in path.split('/') for d in IGNORE_DIRS):
-                    # --- FIX 2: Use API Blob URL ---
-                    # The 'url' field in the tree is the API link to the blob.
-                    # This is safer than constructing raw.githubusercontent strings.
-                    files_to_fetch.append((path, item['url']))
-
-    if not files_to_fetch:
-        return None, 0, 0, "No code files found in this repository."
-
-    logger.info(f"🚀 Fetching {len(files_to_fetch)} files concurrently...")
-
-    # 5. Concurrent Fetching
-    def fetch(path, url):
-        try:
-            # --- FIX 3: Request Raw Content ---
-            # We must use specific headers to get the RAW content from the blob URL
-            fetch_headers = headers.copy()
-            fetch_headers['Accept'] = 'application/vnd.github.v3.raw'
-            
-            res = requests.get(url, headers=fetch_headers, timeout=10)
-            
-            if res.status_code == 200:
-                # --- FIX 4: Safe Decoding ---
-                # 'ignore' prevents crashing on emoji or weird binary characters
-                return path, res.content.decode('utf-8', errors='ignore')
-            else:
-                logger.warning(f"Failed to fetch {path}: {res.status_code}")
-                return path, None
-        except Exception as e:
-            logger.error(f"Error fetching {path}: {e}")
-            return path, None
-
-    # Run Fetcher
-    with ThreadPoolExecutor(max_workers=10) as ex:
-        futures = [ex.submit(fetch, p, u) for p, u in files_to_fetch]
-        for f in as_completed(futures):
-            p, content = f.result()
-            if content: 
-                code_files_map[p] = content
-
-    logger.info(f"✅ Loaded {len(code_files_map)} files successfully.")
-    
-    # Returns: Map, Count, ErrorCount (0 for now), ErrorMessage (None)
-    return code_files_map, len(code_files_map), 0, None
\ No newline at end of file
+    return headers
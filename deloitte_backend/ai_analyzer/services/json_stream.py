@@ -0,0 +1,271 @@
+import re
+import json
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+# Only these characters change the scanner's state; everything between them is skipped at C speed
+STRUCTURAL_RE = re.compile(r'[{}\[\]":,]')
+STRING_SPECIAL_RE = re.compile(r'["\\]')
+
+MAX_REPAIR_ATTEMPTS = 8     # Cut points tried (latest first) when the response is truncated
+CLOSERS = {'{': '}', '[': ']'}
+
+_decoder = json.JSONDecoder(strict=False)  # Models put raw newlines/tabs inside strings
+
+
+def _loads(text: str) -> Any:
+    return _decoder.decode(text)
+
+
+def _without_commas(text: str, start: int, end: int, commas: List[int]) -> str:
+    """text[start:end] minus the given comma offsets."""
+    parts, last = [], start
+    for comma in commas:
+        if start <= comma < end:
+            parts.append(text[last:comma])
+            last = comma + 1
+    parts.append(text[last:end])
+    return "".join(parts)
+
+
+class JsonArrayStream:
+    """
+    Incremental scanner for model output, streamed or not. Feed it text chunks as
+    they arrive; every object of the `key` array (e.g. "test_cases") comes back
+    from feed() as soon as its closing brace is seen. A top-level array counts too.
+
+    The same pass finds the outermost JSON value (Markdown fences and chatter
+    around it are skipped), notes dangling commas and remembers clean cut points,
+    so result() can parse the whole value, or rebuild a truncated one from its
+    last complete element. Each character is looked at once. A bracketed value
+    that closes without the `key` array ("Here are [3] tests:") is taken for
+    chatter: scanning goes on from the next bracket, and it is only the fallback.
+    """
+
+    def __init__(self, key: Optional[str] = "test_cases"):
+        self.key = key
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []       # Open containers: '{' or '['
+        self._in_string = False
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        self._expect_key = False          # Inside an object, before ':'
+        self._target_depth = 0            # Stack depth of the streamed array; 0 = not found yet, -1 = closed
+        self._item_start = -1
+        self._start = -1                  # Outermost value: text[_start:_end]
+        self._end = -1
+        self._last_comma = -1             # Comma not yet followed by a value
+        self._dangling: List[int] = []    # Commas right before a closing bracket: ",]" / ",}"
+        self._cuts = deque(maxlen=MAX_REPAIR_ATTEMPTS)  # (offset, open containers) where a prefix is complete
+        self._value_items = 0             # Items emitted from the current outermost value
+        self._fallback: Optional[Any] = None  # First closed value that wasn't the one we want
+        self.items_emitted = 0
+
+    def _wanted(self) -> bool:
+        """Whether the outermost value that just closed is the one we want (see class docstring)."""
+        if self.key is None:
+            return True
+        if self._target_depth == 0:
+            return False
+        # A top-level array only counts when it held objects
+        return self.text[self._start] == '{' or self._value_items > 0
+
+    def _skip_value(self, end: int):
+        if self._fallback is None:
+            try:
+                self._fallback = _loads(_without_commas(self.text, self._start, end, self._dangling))
+            except ValueError:
+                pass
+        self._start = -1
+        self._target_depth = 0
+        self._item_start = -1
+        self._last_key = None
+        self._dangling = []
+        self._cuts.clear()
+        self._value_items = 0
+
+    def _cut_depth(self) -> int:
+        # Cuts deeper than the streamed array (or the top level) would keep half-written elements
+        return max(1, self._target_depth)
+
+    def feed(self, chunk: str) -> List[Any]:
+        self.text += chunk
+        if self._end >= 0:
+            return []  # Outermost value already closed: the rest is trailing chatter
+        text = self.text
+        stack = self._stack
+        items = []
+        i = self._pos
+        n = len(text)
+        while i < n:
+            if self._in_string:
+                m = STRING_SPECIAL_RE.search(text, i)
+                if m is None:
+                    i = n
+                    break
+                i = m.start()
+                if text[i] == '\\':
+                    if i + 1 >= n:
+                        break  # Escape split across chunks: resume here next time
+                    i += 2
+                    continue
+                self._in_string = False
+                if self._expect_key and stack[-1] == '{':
+                    try:
+                        self._last_key = _loads(text[self._string_start:i + 1])
+                    except ValueError:
+                        self._last_key = None
+                i += 1
+                continue
+
+            m = STRUCTURAL_RE.search(text, i)
+            if m is None:
+                i = n
+                break
+            i = m.start()
+            ch = text[i]
+            if ch == '"':
+                if stack:
+                    self._in_string = True
+                    self._string_start = i
+                    self._last_comma = -1
+            elif ch == '{' or ch == '[':
+                if not stack:
+                    self._start = i
+                if ch == '[' and self._target_depth == 0 and self.key is not None and (
+                        not stack or (len(stack) == 1 and stack[0] == '{' and self._last_key == self.key)):
+                    # The array we want: the value of `key` in the top-level object, or a top-level array
+                    self._target_depth = len(stack) + 1
+                stack.append(ch)
+                self._expect_key = ch == '{'
+                self._last_comma = -1
+                if ch == '{' and self._target_depth > 0 and len(stack) - 1 == self._target_depth and self._item_start < 0:
+                    self._item_start = i
+            elif ch == '}' or ch == ']':
+                if not stack:
+                    i += 1
+                    continue  # Stray bracket in the chatter before the JSON
+                if self._last_comma >= 0 and not text[self._last_comma + 1:i].strip():
+                    self._dangling.append(self._last_comma)
+                self._last_comma = -1
+                stack.pop()
+                if ch == '}' and self._item_start >= 0 and len(stack) == self._target_depth:
+                    try:
+                        items.append(_loads(_without_commas(text, self._item_start, i + 1, self._dangling)))
+                        self._value_items += 1
+                    except ValueError:
+                        pass  # Malformed element: skip it, keep streaming the rest
+                    self._item_start = -1
+                elif ch == ']' and len(stack) + 1 == self._target_depth:
+                    self._target_depth = -1
+                self._expect_key = False
+                if not stack:
+                    if not self._wanted():
+                        self._skip_value(i + 1)  # Chatter: keep looking
+                        i += 1
+                        continue
+                    self._end = i + 1
+                    i += 1
+                    break
+                if len(stack) <= self._cut_depth():
+                    self._cuts.append((i + 1, ''.join(stack)))
+            elif ch == ':':
+                self._expect_key = False
+            elif stack:  # ','
+                self._expect_key = stack[-1] == '{'
+                if len(stack) <= self._cut_depth():
+                    self._cuts.append((i, ''.join(stack)))
+                self._last_comma = i
+            i += 1
+        self._pos = i
+        self.items_emitted += len(items)
+        return items
+
+    def result(self) -> Optional[Any]:
+        """
+        The outermost JSON value: parsed as is, else without dangling commas, else
+        (truncated response) rebuilt from the latest cut point that parses,
+        which keeps every complete element. Falls back to the first bracketed value
+        that wasn't the one we want. None when nothing is recoverable.
+        """
+        if self._start < 0:
+            return self._fallback
+        if self._end >= 0:
+            try:
+                return _loads(_without_commas(self.text, self._start, self._end, self._dangling))
+            except ValueError:
+                pass
+
+        for offset, open_containers in reversed(self._cuts):
+            closers = "".join(CLOSERS[c] for c in reversed(open_containers))
+            try:
+                return _loads(_without_commas(self.text, self._start, offset, self._dangling) + closers)
+            except ValueError:
+                continue
+        return self._fallback
+
+
+def _wanted(value: Any, key: Optional[str]) -> bool:
+    """Same rule as JsonArrayStream._wanted, on a decoded value."""
+    if key is None:
+        return True
+    if isinstance(value, dict):
+        return isinstance(value.get(key), list)
+    return isinstance(value, list) and any(isinstance(item, dict) for item in value)
+
+
+def _decode_from(text: str, start: int, key: Optional[str]) -> Tuple[Optional[Any], Optional[Any], bool]:
+    """
+    raw_decode at each bracket from `start` on, skipping past values that decode but aren't
+    wanted. Returns (wanted value, first unwanted one, gave up on malformed JSON). Linear: the
+    decoded spans don't overlap, and the first bracket that doesn't decode ends the fast path.
+    """
+    fallback = None
+    while True:
+        starts = [at for at in (text.find('{', start), text.find('[', start)) if at >= 0]
+        if not starts:
+            return None, fallback, False
+        try:
+            value, end = _decoder.raw_decode(text, min(starts))
+        except ValueError:
+            return None, fallback, True
+        if _wanted(value, key):
+            return value, fallback, False
+        if fallback is None:
+            fallback = value
+        start = end
+
+
+def parse_json_response(text: str, key: Optional[str] = "test_cases") -> Optional[Any]:
+    """
+    One-shot recovery parse of a complete (or cut-off) model response. The value after a
+    ```json fence wins; chatter values without `key` ("Here are [3] tests:") are skipped
+    and only returned when nothing better is found.
+    """
+    if not text:
+        return None
+    fence = text.find("```json")
+    starts = [fence + len("```json")] if fence >= 0 else []
+    starts.append(0)
+    fallback = None
+    for start in starts:
+        # Well-formed JSON behind fences/chatter decodes at C speed; the scanner is for everything else
+        value, skipped, malformed = _decode_from(text, start, key)
+        if value is not None:
+            return value
+        fallback = fallback if fallback is not None else skipped
+        if malformed:
+            stream = JsonArrayStream(key)
+            stream.feed(text[start:])
+            value = stream.result()
+            if value is not None and _wanted(value, key):
+                return value
+            fallback = fallback if fallback is not None else value
+    return fallback
+
+
+def parse_json_object(text: str, key: Optional[str] = "test_cases") -> Optional[dict]:
+    """parse_json_response(), but only a JSON object counts."""
+    value = parse_json_response(text, key)
+    return value if isinstance(value, dict) else None
@@ -0,0 +1,380 @@
+import os
+import re
+import stat
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from .file_scanner import CODE_EXTENSIONS, IGNORE_DIRS, MAX_FILE_SIZE, MAX_TOTAL_CHARS
+from .scan_index import get_scan_index, root_key
+from .git_index import list_git_files
+from .blob_cache import BlobCache, git_blob_sha
+from .content_sniffer import SNIFF_BYTES, classify_name, classify_head, classify_text
+
+# Reads are I/O bound, so a few threads overlap disk latency without thrashing
+LOCAL_READ_WORKERS = int(os.environ.get("SENTINEL_READ_WORKERS", "8"))
+READ_BATCH = LOCAL_READ_WORKERS * 4
+
+# Shared with the GitHub loader: same SHA, same content, whichever side fetched it first
+_blob_cache = BlobCache()
+
+
+# ==========================================
+# 1. .gitignore MATCHING
+# ==========================================
+
+def _translate_glob(pattern: str) -> str:
+    """Translates one gitignore glob into a regex fragment ('*' never crosses '/')."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 3] == '**/':
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern[i:i + 2] == '**':
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class GitignoreRules:
+    """Compiled rules from a single .gitignore, matched against paths relative to its directory."""
+
+    def __init__(self, lines: List[str]):
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negated, dir_only)
+        for raw in lines:
+            line = raw.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = '/' in line
+            line = line.lstrip('/')
+            prefix = '' if anchored else '(?:.*/)?'
+            regex = re.compile(f'^{prefix}{_translate_glob(line)}$')
+            self.rules.append((regex, negated, dir_only))
+
+        # Fast path: without negations every rule can be folded into one alternation
+        self._has_negation = any(neg for _, neg, _ in self.rules)
+        if not self._has_negation and self.rules:
+            files = [r.pattern for r, _, d in self.rules if not d]
+            dirs = [r.pattern for r, _, _ in self.rules]
+            self._any_file = re.compile('|'.join(files)) if files else None
+            self._any_dir = re.compile('|'.join(dirs))
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional['GitignoreRules']:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                rules = cls(f.readlines())
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """True = ignored, False = explicitly re-included, None = no rule applies."""
+        if not self._has_negation:
+            compiled = self._any_dir if is_dir else self._any_file
+            return True if compiled is not None and compiled.match(rel_path) else None
+        # Last matching rule wins
+        for regex, negated, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                return not negated
+        return None
+
+
+# ==========================================
+# 2. THE WALK
+# ==========================================
+
+class ScanResult:
+    """Outcome of a local scan: {relative_path: content} plus bookkeeping counters."""
+
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+        self.found = 0
+        self.skipped = 0
+        # Incremental bookkeeping against the scan index (relative paths, '/' separated)
+        self.added: List[str] = []
+        self.changed: List[str] = []
+        self.removed: List[str] = []
+        self.from_index = 0
+        self.source = "walk"  # "walk" or "git"
+        self.skip_reasons: Counter = Counter()  # e.g. {"minified": 3, "binary": 1}
+
+    def change_summary(self) -> str:
+        return (f"[{self.source}] {len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {self.from_index} served from index")
+
+
+def _walk(root: str, extensions: Set[str], ignore_dirs: Set[str], skip_hidden: bool,
+          max_file_size: int, use_gitignore: bool, result: ScanResult) -> List[Tuple[str, str, Tuple[int, int, int]]]:
+    """
+    Iterative os.scandir walk. Ignored directories are pruned before we descend,
+    so node_modules/.git/venv are never listed, let alone stat-ed.
+    Returns [(relative_path, absolute_path, (inode, mtime_ns, size))] of files worth reading.
+    """
+    candidates = []
+    # Stack of (absolute dir, relative dir, [(rules, base relative dir)])
+    stack = [(root, '', [])]
+
+    while stack:
+        abs_dir, rel_dir, inherited = stack.pop()
+        rule_sets = inherited
+        if use_gitignore:
+            rules = GitignoreRules.from_file(os.path.join(abs_dir, '.gitignore'))
+            if rules:
+                rule_sets = inherited + [(rules, rel_dir)]
+
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            continue
+
+        for entry in entries:
+            name = entry.name
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+
+            if is_dir:
+                if name in ignore_dirs or (skip_hidden and name.startswith('.')):
+                    continue
+            elif os.path.splitext(name)[1].lower() not in extensions:
+                continue
+
+            if rule_sets and _is_gitignored(rel_path, is_dir, rule_sets):
+                continue
+
+            if is_dir:
+                stack.append((entry.path, rel_path, rule_sets))
+                continue
+
+            # Only files that pass every filter pay for a stat()
+            try:
+                st = entry.stat()
+                # FIFOs, sockets and devices: opening one can block, and there's no source in it
+                reason = "special" if not stat.S_ISREG(st.st_mode) else "too_large" if st.st_size > max_file_size else None
+                if reason:
+                    result.skipped += 1
+                    result.skip_reasons[reason] += 1
+                    continue
+            except OSError:
+                result.skipped += 1
+                continue
+            candidates.append((rel_path, entry.path, (st.st_ino, st.st_mtime_ns, st.st_size)))
+
+    candidates.sort()
+    return candidates
+
+
+def _git_candidates(root: str, extensions: Set[str], ignore_dirs: Set[str], skip_hidden: bool,
+                    max_file_size: int, result: ScanResult):
+    """
+    Candidates for a git work tree: what git tracks (plus untracked files that
+    aren't ignored), no directory walk. IGNORE_DIRS still applies: a committed
+    node_modules/ or dist/ is no more worth reading than an ignored one.
+    Returns (candidates, {rel_path: blob_sha}) or None if `root` isn't in a repo.
+    """
+    listing = list_git_files(root)
+    if listing is None:
+        return None
+
+    candidates = []
+    for rel_path in listing.paths:
+        if os.path.splitext(rel_path)[1].lower() not in extensions:
+            continue
+        dirs = rel_path.split('/')[:-1]
+        if any(part in ignore_dirs or (skip_hidden and part.startswith('.')) for part in dirs):
+            continue
+        abs_path = os.path.join(root, rel_path)
+        st = listing.stats.get(rel_path)
+        if st is None:
+            continue  # Tracked but deleted in the worktree
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                st = os.stat(abs_path)  # The index check used lstat; a symlink is read through
+            except OSError:
+                continue
+        reason = "special" if not stat.S_ISREG(st.st_mode) else "too_large" if st.st_size > max_file_size else None
+        if reason:
+            result.skipped += 1
+            result.skip_reasons[reason] += 1
+            continue
+        candidates.append((rel_path, abs_path, (st.st_ino, st.st_mtime_ns, st.st_size)))
+
+    candidates.sort()
+    return candidates, listing.clean_blobs
+
+
+def _is_gitignored(rel_path: str, is_dir: bool, rule_sets) -> bool:
+    # Deeper .gitignore files override shallower ones, so check innermost first
+    for rules, base in reversed(rule_sets):
+        local = rel_path[len(base) + 1:] if base else rel_path
+        verdict = rules.match(local, is_dir)
+        if verdict is not None:
+            return verdict
+    return False
+
+
+def _read_source(rel_path: str, abs_path: str, blob_sha: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Reads the first SNIFF_BYTES, classifies them, and only reads the rest if the file
+    looks hand-written. Returns (content, None) or (None, skip_reason).
+    With `blob_sha`, the content goes to the shared blob cache, but only when the bytes
+    really are that blob: autocrlf, smudge filters and LFS make the worktree differ.
+    """
+    try:
+        with open(abs_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+            reason = classify_head(rel_path, head)
+            if reason:
+                return None, reason
+            data = head + f.read()
+    except OSError:
+        return None, "unreadable"
+    content = data.decode('utf-8', errors='ignore')
+    if blob_sha and git_blob_sha(data) == blob_sha:
+        _blob_cache.put(blob_sha, content)
+    return content, None
+
+
+def scan_local_project(root: str,
+                       extensions: Set[str] = CODE_EXTENSIONS,
+                       ignore_dirs: Set[str] = IGNORE_DIRS,
+                       skip_hidden: bool = False,
+                       max_file_size: int = MAX_FILE_SIZE,
+                       max_total_chars: int = MAX_TOTAL_CHARS,
+                       use_gitignore: bool = True,
+                       use_index: bool = True,
+                       use_git: bool = True,
+                       workers: int = LOCAL_READ_WORKERS) -> ScanResult:
+    """
+    The single local ingestion engine behind FileProcessor and get_local_project_files.
+    Prunes during the walk, honors .gitignore, reads through a bounded thread pool and
+    keeps files in path order until the character budget is spent. Files whose
+    (inode, mtime_ns, size) match the scan index are served from it without being opened.
+    Inside a git work tree the file list comes from git instead of a walk, and files
+    the git index vouches for are looked up by blob SHA in the shared blob cache.
+    """
+    result = ScanResult()
+    root = os.path.abspath(root)
+    extensions = {e.lower() for e in extensions}
+
+    git_scan = _git_candidates(root, extensions, ignore_dirs, skip_hidden, max_file_size, result) if use_git else None
+    if git_scan is not None:
+        candidates, clean_blobs = git_scan
+        result.source = "git"
+    else:
+        candidates, clean_blobs = _walk(root, extensions, ignore_dirs, skip_hidden, max_file_size,
+                                        use_gitignore, result), {}
+
+    # 1. Diff against the previous scan using stat data only
+    index = get_scan_index() if use_index else None
+    # Keyed by the filters too: they decide the candidate set, so each config keeps its own rows
+    index_root = root_key(root, extensions=extensions, ignore_dirs=set(ignore_dirs), skip_hidden=skip_hidden,
+                          max_file_size=max_file_size, use_gitignore=use_gitignore) if index else root
+    previous = index.load_root(index_root) if index else {}
+    seen = {rel_path: stat_key for rel_path, _, stat_key in candidates}
+    unchanged_hashes = {}
+    for rel_path, stat_key in seen.items():
+        if rel_path not in previous:
+            result.added.append(rel_path)
+        elif previous[rel_path][0] != stat_key:
+            result.changed.append(rel_path)
+        elif previous[rel_path][1]:
+            unchanged_hashes[rel_path] = previous[rel_path][1]
+    result.removed = [p for p in previous if p not in seen]
+
+    cached = index.get_contents(unchanged_hashes.values()) if index else {}
+
+    def load(candidate) -> Tuple[Optional[str], Optional[str]]:
+        rel_path, abs_path, (_, _, size) = candidate
+        # Lockfiles and *.min.js are rejected on the name alone, before any I/O
+        reason = classify_name(rel_path)
+        if reason:
+            return None, reason
+        h = unchanged_hashes.get(rel_path)
+        content = cached.get(h) if h else None
+        blob_sha = clean_blobs.get(rel_path)
+        if content is None and blob_sha:
+            content = _blob_cache.get(blob_sha)
+            # The blob (e.g. fetched from GitHub) is only the worktree file if the sizes agree:
+            # LF-only blobs of CRLF files and LFS pointers don't
+            if content is not None and len(content.encode('utf-8')) != size:
+                content = None
+        if content is not None:
+            reason = classify_text(rel_path, content)
+            return (None, reason) if reason else (content, None)
+        return _read_source(rel_path, abs_path, blob_sha)
+
+    # 2. Read (or recall) in path order until the budget is spent
+    total_chars = 0
+    freshly_read: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Read in small batches so we stop touching the disk once the budget is gone
+        for start in range(0, len(candidates), READ_BATCH):
+            if total_chars >= max_total_chars:
+                result.skipped += len(candidates) - start
+                result.skip_reasons["budget"] += len(candidates) - start
+                break
+            batch = candidates[start:start + READ_BATCH]
+            contents = pool.map(load, batch)
+            for (rel_path, _, _), (content, reason) in zip(batch, contents):
+                if content is None:
+                    result.skipped += 1
+                    result.skip_reasons[reason or "unreadable"] += 1
+                    continue
+                if unchanged_hashes.get(rel_path) in cached:
+                    result.from_index += 1
+                else:
+                    freshly_read[rel_path] = content
+                if total_chars + len(content) > max_total_chars:
+                    result.skipped += 1
+                    result.skip_reasons["budget"] += 1
+                    continue
+                if content.strip():
+                    result.files[rel_path.replace('/', os.sep)] = content
+                    total_chars += len(content)
+                    result.found += 1
+
+    # 3. Remember what we saw for next time
+    if index:
+        try:
+            index.update_root(index_root, seen, freshly_read, result.removed)
+        except Exception as e:
+            print(f"⚠️ Scan index update failed (non-fatal): {e}")
+
+    return result
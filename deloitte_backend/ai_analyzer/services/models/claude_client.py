@@ -1,27 +1,36 @@
 import os
-from anthropic import AsyncAnthropic
-import json
 import time
+from typing import Dict, Optional
+
+from ..json_stream import parse_json_object
+from ..provider_scheduler import get_scheduler
+from ..context_packer import estimate_tokens
+from ..client_registry import get_anthropic_client
+from ..response_cache import template_version
+from ..prompt_cache import get_prompt_cache, codebase_prefix, anthropic_usage, add_usage
 
 class ClaudeClient:
     def __init__(self):
         self.api_key = os.environ.get("CLAUDE_API_KEY")
-        if not self.api_key:
+        self.client = get_anthropic_client()  # Offline stand-in when SENTINEL_LLM_MODE=fake|replay
+        if self.client is None:
             print("⚠️ CLAUDE_API_KEY missing, Claude will be disabled")
-            self.client = None
-        else:
-            self.client = AsyncAnthropic(api_key=self.api_key)
         
         self.model_name = "claude-3-5-sonnet-20241022"
         self.cost_per_1k_tokens = 0.003
-        
-    async def generate_test_cases(self, code_context: str):
-        if not self.client: return [], 0, 0
-        
-        start_time = time.time()
-        prompt = f"""Generate SECURITY & EDGE CASE tests.
-Codebase:
-{code_context}
+        self.cost_per_1k_output_tokens = 0.015
+        # Prompt cache: writes cost 1.25x the input rate, reads 0.1x
+        self.cache_write_multiplier = 1.25
+        self.cache_read_multiplier = 0.1
+        self.generation_config = {"max_tokens": 4096, "temperature": 0.3}
+
+    @property
+    def prompt_version(self) -> str:
+        # Part of the response cache key with generation_config: any edit to the prompt text invalidates it
+        return template_version(codebase_prefix("") + self._build_instructions())
+
+    def _build_instructions(self) -> str:
+        return """Generate SECURITY & EDGE CASE tests for the codebase above.
 
 Return ONLY valid JSON with test_cases array. Each object needs:
 - test_case_name
@@ -33,24 +42,33 @@ Return ONLY valid JSON with test_cases array. Each object needs:
 - date: ""
 - poc: ""
 """
+
+    async def generate_test_cases(self, code_context: str, usage: Optional[Dict[str, int]] = None):
+        """(tests, elapsed, cost); the call's token counts are added to `usage` when given."""
+        if not self.client: return [], 0, 0
+        
+        start_time = time.time()
+        # Codebase first and byte-identical across calls, so the provider can cache it
+        prefix = codebase_prefix(code_context)
+        instructions = self._build_instructions()
+        prompt_cache = get_prompt_cache()
+        content = prompt_cache.anthropic_content(self.model_name, prefix, instructions) if prompt_cache else prefix + instructions
         try:
-            message = await self.client.messages.create(
-                model=self.model_name,
-                max_tokens=4096,
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt}]
+            client = self.client
+            message = await get_scheduler("claude").call(
+                lambda: client.messages.create(
+                    model=self.model_name,
+                    messages=[{"role": "user", "content": content}],
+                    **self.generation_config
+                ),
+                tokens=estimate_tokens(prefix + instructions)
             )
             
             response_text = ""
             for block in message.content:
                 if block.type == "text": response_text += block.text
             
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(response_text)
+            result = parse_json_object(response_text) or {}
             test_cases = result.get('test_cases', [])
             
             for tc in test_cases:
@@ -59,7 +77,15 @@ Return ONLY valid JSON with test_cases array. Each object needs:
                 tc['category'] = 'Security'
             
             elapsed = time.time() - start_time
-            cost = len(code_context) / 1000 * self.cost_per_1k_tokens
+            call_usage = anthropic_usage(message.usage) if getattr(message, "usage", None) else {}
+            if call_usage:
+                billed_input = (call_usage["uncached_input_tokens"] - call_usage["cache_write_input_tokens"]
+                                + call_usage["cache_write_input_tokens"] * self.cache_write_multiplier
+                                + call_usage["cached_input_tokens"] * self.cache_read_multiplier)
+                cost = billed_input / 1000 * self.cost_per_1k_tokens + call_usage["output_tokens"] / 1000 * self.cost_per_1k_output_tokens
+                if usage is not None: add_usage(usage, call_usage)
+            else:
+                cost = len(code_context) / 1000 * self.cost_per_1k_tokens
             print(f"✅ Claude: {len(test_cases)} tests in {elapsed:.2f}s")
             return test_cases, elapsed, cost
             
@@ -1,56 +1,238 @@
 import os
+import copy
+import time
 import asyncio
+import inspect
 import re
-from typing import List, Tuple, Dict, Protocol, runtime_checkable, cast
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Dict, Any, Protocol, runtime_checkable, cast
 from .gemini_client import GeminiClient
 from .claude_client import ClaudeClient
+from ..response_cache import get_response_cache, cache_key
+from ..test_dedup import cluster_tests
+
+# --- Latency Budget ---
+# Wall-clock budget for one ensemble request; providers still running are cancelled (0 = wait for all)
+ENSEMBLE_DEADLINE_S = float(os.getenv("SENTINEL_ENSEMBLE_DEADLINE_S", "90"))
+# keep: test cases a cancelled provider already streamed are used | drop: they are discarded
+PARTIAL_POLICIES = ("keep", "drop")
+ENSEMBLE_PARTIAL_POLICY = os.getenv("SENTINEL_ENSEMBLE_PARTIAL_POLICY", "keep")
+
+# --- Hedging ---
+# Send the same request to a backup model once a provider is slower than this percentile of its
+# recent latencies (0 = off). Needs HEDGE_MIN_SAMPLES observations first.
+HEDGE_PERCENTILE = float(os.getenv("SENTINEL_ENSEMBLE_HEDGE_PERCENTILE", "0"))
+HEDGE_MIN_SAMPLES = int(os.getenv("SENTINEL_ENSEMBLE_HEDGE_MIN_SAMPLES", "5"))
+HEDGE_GEMINI_MODEL = os.getenv("SENTINEL_ENSEMBLE_HEDGE_GEMINI_MODEL", "gemini-2.0-flash")
+LATENCY_WINDOW = 100
 
 @runtime_checkable
 class TestCaseGenerator(Protocol):
+    """
+    Returns (tests, elapsed, cost). Providers that stream may also accept an
+    `on_test_case` callback, called with each test case as it arrives, so a
+    provider cut off by the deadline still contributes what it finished, and a
+    `usage` dict that the call's token counts are added to.
+    """
     async def generate_test_cases(self, code_context: str) -> Tuple[List[Dict], float, float]:
         ...
 
 class EnsembleOrchestrator:
-    def __init__(self):
+    def __init__(self, clients: Optional[List[Tuple[str, Any]]] = None,
+                 hedges: Optional[Dict[str, Any]] = None,
+                 hedge_percentile: Optional[float] = None):
         self.use_gemini = os.getenv("USE_GEMINI", "true").lower() == "true"
         self.use_claude = os.getenv("USE_CLAUDE", "true").lower() == "true"
-        self.clients = []
+        self.hedge_percentile = HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        # Recent wall-clock latencies per provider, for the hedge trigger
+        self.latencies: Dict[str, deque] = {}
 
+        if clients is not None:
+            self.clients = list(clients)
+            self.hedges = dict(hedges or {})
+            return
+
+        self.clients = []
+        self.hedges = {}
         if self.use_gemini:
             try: self.clients.append(("Gemini", GeminiClient()))
             except: pass
+            if self.hedge_percentile > 0:
+                try:
+                    backup = GeminiClient()
+                    backup.model_name = HEDGE_GEMINI_MODEL
+                    self.hedges["Gemini"] = backup
+                except: pass
         if self.use_claude:
             try: self.clients.append(("Claude", ClaudeClient()))
             except: pass
 
-    async def generate_all_test_cases(self, code_context: str):
-        tasks = [client.generate_test_cases(code_context) for _, client in self.clients]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _generate_cached(self, name: str, client, code_context: str, cache_mode: str,
+                               on_test_case: Optional[Callable[[Dict], None]] = None,
+                               usage: Optional[Dict[str, int]] = None):
+        """One provider's (tests, elapsed, cost), served from the response cache when this exact request ran before."""
+        cache = get_response_cache() if cache_mode != "bypass" else None
+        key = cache_key(
+            name.lower(), getattr(client, "model_name", ""), getattr(client, "prompt_version", "1"),
+            code_context, getattr(client, "generation_config", None)
+        )
+        if cache and cache_mode == "use":
+            hit = await asyncio.to_thread(cache.get, key)
+            if hit is not None:
+                tests = copy.deepcopy(hit["tests"])
+                for tc in tests:
+                    tc["cached"] = True
+                return tests, 0.0, 0.0
+
+        parameters = inspect.signature(client.generate_test_cases).parameters
+        kwargs: Dict[str, Any] = {}
+        if on_test_case and "on_test_case" in parameters:
+            kwargs["on_test_case"] = on_test_case
+        if usage is not None and "usage" in parameters:
+            kwargs["usage"] = usage
+        tests, elapsed, cost = await client.generate_test_cases(code_context, **kwargs)
+        if cache and tests:
+            await asyncio.to_thread(cache.put, key, {"tests": tests}, name.lower(), getattr(client, "model_name", ""))
+            tests = copy.deepcopy(tests)
+        return tests, elapsed, cost
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Seconds after which `name` gets a hedged request, or None (no backup, hedging off, too few samples)."""
+        if self.hedge_percentile <= 0 or name not in self.hedges:
+            return None
+        samples = sorted(self.latencies.get(name, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+    def _record_latency(self, name: str, seconds: float):
+        self.latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    async def _run_provider(self, name: str, client, code_context: str, cache_mode: str, partials: List[List[Dict]],
+                            usage: Optional[Dict[str, int]] = None):
+        """
+        One provider slot: the primary request, plus a hedged one to the backup model if the
+        primary is slower than its usual percentile. First non-empty answer wins, the other
+        request is cancelled. Each request streams into its own list in `partials`; the token
+        counts of both go to `usage` (both are billed). Returns (tests, elapsed, cost, hedged).
+        """
+        start = time.perf_counter()
 
+        def launch(target) -> asyncio.Task:
+            streamed: List[Dict] = []
+            partials.append(streamed)
+            return asyncio.create_task(self._generate_cached(name, target, code_context, cache_mode, streamed.append, usage))
+
+        primary = launch(client)
+        racers = {primary: False}
+        try:
+            delay = self.hedge_delay(name)
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    racers[launch(self.hedges[name])] = True
+
+            pending = set(racers)
+            fallback, error = None, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    tests, elapsed, cost = task.result()
+                    if tests:
+                        if not any(tc.get("cached") for tc in tests):
+                            self._record_latency(name, time.perf_counter() - start)
+                        return tests, elapsed, cost, racers[task]
+                    fallback = (tests, elapsed, cost, racers[task])
+            if fallback is None and error is not None:
+                raise error
+            return fallback
+        finally:
+            for task in racers:
+                task.cancel()
+
+    def _tag(self, name: str, tests: List[Dict]) -> List[Dict]:
+        for tc in tests:
+            # APPLY THE NUCLEAR CLEANER
+            tc["code"] = self._sanitize_playwright_code(tc["code"])
+            tc["model_source"] = name
+            tc["generated_by"] = f"Sentinel Ensemble ({name})"
+            if "confidence_score" not in tc: tc["confidence_score"] = 0.85
+        return tests
+
+    async def stream_test_cases(self, code_context: str, cache_mode: str = "use",
+                                deadline_s: Optional[float] = None,
+                                partial_policy: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Runs every provider at once and yields one result per provider as soon as it is in:
+        {"provider", "status": ok|error|timeout, "tests", "elapsed", "cost", "hedged", "usage"}.
+        `usage` holds the provider's input tokens split into cached (prompt cache) and uncached.
+        Providers still running at the deadline are cancelled; what they streamed so far
+        is kept or dropped according to the partial policy.
+        """
+        deadline_s = ENSEMBLE_DEADLINE_S if deadline_s is None else deadline_s
+        policy = partial_policy or ENSEMBLE_PARTIAL_POLICY
+        if policy not in PARTIAL_POLICIES:
+            policy = "keep"
+
+        start = time.perf_counter()
+        partials: Dict[str, List[List[Dict]]] = {name: [] for name, _ in self.clients}
+        usages: Dict[str, Dict[str, int]] = {name: {} for name, _ in self.clients}
+        tasks = {
+            asyncio.create_task(self._run_provider(name, client, code_context, cache_mode, partials[name], usages[name])): name
+            for name, client in self.clients
+        }
+        try:
+            pending = set(tasks)
+            while pending:
+                remaining = deadline_s - (time.perf_counter() - start) if deadline_s > 0 else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    if task.exception() is not None:
+                        print(f"⚠️ Ensemble: {name} failed: {task.exception()}")
+                        yield {"provider": name, "status": "error", "tests": [], "elapsed": time.perf_counter() - start,
+                               "cost": 0.0, "hedged": False, "usage": usages[name], "error": str(task.exception())}
+                        continue
+                    tests, elapsed, cost, hedged = task.result()
+                    yield {"provider": name, "status": "ok", "tests": self._tag(name, tests),
+                           "elapsed": elapsed, "cost": cost, "hedged": hedged, "usage": usages[name]}
+
+            for task in pending:
+                name = tasks[task]
+                task.cancel()
+                # A miss still counts as a (censored) latency sample, so the hedge trigger learns
+                self._record_latency(name, deadline_s)
+                kept = max(partials[name], key=len, default=[]) if policy == "keep" else []
+                print(f"⏱️ Ensemble: {name} missed the {deadline_s:g}s deadline, kept {len(kept)} streamed tests")
+                yield {"provider": name, "status": "timeout", "tests": self._tag(name, list(kept)),
+                       "elapsed": deadline_s, "cost": 0.0, "hedged": False, "usage": usages[name]}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_all_test_cases(self, code_context: str, cache_mode: str = "use",
+                                      deadline_s: Optional[float] = None, partial_policy: Optional[str] = None):
+        start = time.perf_counter()
         all_tests = []
-        total_time = 0.0
         cost_breakdown = {"gemini": 0.0, "claude": 0.0, "total": 0.0}
         models_used = []
 
-        for (name, _), result in zip(self.clients, results):
-            if isinstance(result, BaseException):
-                continue
-            
-            tests, elapsed, cost = result
-            for tc in tests:
-                # APPLY THE NUCLEAR CLEANER
-                tc["code"] = self._sanitize_playwright_code(tc["code"])
-                tc["model_source"] = name
-                tc["generated_by"] = f"Sentinel Ensemble ({name})"
-                if "confidence_score" not in tc: tc["confidence_score"] = 0.85
-                all_tests.append(tc)
-
-            total_time = max(total_time, elapsed)
+        async for result in self.stream_test_cases(code_context, cache_mode, deadline_s, partial_policy):
+            name = result["provider"]
+            all_tests.extend(result["tests"])
             key = name.lower()
-            if key in cost_breakdown: cost_breakdown[key] += cost
-            cost_breakdown["total"] += cost
-            models_used.append(name)
+            if key in cost_breakdown: cost_breakdown[key] += result["cost"]
+            cost_breakdown["total"] += result["cost"]
+            if result["tests"]:
+                models_used.append(name)
 
+        # Wall clock of the whole ensemble (bounded by the deadline), not the slowest provider's own timer
+        total_time = time.perf_counter() - start
         unique_tests, duplicates_count = self.deduplicate_tests(all_tests)
         ranked_tests = self.rank_by_priority(unique_tests)
 
@@ -92,21 +274,27 @@ class EnsembleOrchestrator:
         return code
 
     def deduplicate_tests(self, test_cases: List[Dict]):
+        """
+        Keeps the most confident test of each cluster of duplicates (near-same name and
+        similar body, or near-same body, across providers; see test_dedup.py). The kept test lists the ones
+        it stands for under "merged_tests", so the UI can show what was merged.
+        Returns (unique, duplicates_count).
+        """
         test_cases.sort(key=lambda x: x.get("confidence_score", 0), reverse=True)
-        unique, seen, duplicates = [], set(), 0
-        for tc in test_cases:
-            name = tc.get("test_case_name", "").lower().strip()
-            if any(self._similarity(name, s) > 0.80 for s in seen):
-                duplicates += 1
-            else:
-                unique.append(tc)
-                seen.add(name)
+        unique, duplicates = [], 0
+        for members in cluster_tests(test_cases):
+            # Members are in input order: the first is the most confident
+            kept = test_cases[members[0]]
+            if len(members) > 1:
+                kept["merged_tests"] = [{
+                    "test_case_name": test_cases[i].get("test_case_name", ""),
+                    "model_source": test_cases[i].get("model_source", ""),
+                    "confidence_score": test_cases[i].get("confidence_score", 0)
+                } for i in members[1:]]
+                duplicates += len(members) - 1
+            unique.append(kept)
         return unique, duplicates
 
-    def _similarity(self, s1, s2):
-        w1, w2 = set(s1.split()), set(s2.split())
-        return len(w1 & w2) / len(w1 | w2) if w1 or w2 else 0.0
-
     def rank_by_priority(self, test_cases):
         prio = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
         return sorted(test_cases, key=lambda x: (prio.get(x.get("priority", "Medium"), 2), -x.get("confidence_score", 0.5)))
\ No newline at end of file
@@ -1,71 +1,55 @@
 import os
-import json
 import time
 import re
-import asyncio
-from typing import List, Dict, Any, cast
-from google import genai
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, cast
 from google.genai import types
 from dotenv import load_dotenv
 
+from ..json_stream import JsonArrayStream
+from ..provider_scheduler import get_scheduler, is_retryable, ProviderUnavailable
+from ..prompt_cache import get_prompt_cache, codebase_prefix, gemini_usage, add_usage
+from ..context_packer import estimate_tokens
+from ..client_registry import get_gemini_client
+from ..response_cache import template_version
+
 load_dotenv()
 
 class GeminiClient:
     def __init__(self):
         self.api_key = os.environ.get("GEMINI_API_KEY")
-        if not self.api_key:
+        self.client = get_gemini_client()  # Offline stand-in when SENTINEL_LLM_MODE=fake|replay
+        if self.client is None:
             raise ValueError("GEMINI_API_KEY not found in .env file")
-        
-        self.client = genai.Client(api_key=self.api_key)
         self.model_name = "gemini-2.5-flash" 
         self.cost_per_1M_input = 0.30
         self.cost_per_1M_output = 2.50
-        
-    def _repair_truncated_json(self, json_str: str) -> Dict[str, Any]:
-        """Self-healing logic for AI responses that cut off mid-sentence."""
-        json_str = json_str.strip()
-        if not json_str: return {"test_cases": []}
-        
-        # Close open quotes
-        if json_str.count('"') % 2 != 0: json_str += '"'
-        
-        # Balance braces and brackets
-        stack = []
-        for char in json_str:
-            if char == '{': stack.append('}')
-            elif char == '[': stack.append(']')
-            elif char == '}' and stack and stack[-1] == '}': stack.pop()
-            elif char == ']' and stack and stack[-1] == ']': stack.pop()
-        
-        repair_suffix = "".join(reversed(stack))
-        try:
-            return json.loads(json_str + repair_suffix)
-        except:
-            # Fallback: slice to the last valid object
-            last_obj = json_str.rfind('},')
-            if last_obj != -1:
-                try: return json.loads(json_str[:last_obj] + '}]}')
-                except: pass
-            return {"test_cases": []}
-
-    async def generate_test_cases(self, code_context: str):
-        if not code_context.strip(): return [], 0.0, 0.0
-        start_time = time.time()
-        
-        prompt = f"""You are a Principal QA Automation Architect. Return STRICT JSON.
+        self.cost_per_1M_cached_input = 0.075  # Input served from a context cache
+        self.generation_config = {"temperature": 0.1, "max_output_tokens": 8192, "response_mime_type": "application/json"}
+
+    @property
+    def prompt_version(self) -> str:
+        # Part of the response cache key with generation_config: any edit to the prompt text invalidates it
+        return template_version(self._build_prompt(""))
+
+    def _build_prefix(self, code_context: str) -> str:
+        # The cacheable part: nothing call-specific goes in here
+        return codebase_prefix(code_context[:50000])
+
+    def _build_prompt(self, code_context: str) -> str:
+        return self._build_prefix(code_context) + self._build_instructions()
+
+    def _build_instructions(self) -> str:
+        return """You are a Principal QA Automation Architect. Generate tests for the codebase above. Return STRICT JSON.
 ### CODE_STRUCTURE_RULES:
 - Start 'code' blocks with: `import pytest`, `import uuid`, `import time`.
 - Use `str(uuid.uuid4())` for IDs. NEVER use `playwright.uuid4()`.
 - Use `int(time.time())` for timestamps. NEVER use `playwright.timestamp()`.
 - API Context: Use `base_url="http://127.0.0.1:8000"`.
 
-CODEBASE:
-{code_context[:50000]} 
-
 ### OUTPUT SCHEMA:
-{{
+{
   "test_cases": [
-    {{
+    {
       "test_case_name": "Scenario",
       "description": "Short desc",
       "steps": "1. Step\\n2. Step",
@@ -74,73 +58,109 @@ CODEBASE:
       "confidence_score": 0.95,
       "reasoning": "Reasoning",
       "code": "import pytest\\nimport uuid\\nimport time\\ndef test_x(playwright):..."
-    }}
+    }
   ],
   "project_summary": "Overview",
   "tech_stack": ["Stack"]
-}}
+}
 """
-        try:
-            response = await self.client.aio.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.1,
-                    max_output_tokens=8192, 
-                    response_mime_type="application/json"
-                )
-            )
-            
-            raw_text = response.text.strip() if response.text else ""
-            if "{" in raw_text:
-                raw_text = raw_text[raw_text.find("{"):raw_text.rfind("}")+1]
-            if not raw_text: return [], 0.0, 0.0
-            
-            try:
-                result = json.loads(raw_text)
-            except json.JSONDecodeError:
-                result = self._repair_truncated_json(raw_text)
-
-            test_cases_raw = result.get('test_cases', []) if isinstance(result, dict) else result
-            final_test_cases: List[Dict[str, Any]] = []
-            
-            for item in test_cases_raw:
-                if not isinstance(item, dict): continue
-                tc = cast(Dict[str, Any], item)
-                
-                # --- AUTO-CORRECTION LAYER ---
-                code = str(tc.get('code', ''))
-                code = code.replace("playwright.uuid4()", "str(uuid.uuid4())")
-                code = code.replace("playwright.timestamp()", "int(time.time())")
-                
-                # Prepend missing imports
-                needed_imports = []
-                if "import uuid" not in code: needed_imports.append("import uuid")
-                if "import pytest" not in code: needed_imports.append("import pytest")
-                if "import time" not in code: needed_imports.append("import time")
-                if needed_imports:
-                    code = "\n".join(needed_imports) + "\n" + code
-
-                tc['code'] = re.sub(r'```python|```', '', code).strip()
-                tc['model_source'] = "Gemini 2.5"
-                tc['generated_by'] = f'Sentinel Agent ({self.model_name})'
-                if 'reasoning' not in tc: tc['reasoning'] = "Validated via logic density."
-                
+
+    def _correct_test_case(self, tc: Dict[str, Any]) -> Dict[str, Any]:
+        # --- AUTO-CORRECTION LAYER ---
+        code = str(tc.get('code', ''))
+        code = code.replace("playwright.uuid4()", "str(uuid.uuid4())")
+        code = code.replace("playwright.timestamp()", "int(time.time())")
+
+        # Prepend missing imports
+        needed_imports = []
+        if "import uuid" not in code: needed_imports.append("import uuid")
+        if "import pytest" not in code: needed_imports.append("import pytest")
+        if "import time" not in code: needed_imports.append("import time")
+        if needed_imports:
+            code = "\n".join(needed_imports) + "\n" + code
+
+        tc['code'] = re.sub(r'```python|```', '', code).strip()
+        tc['model_source'] = "Gemini 2.5"
+        tc['generated_by'] = f'Sentinel Agent ({self.model_name})'
+        if 'reasoning' not in tc: tc['reasoning'] = "Validated via logic density."
+        return tc
+
+    async def stream_test_cases(self, code_context: str, usage: Optional[Dict[str, int]] = None,
+                                cached_content: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the response and yields each corrected test case as soon as its
+        closing brace arrives. Token counts land in `usage` when given. With
+        `cached_content` (a context cache holding the prefix) only the instructions are sent.
+        """
+        stream = JsonArrayStream("test_cases")
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=self._build_instructions() if cached_content else self._build_prompt(code_context),
+            config=types.GenerateContentConfig(**self.generation_config, cached_content=cached_content)
+        ):
+            metadata = getattr(chunk, 'usage_metadata', None)
+            if metadata is not None and usage is not None:
+                usage.update(gemini_usage(metadata))
+            for item in stream.feed(chunk.text or ""):
+                if isinstance(item, dict):
+                    yield self._correct_test_case(cast(Dict[str, Any], item))
+
+        if stream.items_emitted:
+            return
+        # Nothing streamed (no test_cases array in the expected place): salvage what we can from the whole text
+        result = stream.result()
+        if result is None: return
+
+        test_cases_raw = result.get('test_cases', []) if isinstance(result, dict) else result
+        for item in test_cases_raw:
+            if isinstance(item, dict):
+                yield self._correct_test_case(cast(Dict[str, Any], item))
+
+    async def generate_test_cases(self, code_context: str, on_test_case: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                  usage: Optional[Dict[str, int]] = None):
+        """
+        Collects the streamed test cases; `on_test_case` sees each one as it arrives.
+        The call's token counts are added to `usage` when given.
+        """
+        if not code_context.strip(): return [], 0.0, 0.0
+        start_time = time.time()
+        call_usage: Dict[str, int] = {}
+        final_test_cases: List[Dict[str, Any]] = []
+        prefix = self._build_prefix(code_context)
+        prompt_cache = get_prompt_cache()
+        # Resolved before the scheduled call: creating a context cache is a scheduled call of its own
+        handle = await prompt_cache.gemini_prefix(self.client, self.model_name, prefix) if prompt_cache else None
+
+        async def call():
+            async for tc in self.stream_test_cases(code_context, call_usage, handle):
                 final_test_cases.append(tc)
+                if on_test_case: on_test_case(tc)
 
+        try:
+            # Rate limits, backoff on 429/5xx and the circuit breaker are shared with every other Gemini call
+            scheduler = get_scheduler("gemini")
+            tokens = estimate_tokens(self._build_prompt(code_context))
+            try:
+                await scheduler.call(call, tokens=tokens, can_retry=lambda: not final_test_cases)
+            except Exception as e:
+                # The context cache is gone at the provider: once more with the codebase inline
+                if not handle or final_test_cases or isinstance(e, ProviderUnavailable) or is_retryable(e):
+                    raise
+                prompt_cache.discard(handle)
+                handle = None
+                await scheduler.call(call, tokens=tokens, can_retry=lambda: not final_test_cases)
             elapsed = time.time() - start_time
-            
-            # Robust Cost Tracking
-            usage = response.usage_metadata
-            it = getattr(usage, 'prompt_token_count', 0) or 0
-            ot = getattr(usage, 'candidates_token_count', 0) or 0
-            cost = ((it / 1_000_000) * self.cost_per_1M_input) + ((ot / 1_000_000) * self.cost_per_1M_output)
-            
+
+            # Robust Cost Tracking (cached input is billed at the context-cache rate)
+            it = call_usage.get('uncached_input_tokens', 0)
+            ct = call_usage.get('cached_input_tokens', 0)
+            ot = call_usage.get('output_tokens', 0)
+            cost = ((it / 1_000_000) * self.cost_per_1M_input) + ((ct / 1_000_000) * self.cost_per_1M_cached_input) \
+                + ((ot / 1_000_000) * self.cost_per_1M_output)
+            if usage is not None: add_usage(usage, call_usage)
+
             return final_test_cases, elapsed, cost
-            
+
         except Exception as e:
-            if "429" in str(e):
-                await asyncio.sleep(10)
-                return await self.generate_test_cases(code_context)
             print(f"❌ Gemini Error: {str(e)}")
-            return [], 0.0, 0.0
\ No newline at end of file
+            return final_test_cases, time.time() - start_time, 0.0
@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from google.genai import types
+
+from .context_packer import estimate_tokens
+from .provider_scheduler import get_scheduler, is_retryable, ProviderUnavailable
+
+# --- Prompt Prefix Cache Settings ---
+# Every prompt starts with the packed codebase (see codebase_prefix), so the providers can keep
+# it cached between calls: Gemini context caches (explicit handles), Anthropic prompt caching
+PROMPT_CACHE_ENABLED = os.getenv("SENTINEL_PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Lifetime of a Gemini context cache; a handle is retired this margin before the provider drops it
+PROMPT_CACHE_TTL_S = int(os.getenv("SENTINEL_PROMPT_CACHE_TTL_S", "600"))
+PROMPT_CACHE_EXPIRY_MARGIN_S = 30
+# Anthropic keeps a marked prefix for 5 minutes after its last use
+ANTHROPIC_CACHE_TTL_S = 300
+# Providers don't cache shorter prefixes (Gemini 2.5 Flash and Claude Sonnet: 1024 tokens)
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("SENTINEL_PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+
+def codebase_prefix(code_context: str) -> str:
+    """The block every prompt starts with; the instructions follow it. Same context, same bytes."""
+    return f"CODEBASE:\n{code_context}\n\nEND OF CODEBASE\n\n"
+
+
+def prefix_fingerprint(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+
+# --- Token accounting ---
+
+def gemini_usage(metadata: Any) -> Dict[str, int]:
+    """Per-call input split from Gemini usage_metadata (prompt_token_count includes the cached part)."""
+    total = getattr(metadata, "prompt_token_count", 0) or 0
+    cached = getattr(metadata, "cached_content_token_count", 0) or 0
+    return {"input_tokens": total, "cached_input_tokens": cached, "uncached_input_tokens": total - cached,
+            "output_tokens": getattr(metadata, "candidates_token_count", 0) or 0}
+
+
+def anthropic_usage(usage: Any) -> Dict[str, int]:
+    """Per-call input split from an Anthropic usage block (input_tokens excludes cache reads and writes)."""
+    uncached = getattr(usage, "input_tokens", 0) or 0
+    read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    return {"input_tokens": uncached + read + written, "cached_input_tokens": read,
+            "uncached_input_tokens": uncached + written, "cache_write_input_tokens": written,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0}
+
+
+def add_usage(total: Dict[str, int], usage: Dict[str, int]):
+    for name, count in usage.items():
+        total[name] = total.get(name, 0) + count
+
+
+# --- Handles ---
+
+class PrefixHandle:
+    """One cached codebase prefix at one provider. `name` is the Gemini cache name (None: caching failed)."""
+
+    def __init__(self, provider: str, model: str, fingerprint: str, name: Optional[str], tokens: int, expires_at: float):
+        self.provider = provider
+        self.model = model
+        self.fingerprint = fingerprint
+        self.name = name
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.uses = 0
+
+
+class PromptCache:
+    """
+    Provider-side prefix caches per (provider, model, codebase fingerprint), with expiry.
+    Gemini: a context cache is created on the first call with a prefix and every later call
+    references it by name until it expires. Anthropic: the prefix block is marked for caching
+    and the handle tracks how long the provider still holds it (each use extends that).
+    """
+
+    def __init__(self, ttl_s: int = PROMPT_CACHE_TTL_S, min_tokens: int = PROMPT_CACHE_MIN_TOKENS):
+        self.ttl_s = ttl_s
+        self.min_tokens = min_tokens
+        self._handles: Dict[Tuple[str, str, str], PrefixHandle] = {}
+        self._creating: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self.stats = {"created": 0, "reused": 0, "expired": 0, "inline": 0, "failed": 0}
+
+    def _live(self, key: Tuple[str, str, str]) -> Optional[PrefixHandle]:
+        handle = self._handles.get(key)
+        if handle is not None and handle.expires_at <= time.time():
+            del self._handles[key]
+            self.stats["expired"] += 1
+            return None
+        return handle
+
+    async def gemini_prefix(self, client: Any, model: str, prefix: str) -> Optional[str]:
+        """Name of a live Gemini context cache holding `prefix` for `model`, created on first use. None: send it inline."""
+        caches = getattr(getattr(client, "aio", None), "caches", None)
+        tokens = estimate_tokens(prefix)
+        if caches is None or tokens < self.min_tokens:
+            self.stats["inline"] += 1
+            return None
+        key = ("gemini", model, prefix_fingerprint(prefix))
+        handle = self._live(key)
+        created = False
+        if handle is None:
+            # Concurrent calls with the same prefix (analysis + test generation) share one creation
+            creating = self._creating.get(key)
+            if creating is None:
+                created = True
+                creating = self._creating[key] = asyncio.create_task(self._create_gemini(caches, key, prefix, tokens))
+                creating.add_done_callback(lambda _: self._creating.pop(key, None))
+            handle = await asyncio.shield(creating)
+        if handle.name is None:
+            self.stats["inline"] += 1
+            return None
+        if not created:
+            self.stats["reused"] += 1
+        handle.uses += 1
+        return handle.name
+
+    async def _create_gemini(self, caches: Any, key: Tuple[str, str, str], prefix: str, tokens: int) -> PrefixHandle:
+        _, model, fingerprint = key
+        config = types.CreateCachedContentConfig(contents=[prefix], ttl=f"{self.ttl_s}s",
+                                                 display_name=f"sentinel-{fingerprint[:16]}")
+        try:
+            cached = await get_scheduler("gemini").call(lambda: caches.create(model=model, config=config), tokens=tokens)
+            name = cached.name
+            tokens = getattr(getattr(cached, "usage_metadata", None), "total_token_count", None) or tokens
+            self.stats["created"] += 1
+            print(f"🗄️ Prompt cache: {tokens} codebase tokens cached for {model} ({name})")
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"⚠️ Prompt cache: no context cache for {model}, sending the codebase inline: {e}")
+            handle = PrefixHandle("gemini", model, fingerprint, None, tokens, 0.0)
+            if isinstance(e, ProviderUnavailable) or is_retryable(e):
+                return handle  # Transient: the next call tries again
+            # Permanent (e.g. the model has no context caching): remembered for the TTL, not asked on every call
+            handle.expires_at = time.time() + self.ttl_s
+            self._handles[key] = handle
+            return handle
+        handle = PrefixHandle("gemini", model, fingerprint, name, tokens,
+                              time.time() + self.ttl_s - PROMPT_CACHE_EXPIRY_MARGIN_S)
+        self._handles[key] = handle
+        return handle
+
+    def anthropic_content(self, model: str, prefix: str, instructions: str) -> Union[str, List[Dict[str, Any]]]:
+        """User message content: the prefix block marked for prompt caching, then the instructions."""
+        tokens = estimate_tokens(prefix)
+        if tokens < self.min_tokens:
+            self.stats["inline"] += 1
+            return prefix + instructions
+        key = ("anthropic", model, prefix_fingerprint(prefix))
+        handle = self._live(key)
+        if handle is None:
+            handle = self._handles[key] = PrefixHandle("anthropic", model, key[2], key[2][:16], tokens, 0.0)
+            self.stats["created"] += 1
+        else:
+            self.stats["reused"] += 1
+        handle.uses += 1
+        handle.expires_at = time.time() + ANTHROPIC_CACHE_TTL_S
+        return [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": instructions}]
+
+    def discard(self, name: str):
+        """Forgets the Gemini handle `name` (e.g. the provider reported it gone)."""
+        for key, handle in list(self._handles.items()):
+            if handle.name == name:
+                del self._handles[key]
+
+    def handles(self) -> List[Dict[str, Any]]:
+        """Live handles, for diagnostics."""
+        now = time.time()
+        return [{"provider": h.provider, "model": h.model, "fingerprint": h.fingerprint[:16], "name": h.name,
+                 "tokens": h.tokens, "uses": h.uses, "expires_in_s": round(h.expires_at - now, 1)}
+                for h in self._handles.values() if h.expires_at > now]
+
+    async def release(self, client: Any):
+        """Deletes the live Gemini context caches (they bill storage until they expire)."""
+        caches = getattr(getattr(client, "aio", None), "caches", None)
+        handles = [h for h in self._handles.values() if h.provider == "gemini" and h.name]
+        self._handles.clear()
+        if caches is None:
+            return
+        for handle in handles:
+            try:
+                await caches.delete(name=handle.name)
+            except Exception as e:
+                print(f"⚠️ Prompt cache: deleting {handle.name} failed: {e}")
+
+
+_prompt_cache: Optional[PromptCache] = None
+
+
+def get_prompt_cache() -> Optional[PromptCache]:
+    """Process-wide prefix cache; None when SENTINEL_PROMPT_CACHE_ENABLED=false."""
+    global _prompt_cache
+    if not PROMPT_CACHE_ENABLED:
+        return None
+    if _prompt_cache is None:
+        _prompt_cache = PromptCache()
+    return _prompt_cache
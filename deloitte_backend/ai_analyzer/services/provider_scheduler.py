@@ -0,0 +1,258 @@
+import os
+import re
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# --- Per-provider limits (0 = unlimited) ---
+# SENTINEL_<PROVIDER>_RPM / _TPM / _CONCURRENCY override these, e.g. SENTINEL_GEMINI_RPM=1000
+DEFAULT_LIMITS = {
+    "gemini": {"rpm": 60, "tpm": 1_000_000, "concurrency": 8},
+    "claude": {"rpm": 50, "tpm": 40_000, "concurrency": 4},
+}
+FALLBACK_LIMITS = {"rpm": 60, "tpm": 0, "concurrency": 4}
+
+# --- Retry & circuit breaker ---
+RETRY_ATTEMPTS = int(os.getenv("SENTINEL_RETRY_ATTEMPTS", "4"))          # Retries after the first try
+RETRY_BASE_S = float(os.getenv("SENTINEL_RETRY_BASE_S", "1"))
+RETRY_MAX_DELAY_S = float(os.getenv("SENTINEL_RETRY_MAX_DELAY_S", "60"))  # Also caps Retry-After
+BREAKER_FAILURES = int(os.getenv("SENTINEL_BREAKER_FAILURES", "5"))      # Consecutive failures that open it
+BREAKER_COOLDOWN_S = float(os.getenv("SENTINEL_BREAKER_COOLDOWN_S", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504, 529}
+RETRY_DELAY_RE = re.compile(r'retry[_ ]?delay\W+(\d+(?:\.\d+)?)s', re.IGNORECASE)
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit breaker is open: skip the call and take the fallback path."""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # anthropic: status_code | google-genai / api_core: code
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, overload, 5xx, timeouts and dropped connections; not bad requests or auth errors."""
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(exc).__name__
+    if "Timeout" in name or "Connection" in name or name == "ServiceUnavailable":
+        return True
+    return is_rate_limit(exc)
+
+
+def is_rate_limit(exc: BaseException) -> bool:
+    """A 429: the provider is up but throttling us. Retried, but never opens the breaker."""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429
+    return type(exc).__name__ == "ResourceExhausted" or "429" in str(exc) or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait: Retry-After header, or Google's RetryInfo retryDelay."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    match = RETRY_DELAY_RE.search(str(exc))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff: in-flight requests that failed together don't retry together."""
+    return random.uniform(0, min(RETRY_MAX_DELAY_S, RETRY_BASE_S * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, up to `burst` (default: one minute's worth). Waiters are served in order."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute if burst is None else burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Waits until `amount` units are available and takes them. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)  # A request bigger than the bucket still goes through, alone
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` consecutive failures -> one probe call after `cooldown_s` (half-open)."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.threshold = failures
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing or time.monotonic() - self.opened_at >= self.cooldown_s else "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.probing and time.monotonic() - self.opened_at >= self.cooldown_s:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def release_probe(self):
+        """The probe call never finished (cancelled): it proved nothing, the next call may probe."""
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or (self.threshold > 0 and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class ProviderScheduler:
+    """
+    Admission control for one LLM provider: concurrency limit, requests-per-minute and
+    tokens-per-minute buckets, retries with jittered backoff (Retry-After wins when given)
+    and a circuit breaker. Shared by every caller in the process via get_scheduler().
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self.stats = {"calls": 0, "retries": 0, "rejected": 0, "throttled_s": 0.0}
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _bind(self):
+        # asyncio primitives belong to one event loop; benchmarks and scripts run several in a row
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency) if self.concurrency > 0 else None
+            self.requests.lock = asyncio.Lock()
+            self.tokens.lock = asyncio.Lock()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], tokens: int = 0,
+                   can_retry: Optional[Callable[[], bool]] = None) -> T:
+        """
+        Runs `fn()` under the provider's limits. `tokens` is the request's estimated size
+        for the TPM bucket. `can_retry` is asked before each retry; return False once the
+        call has side effects (e.g. streamed output already shown to the user).
+        Raises ProviderUnavailable while the breaker is open, else the last error.
+        """
+        self._bind()
+        probe = False  # This call holds the half-open probe and hasn't reported back yet
+        try:
+            for attempt in range(RETRY_ATTEMPTS + 1):
+                if not probe:
+                    was_probing = self.breaker.probing
+                    if not self.breaker.allow():
+                        self.stats["rejected"] += 1
+                        raise ProviderUnavailable(f"{self.name} is unavailable (circuit open after repeated failures)")
+                    probe = self.breaker.probing and not was_probing
+                self.stats["calls"] += 1
+                try:
+                    if self._semaphore:
+                        async with self._semaphore:
+                            result = await self._attempt(fn, tokens)
+                    else:
+                        result = await self._attempt(fn, tokens)
+                except Exception as e:
+                    if not is_retryable(e):
+                        probe = False
+                        self.breaker.record_success()  # The provider answered; the request was the problem
+                        raise
+                    if not is_rate_limit(e):
+                        probe = False
+                        self.breaker.record_failure()
+                    if attempt == RETRY_ATTEMPTS or (can_retry and not can_retry()):
+                        raise
+                    if self.breaker.state == "open":
+                        self.stats["rejected"] += 1
+                        raise ProviderUnavailable(f"{self.name} is unavailable: {e}") from e
+                    delay = retry_after(e)
+                    delay = min(RETRY_MAX_DELAY_S, delay + random.uniform(0, RETRY_BASE_S)) if delay is not None else backoff_delay(attempt)
+                    self.stats["retries"] += 1
+                    print(f"🔁 {self.name}: retry {attempt + 1}/{RETRY_ATTEMPTS} in {delay:.1f}s ({type(e).__name__})")
+                    await asyncio.sleep(delay)
+                    continue
+                probe = False
+                self.breaker.record_success()
+                return result
+        finally:
+            # Cancelled (client gone, ensemble deadline, lost hedge) or gave up rate-limited: without
+            # this the breaker would stay half-open with a probe that never reports back
+            if probe:
+                self.breaker.release_probe()
+        raise RuntimeError("unreachable")
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], tokens: int) -> T:
+        waited = await self.requests.acquire(1)
+        waited += await self.tokens.acquire(tokens)
+        self.stats["throttled_s"] += waited
+        return await fn()
+
+
+def _limit(provider: str, kind: str) -> int:
+    default = DEFAULT_LIMITS.get(provider, FALLBACK_LIMITS)[kind]
+    return int(os.getenv(f"SENTINEL_{provider.upper()}_{kind.upper()}", str(default)))
+
+
+_schedulers: Dict[str, ProviderScheduler] = {}
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """The process-wide scheduler for a provider ("gemini", "claude"), built from env on first use."""
+    provider = provider.lower()
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        scheduler = _schedulers[provider] = ProviderScheduler(
+            provider, _limit(provider, "rpm"), _limit(provider, "tpm"), _limit(provider, "concurrency")
+        )
+    return scheduler
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .blob_cache import CACHE_DIR
+
+# --- Cache Settings ---
+RESPONSE_CACHE_PATH = os.environ.get("SENTINEL_RESPONSE_CACHE", os.path.join(CACHE_DIR, "llm_responses.db"))
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("SENTINEL_RESPONSE_CACHE_MB", "128"))
+RESPONSE_CACHE_TTL_HOURS = int(os.environ.get("SENTINEL_RESPONSE_CACHE_TTL_HOURS", "168"))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.environ.get("SENTINEL_RESPONSE_CACHE_MEMORY_ENTRIES", "256"))
+
+# use: read and write | refresh: skip reads, overwrite | bypass: don't touch the cache
+CACHE_MODES = ("use", "refresh", "bypass")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    value TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_lru ON responses(last_used);
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created);
+"""
+
+
+def template_version(template: str) -> str:
+    """Version of an inline prompt template: editing the text invalidates its cached responses."""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(provider: str, model: str, prompt_version: str, context: str, config: Optional[dict] = None) -> str:
+    h = hashlib.sha256()
+    for part in (provider, model, prompt_version, json.dumps(config or {}, sort_keys=True, default=str)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(context.encode("utf-8", errors="ignore"))
+    return h.hexdigest()
+
+
+def cache_mode_from_flags(bypass: Any = False, refresh: Any = False) -> str:
+    """Endpoint flags (JSON booleans or form strings) -> one of CACHE_MODES."""
+    def truthy(value):
+        return value is True or str(value).strip().lower() in ("1", "true", "yes", "on")
+    if truthy(bypass):
+        return "bypass"
+    return "refresh" if truthy(refresh) else "use"
+
+
+class ResponseCache:
+    """
+    Model responses keyed by cache_key(): an in-memory LRU in front of a SQLite
+    store. Entries expire after SENTINEL_RESPONSE_CACHE_TTL_HOURS and the store
+    is bounded by SENTINEL_RESPONSE_CACHE_MB (LRU eviction). Values are anything
+    JSON-serializable (raw response text, parsed test lists).
+    """
+
+    def __init__(self, db_path: str = RESPONSE_CACHE_PATH, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, memory_entries: int = RESPONSE_CACHE_MEMORY_ENTRIES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes if max_bytes is not None else RESPONSE_CACHE_MAX_MB * 1024 * 1024
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else RESPONSE_CACHE_TTL_HOURS * 3600
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _remember(self, key: str, created: float, value: Any):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                if now - hit[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return hit[1]
+                del self._memory[key]
+
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl_seconds:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                    return None
+                db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                db.commit()
+                value = json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                print(f"⚠️ Response cache read failed: {e}")
+                return None
+            self._remember(key, row[1], value)
+            return value
+
+    def put(self, key: str, value: Any, provider: str = "", model: str = ""):
+        now = time.time()
+        data = json.dumps(value, separators=(",", ":"), default=str)
+        with self._lock:
+            self._remember(key, now, value)
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, provider, model, value, bytes, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, data, len(data.encode("utf-8")), now, now)
+                )
+                db.commit()
+                self._evict(db)
+            except sqlite3.Error as e:
+                print(f"⚠️ Response cache write failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection):
+        """Expired entries first, then LRU until under budget."""
+        db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            evicted = []
+            for key, size in db.execute("SELECT key, bytes FROM responses ORDER BY last_used"):
+                if total <= target:
+                    break
+                evicted.append((key,))
+                total -= size
+            db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+            for (key,) in evicted:
+                self._memory.pop(key, None)
+        db.commit()
+
+
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide cache, or None when disabled with SENTINEL_RESPONSE_CACHE_ENABLED=false."""
+    global _shared_cache
+    if os.environ.get("SENTINEL_RESPONSE_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    if _shared_cache is None:
+        _shared_cache = ResponseCache()
+    return _shared_cache
@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .blob_cache import CACHE_DIR
+
+# --- Index Settings ---
+SCAN_INDEX_PATH = os.environ.get("SENTINEL_SCAN_INDEX", os.path.join(CACHE_DIR, "scan_index.db"))
+SCAN_INDEX_MAX_MB = int(os.environ.get("SENTINEL_SCAN_INDEX_MB", "256"))
+SCAN_INDEX_TTL_DAYS = int(os.environ.get("SENTINEL_SCAN_INDEX_TTL_DAYS", "30"))
+
+# (inode, mtime_ns, size): if all three match, the file hasn't been touched
+StatKey = Tuple[int, int, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (root, rel_path)
+);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_contents_lru ON contents(last_used);
+CREATE INDEX IF NOT EXISTS idx_files_seen ON files(last_seen);
+"""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def root_key(root: str, **filters) -> str:
+    """
+    Index key of one root scanned with one filter config (extensions, ignored dirs, ...).
+    Scans of the same root with different filters see different candidate sets: sharing
+    rows would mark the other scan's files removed on every switch and drop their hashes.
+    """
+    config = repr(sorted((name, sorted(v) if isinstance(v, (set, frozenset)) else v) for name, v in filters.items()))
+    return f"{root}#{hashlib.sha1(config.encode('utf-8')).hexdigest()[:12]}"
+
+
+class ScanIndex:
+    """
+    Sidecar SQLite index of local files keyed by (root key, relative path) and
+    validated by (inode, mtime_ns, size). The root key is the absolute root plus its
+    filter config (see root_key). Decoded contents are stored once per content
+    hash, so a rescan of an untouched tree never opens a source file.
+    Bounded by SENTINEL_SCAN_INDEX_MB (LRU over contents) and a TTL on stale roots.
+    """
+
+    def __init__(self, db_path: str = SCAN_INDEX_PATH, max_bytes: Optional[int] = None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes if max_bytes is not None else SCAN_INDEX_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def load_root(self, root: str) -> Dict[str, Tuple[StatKey, Optional[str]]]:
+        """Everything we knew about this root last time: {rel_path: (stat_key, content_hash)}."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT rel_path, inode, mtime_ns, size, content_hash FROM files WHERE root = ?", (root,)
+            ).fetchall()
+        return {r[0]: ((r[1], r[2], r[3]), r[4]) for r in rows}
+
+    def get_contents(self, hashes: Iterable[str]) -> Dict[str, str]:
+        hashes = list(set(hashes))
+        found: Dict[str, str] = {}
+        if not hashes:
+            return found
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            # Chunked to stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for h, content in db.execute(f"SELECT hash, content FROM contents WHERE hash IN ({marks})", chunk):
+                    found[h] = content
+                db.execute(f"UPDATE contents SET last_used = ? WHERE hash IN ({marks})", [now, *chunk])
+            db.commit()
+        return found
+
+    def update_root(self, root: str, seen: Dict[str, StatKey], new_contents: Dict[str, str],
+                    removed: List[str]):
+        """
+        Persists the current state of a root. `seen` holds every candidate's stat key,
+        `new_contents` the files we actually had to read ({rel_path: content}).
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            hashes = {}
+            for rel_path, content in new_contents.items():
+                h = content_hash(content)
+                hashes[rel_path] = h
+                db.execute(
+                    "INSERT OR REPLACE INTO contents (hash, content, bytes, last_used) VALUES (?, ?, ?, ?)",
+                    (h, content, len(content.encode("utf-8", errors="ignore")), now)
+                )
+
+            for rel_path, (inode, mtime_ns, size) in seen.items():
+                if rel_path in hashes:
+                    db.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (root, rel_path, inode, mtime_ns, size, hashes[rel_path], now)
+                    )
+                else:
+                    # Unchanged (or unread) file: refresh stat + last_seen, keep the hash only if stat still matches
+                    db.execute(
+                        "INSERT INTO files VALUES (?, ?, ?, ?, ?, NULL, ?) "
+                        "ON CONFLICT(root, rel_path) DO UPDATE SET "
+                        "content_hash = CASE WHEN inode = excluded.inode AND mtime_ns = excluded.mtime_ns "
+                        "AND size = excluded.size THEN content_hash ELSE NULL END, "
+                        "inode = excluded.inode, mtime_ns = excluded.mtime_ns, size = excluded.size, "
+                        "last_seen = excluded.last_seen",
+                        (root, rel_path, inode, mtime_ns, size, now)
+                    )
+
+            db.executemany("DELETE FROM files WHERE root = ? AND rel_path = ?", [(root, p) for p in removed])
+            db.commit()
+            self._evict(db)
+
+    def _evict(self, db: sqlite3.Connection):
+        """TTL on roots nobody scans any more, then LRU over contents until under budget."""
+        cutoff = time.time() - SCAN_INDEX_TTL_DAYS * 86400
+        db.execute("DELETE FROM files WHERE last_seen < ?", (cutoff,))
+        db.execute("DELETE FROM contents WHERE hash NOT IN (SELECT content_hash FROM files WHERE content_hash IS NOT NULL)")
+
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM contents").fetchone()[0]
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            evicted = []
+            for h, size in db.execute("SELECT hash, bytes FROM contents ORDER BY last_used"):
+                if total <= target:
+                    break
+                evicted.append((h,))
+                total -= size
+            db.executemany("DELETE FROM contents WHERE hash = ?", evicted)
+            db.executemany("UPDATE files SET content_hash = NULL WHERE content_hash = ?", evicted)
+        db.commit()
+
+
+_shared_index: Optional[ScanIndex] = None
+
+
+def get_scan_index() -> Optional[ScanIndex]:
+    """Process-wide index, or None when disabled with SENTINEL_SCAN_INDEX_ENABLED=false."""
+    global _shared_index
+    if os.environ.get("SENTINEL_SCAN_INDEX_ENABLED", "true").lower() != "true":
+        return None
+    if _shared_index is None:
+        _shared_index = ScanIndex()
+    return _shared_index
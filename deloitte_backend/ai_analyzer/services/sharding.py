@@ -0,0 +1,158 @@
+import re
+import hashlib
+from typing import Dict, List, Optional
+
+from .context_packer import estimate_tokens
+
+# --- Shard Settings ---
+PRIORITY_ORDER = {"critical": 0, "high": 0, "medium": 1, "low": 2}
+
+
+class Shard:
+    """A coherent slice of the repo (an import cluster or directory subtree, or several small sibling ones)."""
+
+    def __init__(self, label: str, files: Dict[str, str], score: float):
+        self.label = label
+        self.files = files
+        self.score = score
+
+    def __len__(self):
+        return len(self.files)
+
+
+def _top_dir(path: str, depth: int) -> str:
+    parts = path.replace('\\', '/').split('/')[:-1]
+    return '/'.join(parts[:depth])
+
+
+def _dir_of(path: str) -> str:
+    return path.replace('\\', '/').rpartition('/')[0]
+
+
+def _split(paths: List[str], sizes: Dict[str, int], depth: int, shard_tokens: int) -> List[List[str]]:
+    """Recursively splits by directory until every group fits (or is a single file/dir leaf)."""
+    if sum(sizes[p] for p in paths) <= shard_tokens or len(paths) == 1:
+        return [paths]
+    groups: Dict[str, List[str]] = {}
+    for p in paths:
+        groups.setdefault(_top_dir(p, depth + 1), []).append(p)
+    if len(groups) == 1 and all(_top_dir(p, depth + 1) == _dir_of(p) for p in paths):
+        # Files of one directory, no subdirectory left to split on: chunk in path order
+        chunks, current, used = [], [], 0
+        for p in paths:
+            if current and used + sizes[p] > shard_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(p)
+            used += sizes[p]
+        return chunks + ([current] if current else [])
+    result = []
+    for key in sorted(groups):
+        result.extend(_split(groups[key], sizes, depth + 1, shard_tokens))
+    return result
+
+
+def _label(paths: List[str]) -> str:
+    """Human-readable scope: the shard's directories, shortest first."""
+    dirs = sorted({_dir_of(p) or '.' for p in paths}, key=lambda d: (d.count('/'), d))
+    label = ", ".join(dirs[:3])
+    if len(dirs) > 3:
+        label += f" +{len(dirs) - 3} more"
+    return label
+
+
+def _units(paths: List[str], sizes: Dict[str, int], shard_tokens: int,
+           clusters: Optional[Dict[str, str]]) -> List[List[str]]:
+    """Indivisible-ish groups in path order: import clusters when known, directory subtrees otherwise."""
+    if not clusters:
+        return _split(paths, sizes, 0, shard_tokens)
+    members: Dict[str, List[str]] = {}
+    for p in paths:
+        members.setdefault(clusters.get(p, p), []).append(p)
+    units = []
+    # A cluster sits where its first file is, so unrelated singletons still merge by directory
+    for group in sorted(members.values(), key=lambda g: g[0]):
+        units.extend(_split(group, sizes, 0, shard_tokens))
+    return units
+
+
+def partition_shards(code_map: Dict[str, str], shard_tokens: int, max_shards: int,
+                     scores: Optional[Dict[str, float]] = None,
+                     clusters: Optional[Dict[str, str]] = None) -> List[Shard]:
+    """
+    Splits the code map into directory-coherent shards of about `shard_tokens`
+    each. Small sibling directories are merged in path order so a shard stays
+    one area of the codebase. With `clusters` ({path: label} from the import
+    graph), files that import each other stay in the same shard, and only
+    clusters bigger than a shard are split by directory. If that yields more
+    than `max_shards`, shards are made coarser (each one is then
+    compressed/packed into its own prompt). Shards come back most important first.
+    """
+    scores = scores or {}
+    sizes = {p: estimate_tokens(str(c)) for p, c in code_map.items()}
+    paths = sorted(code_map)
+
+    groups: List[List[str]] = []
+    for _ in range(16):
+        groups = []
+        current, used = [], 0
+        for group in _units(paths, sizes, shard_tokens, clusters):
+            size = sum(sizes[p] for p in group)
+            if current and used + size > shard_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.extend(group)
+            used += size
+        if current:
+            groups.append(current)
+        if len(groups) <= max_shards:
+            break
+        shard_tokens *= 2
+
+    shards = [
+        Shard(_label(group), {p: code_map[p] for p in group}, sum(scores.get(p, 1.0) for p in group))
+        for group in groups
+    ]
+    shards.sort(key=lambda s: s.score, reverse=True)
+    return shards
+
+
+# ==========================================
+# REDUCE: MERGE, DEDUP, RANK
+# ==========================================
+
+def _normalize_code(code: str) -> str:
+    return re.sub(r'\s+', ' ', code).strip()
+
+
+def _normalize_name(name: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def reduce_test_cases(batches: List[List[dict]], limit: int) -> List[dict]:
+    """
+    Merges per-shard results: drops repeats (same name or same code modulo
+    whitespace), then ranks by priority and by how important the originating
+    shard is (batches are given most important first). Keeps at most `limit`.
+    """
+    seen_names, seen_code = set(), set()
+    ranked = []
+    for batch_index, batch in enumerate(batches):
+        for position, tc in enumerate(batch):
+            if not isinstance(tc, dict):
+                continue
+            name = _normalize_name(str(tc.get("test_case_name", "")))
+            code = _normalize_code(str(tc.get("code") or ""))
+            # An empty name or body says nothing about being a repeat
+            code_key = hashlib.sha1(code.encode("utf-8")).hexdigest() if code else None
+            if (name and name in seen_names) or (code_key and code_key in seen_code):
+                continue
+            if name:
+                seen_names.add(name)
+            if code_key:
+                seen_code.add(code_key)
+            priority = PRIORITY_ORDER.get(str(tc.get("priority", "medium")).lower(), 1)
+            ranked.append(((priority, batch_index, position), tc))
+
+    ranked.sort(key=lambda item: item[0])
+    return [tc for _, tc in ranked[:limit]]
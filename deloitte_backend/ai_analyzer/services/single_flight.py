@@ -0,0 +1,224 @@
+import os
+import json
+import asyncio
+import hashlib
+import subprocess
+from urllib.parse import urlparse
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional
+
+from .file_scanner import IGNORE_DIRS
+
+# --- Coalescing Settings ---
+SINGLE_FLIGHT_ENABLED = os.getenv("SENTINEL_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# A pipeline whose last subscriber left is kept running this long, and a finished one is
+# kept for replay this long, so a client that reconnects after a dropped stream re-attaches
+SINGLE_FLIGHT_GRACE_S = float(os.getenv("SENTINEL_SINGLE_FLIGHT_GRACE_S", "15"))
+
+
+# --- Fingerprints ---
+
+def fingerprint(source: dict, options: dict) -> str:
+    """Key of one generate-tests request: where the code comes from plus every option that changes the output."""
+    payload = json.dumps({"source": source, "options": options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _worktree_state(root: str) -> Optional[str]:
+    """
+    Digest of what a commit hash doesn't cover: every `git status` entry (edited, staged,
+    untracked) plus its current (mtime_ns, size), so editing an already-dirty file again
+    still changes the key. None when `root` isn't a checkout.
+    """
+    try:
+        status = subprocess.run(["git", "-C", root, "status", "--porcelain", "-z", "--untracked-files=all"],
+                                capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if status.returncode != 0:
+        return None
+    digest = hashlib.sha256(status.stdout)
+    entries = iter(status.stdout.split(b"\0"))
+    for entry in entries:
+        if len(entry) < 4:
+            continue
+        if b"R" in entry[:2] or b"C" in entry[:2]:
+            next(entries, None)  # Renames/copies are followed by the old path
+        try:
+            st = os.stat(os.path.join(root, os.fsdecode(entry[3:])))
+            digest.update(f"{st.st_mtime_ns}:{st.st_size}".encode())
+        except OSError:
+            digest.update(b"-")  # Deleted
+    return digest.hexdigest()
+
+
+def _stat_state(root: str) -> str:
+    """Digest of every (path, mtime_ns, size) under a root that isn't a git checkout."""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORE_DIRS)
+        for name in sorted(filenames):
+            try:
+                st = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            rel = os.path.relpath(os.path.join(dirpath, name), root)
+            digest.update(f"{rel}\0{st.st_mtime_ns}:{st.st_size}\0".encode("utf-8", errors="surrogateescape"))
+    return digest.hexdigest()
+
+
+def local_source(path: str) -> dict:
+    """A local path, pinned to its git commit plus any uncommitted edits (or to file stats outside git)."""
+    root = os.path.realpath(path)
+    try:
+        head = subprocess.run(["git", "-C", root, "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+        commit = head.stdout.strip() if head.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    state = _worktree_state(root) if commit else None
+    if state is None:
+        state = _stat_state(root)
+    return {"kind": "local", "path": root, "commit": commit, "state": state}
+
+
+def github_source(repo_url: str, tree_sha: Optional[str] = None) -> dict:
+    """owner/repo of a GitHub URL plus the default branch's tree SHA, so a push starts a fresh scan."""
+    parts = urlparse(repo_url.strip()).path.strip("/").split("/")
+    repo = "/".join(parts[:2]).lower()
+    if repo.endswith(".git"):
+        repo = repo[:-4]
+    return {"kind": "github", "repo": repo or repo_url, "tree": tree_sha}
+
+
+def upload_source(fileobj: BinaryIO) -> dict:
+    """Content hash of an uploaded archive. Rewinds the file for the ZIP reader."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return {"kind": "upload", "sha256": digest.hexdigest()}
+
+
+# --- Single Flight ---
+
+def _is_error(event: str) -> bool:
+    if '"error"' not in event:
+        return False
+    try:
+        return json.loads(event).get("type") == "error"
+    except (ValueError, AttributeError):
+        return False
+
+
+class _Flight:
+    def __init__(self):
+        self.events: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.failed = False  # Raised or sent an error event: not worth replaying
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.grace: Optional[asyncio.TimerHandle] = None
+
+    def publish(self):
+        # Wake everyone waiting on the current event, hand out a fresh one for the next wait
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Runs one pipeline per key and fans its events out to every subscriber.
+    A subscriber that joins late first gets every event emitted so far, then the live ones.
+    The pipeline is cancelled once nobody has listened for SINGLE_FLIGHT_GRACE_S, and a
+    finished one stays available for replay that long. A run that failed (raised, or sent
+    an error event) is not replayed: the next identical request starts a fresh one.
+    """
+
+    def __init__(self, grace_s: float = SINGLE_FLIGHT_GRACE_S):
+        self.grace_s = grace_s
+        self._flights: Dict[str, _Flight] = {}
+
+    def has(self, key: str) -> bool:
+        """A pipeline for `key` is running or finished within the grace period."""
+        return key in self._flights
+
+    async def subscribe(self, key: str, factory: Optional[Callable[[], AsyncIterator[str]]],
+                        joined_event: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Events of the pipeline for `key`, starting it with `factory()` if none is running.
+        `joined_event` is sent first to subscribers that attached to an existing pipeline.
+        """
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if flight is None:
+            if factory is None:
+                raise LookupError(f"No pipeline in flight for {key[:12]}")
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+        flight.subscribers += 1
+        if flight.grace:
+            flight.grace.cancel()
+            flight.grace = None
+
+        try:
+            if joined and joined_event:
+                yield joined_event
+            sent = 0
+            while True:
+                changed = flight.changed
+                while sent < len(flight.events):
+                    sent += 1
+                    yield flight.events[sent - 1]
+                if flight.done:
+                    break
+                await changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.grace = asyncio.get_running_loop().call_later(self.grace_s, self._abandon, key, flight)
+
+    async def _run(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for event in factory():
+                flight.events.append(event)
+                flight.failed = flight.failed or _is_error(event)
+                flight.publish()
+        except asyncio.CancelledError:
+            flight.failed = True
+        except Exception as e:
+            flight.error = e
+            flight.failed = True
+        finally:
+            flight.done = True
+            flight.publish()
+            if flight.failed:
+                self._forget(key, flight)  # Subscribers already attached still get every event
+            else:
+                asyncio.get_running_loop().call_later(self.grace_s, self._forget, key, flight)
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _abandon(self, key: str, flight: _Flight):
+        if flight.subscribers == 0 and not flight.done and flight.task:
+            print(f"🛑 Single-flight: no listeners for {self.grace_s:.0f}s, cancelling pipeline {key[:12]}")
+            flight.task.cancel()
+            self._forget(key, flight)  # A cancelled run has nothing worth replaying
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Process-wide coalescer; None when SENTINEL_SINGLE_FLIGHT_ENABLED=false."""
+    global _single_flight
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
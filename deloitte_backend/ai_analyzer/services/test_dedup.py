@@ -0,0 +1,176 @@
+import re
+import random
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from .code_dedup import TOKEN_RE, _UnionFind
+
+# --- Tuning ---
+NAME_THRESHOLD = 0.80        # Word-set Jaccard of two names to count as the same name
+NAME_CODE_THRESHOLD = 0.50   # Shingle Jaccard the bodies still need when the names agree
+CODE_THRESHOLD = 0.90        # Shingle Jaccard of two normalized bodies to merge on the body alone
+CODE_SHINGLE_SIZE = 3        # Tokens per code shingle
+MIN_CODE_TOKENS = 12         # Bodies shorter than this only merge when identical
+SIGNATURE_SIZE = 32          # MinHash bins (one-permutation hashing)
+LSH_BANDS = 8                # Bands of SIGNATURE_SIZE // LSH_BANDS rows: ~0.6 similarity to collide
+MAX_BUCKET = 256             # Past this, a bucket is checked against its first member only (not all pairs)
+# Words/shingles in more than this share of the tests ("test", "import pytest") are left out of
+# the signatures, or every test would share buckets; similarity is still checked on everything
+COMMON_SHARE = 0.05
+COMMON_MIN_TESTS = 20
+
+_MASK64 = (1 << 64) - 1
+_ROWS = SIGNATURE_SIZE // LSH_BANDS
+# Fixed probe order per bin for densification (same for every set, so borrowed values line up)
+_PROBES = [random.Random(i).sample(range(SIGNATURE_SIZE), SIGNATURE_SIZE) for i in range(SIGNATURE_SIZE)]
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# Strings are matched only so a '#' inside one isn't taken for a comment; they are kept
+_STRING_OR_COMMENT_RE = re.compile(
+    r'("""|\'\'\')[\s\S]*?\1|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|(#[^\n]*)')
+_STEP_RE = re.compile(r'^[ \t]*print\(\s*f?[\'"]\[STEP\][^\n]*$', re.MULTILINE)
+_DEF_RE = re.compile(r'\b(def|class)\s+[A-Za-z_][A-Za-z0-9_]*')
+
+
+def name_words(name: str) -> FrozenSet[str]:
+    """Lower-cased words of a test name."""
+    return frozenset(_WORD_RE.findall(name.lower()))
+
+
+def code_tokens(code: str) -> List[str]:
+    """
+    Tokens of a test body with what providers vary between copies of the same test
+    taken out: comments, print('[STEP] ...') logging and the test function's name.
+    Other string literals (URLs, payloads, expected messages) stay: they tell API tests apart.
+    """
+    code = re.sub(r'```(?:python)?', '', code)
+    code = _STEP_RE.sub('', code)
+    code = _STRING_OR_COMMENT_RE.sub(lambda m: '' if m.group(2) else m.group(0), code)
+    code = _DEF_RE.sub(r'\1 _', code)
+    return TOKEN_RE.findall(code)
+
+
+def _signature(hashes: FrozenSet[int]) -> Optional[Tuple[int, ...]]:
+    """
+    One-permutation MinHash: each hash lands in one of SIGNATURE_SIZE bins, a bin keeps its
+    minimum. One pass over the set instead of one per hash function. An empty bin borrows
+    the value of the first filled bin in its own probe order ("optimal densification"):
+    unlike borrowing from the neighbour, the bins of a short name don't all repeat one word,
+    so two sets still agree on a bin with probability ~ their Jaccard similarity.
+    """
+    if not hashes:
+        return None
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for h in hashes:
+        slot, value = h % SIGNATURE_SIZE, h // SIGNATURE_SIZE
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    if None not in bins:
+        return tuple(bins)
+    dense = list(bins)
+    for i in range(SIGNATURE_SIZE):
+        if bins[i] is None:
+            dense[i] = next(bins[j] for j in _PROBES[i] if bins[j] is not None)
+    return tuple(dense)
+
+
+def _common(sets: List[FrozenSet]) -> FrozenSet:
+    counts = Counter(item for items in sets for item in items)
+    limit = max(COMMON_MIN_TESTS, COMMON_SHARE * len(sets))
+    return frozenset(item for item, count in counts.items() if count > limit)
+
+
+def _jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Field:
+    """One view of the tests (names or bodies) as sets of item hashes: exact groups and LSH buckets."""
+
+    def __init__(self):
+        self.exact: Dict[FrozenSet, List[int]] = defaultdict(list)
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+
+    def add(self, index: int, items: FrozenSet, common: FrozenSet = frozenset(), near: bool = True):
+        if not items:
+            return
+        group = self.exact[items]
+        group.append(index)
+        if len(group) > 1 or not near:
+            return  # Identical items land in the same buckets: the first of the group stands for it
+        signature = _signature(items - common or items)
+        for band in range(LSH_BANDS):
+            self.buckets[(band, signature[band * _ROWS:(band + 1) * _ROWS])].append(index)
+
+    def pairs(self, uf: _UnionFind) -> Iterator[Tuple[int, int]]:
+        """Candidate pairs not yet in one cluster: same items, or a shared bucket (pairs within a group included)."""
+        groups = {members[0]: members for members in self.exact.values()}
+        checked = set()
+        for members in list(self.exact.values()) + list(self.buckets.values()):
+            if len(members) < 2:
+                continue
+            if len(members) > MAX_BUCKET:
+                # Hundreds of copies of one test: all pairs is quadratic, a chain to the first is linear
+                candidates = ((members[0], b) for b in members[1:])
+            else:
+                candidates = ((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+            for a, b in candidates:
+                for x in groups.get(a, (a,)):
+                    for y in groups.get(b, (b,)):
+                        pair = (min(x, y), max(x, y))
+                        if pair in checked or uf.find(x) == uf.find(y):
+                            continue
+                        checked.add(pair)
+                        yield pair
+
+
+def _similar(a: FrozenSet, b: FrozenSet, threshold: float) -> bool:
+    # Jaccard can't exceed the size ratio: skip the intersection when sizes differ too much
+    if min(len(a), len(b)) < threshold * max(len(a), len(b)):
+        return False
+    return _jaccard(a, b) >= threshold
+
+
+def cluster_tests(test_cases: List[Dict]) -> List[List[int]]:
+    """
+    Groups duplicate test cases: near-same name (word Jaccard >= NAME_THRESHOLD) with a body
+    that still mostly agrees (>= NAME_CODE_THRESHOLD, or no body to compare), or a near-same
+    body on its own (shingle Jaccard >= CODE_THRESHOLD, after normalization).
+    Returns clusters of indices into `test_cases`, singletons included, each in input
+    order and ordered by their first member. Near-linear: one MinHash signature per name
+    and body, LSH buckets for candidate pairs, exact Jaccard only within buckets.
+    """
+    indices = list(range(len(test_cases)))
+    uf = _UnionFind(indices)
+    names = _Field()
+    bodies = _Field()
+
+    # Every word and shingle is hashed once; sets, counts and signatures work on the ints
+    words = [frozenset(hash(w) & _MASK64 for w in name_words(str(tc.get("test_case_name", "")))) for tc in test_cases]
+    tokens = [code_tokens(str(tc.get("code") or "")) for tc in test_cases]
+    shingles = [frozenset(hash(s) & _MASK64 for s in zip(*(t[i:] for i in range(CODE_SHINGLE_SIZE)))) for t in tokens]
+    common_words, common_shingles = _common(words), _common(shingles)
+
+    for index in indices:
+        names.add(index, words[index], common_words)
+        bodies.add(index, shingles[index], common_shingles, near=len(tokens[index]) >= MIN_CODE_TOKENS)
+
+    # Same body after normalization: one test, whatever the providers titled it
+    for members in bodies.exact.values():
+        for index in members[1:]:
+            uf.union(members[0], index)
+    for a, b in bodies.pairs(uf):
+        if _similar(shingles[a], shingles[b], CODE_THRESHOLD):
+            uf.union(a, b)
+    for a, b in names.pairs(uf):
+        if not _similar(words[a], words[b], NAME_THRESHOLD):
+            continue
+        # A shared name isn't enough: two "invalid login" tests can post different payloads
+        if not shingles[a] or not shingles[b] or _jaccard(shingles[a], shingles[b]) >= NAME_CODE_THRESHOLD:
+            uf.union(a, b)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for index in indices:
+        clusters[uf.find(index)].append(index)
+    return sorted(clusters.values(), key=lambda members: members[0])
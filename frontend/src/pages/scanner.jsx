@@ -111,6 +111,8 @@ export default function Scanner() {
     try {
       const msg = JSON.parse(jsonStr);
       if (msg.type === 'analysis_result') setMeta(msg.data);
+      // One test case as soon as the model finishes writing it; test_results replaces the list
+      else if (msg.type === 'test_case') setResults(prev => [...prev, msg.data]);
       else if (msg.type === 'test_results') {
         const tests = msg.data.test_cases || [];
         setResults(tests);